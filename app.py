@@ -3,6 +3,11 @@ import os
 from dotenv import load_dotenv
 from exchanges.bitmart_client import BitmartClient
 from exchanges.topone_client import TopOneClient
+from engine.worker_control import WorkerControlClient
+from engine.status_channel import StatusReader
+from engine.log_tail import LogTail
+import config
+import pandas as pd
 import time
 import logging
 import io
@@ -10,8 +15,6 @@ import importlib
 import subprocess 
 import json 
 import sys # Import sys to get the Python executable
-import uuid # For unique filenames
-import tempfile # For temporary file creation
 
 # --- Logging Setup for Streamlit App ---
 # This is for the Streamlit app's own logs, not the backend service's logs
@@ -61,39 +64,56 @@ sl_percentage = st.sidebar.number_input("止損 %", min_value=0.01, value=1.0)
 # --- Backend Control Parameters ---
 st.sidebar.header("後端控制")
 polling_interval = st.sidebar.number_input("輪詢間隔 (秒)", min_value=10, value=180)
+bar_minutes = st.sidebar.number_input("K線收盤排程 (分鐘，0 為固定間隔)", min_value=0, value=config.SCHEDULE_BAR_MINUTES or 0)
+schedule = {"bar_minutes": bar_minutes or None, "intra_bar_seconds": config.SCHEDULE_INTRA_BAR_SECONDS,
+            "settle_seconds": config.SCHEDULE_SETTLE_SECONDS}
 countdown_placeholder = st.sidebar.empty()
 max_execution_rounds = st.sidebar.number_input("最大執行回合數 (-1 為無限)", min_value=-1, value=-1)
 progress_bar_placeholder = st.sidebar.empty()
 
 # --- Backend Control Parameters ---
-if 'backend_process_pid' not in st.session_state:
-    st.session_state.backend_process_pid = None
-if 'progress_file_path' not in st.session_state:
-    st.session_state.progress_file_path = None
-if 'last_poll_time' not in st.session_state:
-    st.session_state.last_poll_time = None
 if 'log_subheader_initialized' not in st.session_state:
     st.session_state.log_subheader_initialized = False
 if 'backend_log_placeholder' not in st.session_state:
     st.session_state.backend_log_placeholder = None
 
-def start_backend():
-    if st.session_state.backend_process_pid:
-        try:
-            os.kill(st.session_state.backend_process_pid, 0) 
-            st.warning(f"後端服務已在運行，PID: {st.session_state.backend_process_pid}。")
-            return
-        except OSError:
-            st.session_state.backend_process_pid = None
+# 常駐策略服務：只在第一次使用時啟動一次，之後啟動/停止策略都走控制 API
+worker = WorkerControlClient(f"http://127.0.0.1:{config.WORKER_CONTROL_PORT}")
+
+def ensure_worker(timeout=30):
+    if worker.is_alive():
+        return True
+    subprocess.Popen([sys.executable, "worker_service.py", "--port", str(config.WORKER_CONTROL_PORT)],
+                     stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if worker.is_alive():
+            logger_app.info("Strategy worker service started.")
+            return True
+        time.sleep(0.2)
+    return False
+
+@st.cache_resource
+def init_status_reader():
+    return StatusReader(config.STATUS_CHANNEL_PATH)
+
+def worker_status():
+    # 策略服務每回合發布的狀態記錄（記憶體映射），不經 HTTP 也不讀日誌檔
+    return init_status_reader().read()
 
-    # Generate a unique progress file path
-    with tempfile.NamedTemporaryFile(mode='w', delete=False, suffix='.txt') as f:
-        st.session_state.progress_file_path = f.name
+def is_active(status):
+    return bool(status) and status["state"] not in ("idle", "offline")
+
+def start_backend():
+    if not ensure_worker():
+        st.error("無法啟動常駐策略服務 (worker_service.py)。")
+        return
 
     strategy_params = {
         "strategy_name": selected_strategy_name,
         "interval_seconds": polling_interval,
         "max_rounds": max_execution_rounds,
+        "schedule": schedule,
         "kwargs": {
             "symbol": symbol,
             "bitmart_side": bitmart_side,
@@ -103,84 +123,115 @@ def start_backend():
             "sl_percentage": sl_percentage,
         }
     }
-    params_json = json.dumps(strategy_params)
 
     try:
-        process = subprocess.Popen(
-            [sys.executable, "backend_service.py", params_json, st.session_state.progress_file_path],
-            stdout=subprocess.DEVNULL, 
-            stderr=subprocess.DEVNULL, 
-        )
-        st.session_state.backend_process_pid = process.pid
-        st.success(f"後端服務已啟動，PID: {process.pid}")
-        logger_app.info(f"Backend service started with PID: {process.pid}")
-        st.session_state.last_poll_time = time.time()
+        worker.start(strategy_params)
+        st.success("策略已啟動。")
+        logger_app.info(f"Strategy started: {strategy_params}")
     except Exception as e:
-        st.error(f"啟動後端服務失敗: {e}")
-        logger_app.error(f"Failed to start backend service: {e}")
+        st.error(f"啟動策略失敗: {e}")
+        logger_app.error(f"Failed to start strategy: {e}")
 
 def stop_backend():
-    if st.session_state.backend_process_pid:
-        # Attempt to close all positions before stopping the backend process
-        close_all_positions(bitmart_client, topone_client, symbol)
+    if not is_active(worker_status()):
+        st.info("策略未在執行。")
+        return
+    try:
+        # 等待進行中的回合（含下單/平倉）完成後才停止，再平掉剩餘倉位
+        with st.spinner("等待本回合結束..."):
+            worker.stop(wait=True)
+        st.success("策略已停止。")
+        logger_app.info("Strategy stopped.")
+    except Exception as e:
+        st.error(f"停止策略失敗: {e}")
+        logger_app.error(f"Failed to stop strategy: {e}")
+        return
+    close_all_positions(bitmart_client, topone_client, symbol)
 
-        try:
-            os.kill(st.session_state.backend_process_pid, 9) 
-            st.success(f"後端服務 (PID: {st.session_state.backend_process_pid}) 已停止。")
-            logger_app.info(f"Backend service with PID {st.session_state.backend_process_pid} stopped.")
-            st.session_state.backend_process_pid = None
-            if st.session_state.progress_file_path and os.path.exists(st.session_state.progress_file_path):
-                os.remove(st.session_state.progress_file_path)
-                st.session_state.progress_file_path = None
-            st.session_state.last_poll_time = None
-        except OSError as e:
-            st.error(f"停止後端服務失敗 (PID: {st.session_state.backend_process_pid}): {e}")
-            logger_app.error(f"Failed to stop backend service (PID: {st.session_state.backend_process_pid}): {e}")
-            st.session_state.backend_process_pid = None 
-    else:
-        st.info("後端服務未運行。")
+def toggle_pause():
+    status = worker_status()
+    if status and status["state"] == "paused":
+        worker.resume()
+    elif status and status["state"] == "running":
+        worker.pause()
+
+@st.cache_resource
+def init_log_tail():
+    # 每次重新整理只讀新增的部分，只保留最新 LOG_TAIL_LINES 行
+    return LogTail("backend_logs.txt", max_lines=config.LOG_TAIL_LINES)
 
 def update_backend_logs():
     if st.session_state.backend_log_placeholder:
         try:
-            with open("backend_logs.txt", "r",encoding="utf-8") as f:
-                logs = f.read()
-                st.session_state.backend_log_placeholder.code(logs)
-        except FileNotFoundError:
-            st.session_state.backend_log_placeholder.code("後端日誌檔案未找到。服務可能尚未啟動。")
+            log_tail = init_log_tail()
+            log_tail.poll()
+            lines = log_tail.lines(min_level=logging.getLevelName(log_level_filter), keyword=log_keyword_filter)
+            if lines:
+                st.session_state.backend_log_placeholder.code("\n".join(lines))
+            elif not os.path.exists(log_tail.path):
+                st.session_state.backend_log_placeholder.code("後端日誌檔案未找到。服務可能尚未啟動。")
+            else:
+                st.session_state.backend_log_placeholder.code("（沒有符合篩選條件的日誌）")
         except Exception as e:
             st.session_state.backend_log_placeholder.error(f"讀取後端日誌時出錯: {e}")
 
-def update_progress_bar():
-    if st.session_state.progress_file_path and os.path.exists(st.session_state.progress_file_path):
-        try:
-            with open(st.session_state.progress_file_path, "r") as f:
-                content = f.read().strip()
-                if content:
-                    current_round = int(content)
-                else:
-                    current_round = 0 # Default to 0 if file is empty
-            
-            if max_execution_rounds == -1:
-                progress_bar_placeholder.progress(0, text=f"當前回合: {current_round} (無限模式)")
-            else:
-                progress_percent = min(current_round / max_execution_rounds, 1.0)
-                progress_bar_placeholder.progress(progress_percent, text=f"當前回合: {current_round} / {max_execution_rounds}")
-        except ValueError:
-            progress_bar_placeholder.warning("進度檔案內容無效，等待有效進度...")
-        except Exception as e:
-            progress_bar_placeholder.error(f"讀取進度檔案時出錯: {e}")
+def update_progress_bar(status):
+    if is_active(status):
+        current_round = status["round"]
+        if max_execution_rounds == -1:
+            progress_bar_placeholder.progress(0, text=f"當前回合: {current_round} (無限模式, {status['state']})")
+        else:
+            progress_percent = min(current_round / max_execution_rounds, 1.0)
+            progress_bar_placeholder.progress(progress_percent, text=f"當前回合: {current_round} / {max_execution_rounds} ({status['state']})")
     else:
         progress_bar_placeholder.progress(0, text="進度: 未啟動")
 
-def update_countdown():
-    if st.session_state.backend_process_pid and st.session_state.last_poll_time:
-        time_elapsed = time.time() - st.session_state.last_poll_time
-        time_remaining = int(polling_interval - (time_elapsed % polling_interval))
+def update_countdown(status):
+    if status and status.get("next_wake_at"):
+        # 後端依時間格點排程，直接顯示它回報的下一個喚醒時間
+        time_remaining = int(status["next_wake_at"] - time.time())
         countdown_placeholder.info(f"下次輪詢倒計時: {time_remaining} 秒")
     else:
         countdown_placeholder.info("倒計時: 未啟動")
 
+def update_metrics_panel(status):
+    # 各交易所方法與策略階段的延遲分佈，來自策略服務的 GET /metrics
+    if not status:
+        return
+    with st.expander("延遲統計 (p50 / p95 / p99)"):
+        try:
+            histograms = worker.metrics()["histograms"]
+        except Exception as e:
+            st.warning(f"無法取得延遲統計: {e}")
+            return
+        if not histograms:
+            st.info("尚無資料")
+            return
+        df = pd.DataFrame.from_dict(histograms, orient="index")
+        df["errors"] = df["errors"].apply(lambda errors: ", ".join(f"{k}×{v}" for k, v in errors.items()))
+        exchange_rows = df.loc[df.index.isin(["bitmart", "topone"])]
+        if not exchange_rows.empty:
+            st.bar_chart(exchange_rows[["p50_ms", "p95_ms", "p99_ms"]])
+        stage_rows = df.loc[df.index.str.startswith("stage.")]
+        if not stage_rows.empty:
+            st.bar_chart(stage_rows[["p50_ms", "p95_ms", "p99_ms"]])
+        st.dataframe(df[["count", "p50_ms", "p95_ms", "p99_ms", "max_ms", "errors"]].round(1))
+
+def update_status_panel(status):
+    if not status or not status.get("round"):
+        return
+    st.subheader(f"第 {status['round']} 回合狀態 ({status['state']})")
+    stage_ms = status["stage_ms"]
+    cols = st.columns(3)
+    cols[0].metric("回合耗時 (ms)", f"{stage_ms['round']:.0f}" if stage_ms.get("round") is not None else "-")
+    cols[1].metric("Bitmart 餘額", status["balances"].get("bitmart"))
+    cols[2].metric("TopOne 餘額", status["balances"].get("topone"))
+    st.write("持倉", status["positions"])
+    st.write("最近決策", status["decisions"])
+    st.write("階段耗時 (ms)", stage_ms)
+    if status["errors"] or status.get("worker_error"):
+        st.error(f"錯誤: {status['errors']} {status.get('worker_error') or ''}")
+
 def close_all_positions(bitmart_client, topone_client, symbol):
     logger_app.info(f"嘗試平倉 {symbol} 在 Bitmart 和 TopOne 上的所有倉位...")
     st.info(f"嘗試平倉 {symbol} 在 Bitmart 和 TopOne 上的所有倉位...")
@@ -206,13 +257,14 @@ def close_all_positions(bitmart_client, topone_client, symbol):
     logger_app.info(f"{symbol} 倉位平倉嘗試完成。")
     st.info(f"{symbol} 倉位平倉嘗試完成。")
 
-col1, col2 = st.columns(2)
+col1, col2, col3 = st.columns(3)
 with col1:
     if st.button("啟動策略"):
         start_backend()
-        update_progress_bar()
-        update_countdown()
 with col2:
+    if st.button("暫停/繼續"):
+        toggle_pause()
+with col3:
     if st.button("停止策略"):
         stop_backend()
 
@@ -221,12 +273,18 @@ if not st.session_state.log_subheader_initialized:
     st.subheader("後端服務日誌")
     st.session_state.backend_log_placeholder = st.empty()
     st.session_state.log_subheader_initialized = True
+log_col1, log_col2 = st.columns(2)
+log_level_filter = log_col1.selectbox("日誌等級", ("INFO", "WARNING", "ERROR", "DEBUG"))
+log_keyword_filter = log_col2.text_input("關鍵字篩選", "")
 
+status = worker_status()
 update_backend_logs()
-update_progress_bar()
-update_countdown()
+update_progress_bar(status)
+update_countdown(status)
+update_status_panel(status)
+update_metrics_panel(status)
 
 # --- Auto-refresh mechanism ---
-if st.session_state.backend_process_pid:
+if is_active(status):
     time.sleep(1) # Wait for 1 second
     st.rerun()
\ No newline at end of file
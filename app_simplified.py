@@ -3,6 +3,7 @@ import logging
 from exchanges.bitmart_client import BitmartClient
 from exchanges.topone_client import TopOneClient
 from strategies.voger_strategy import run_voger_strategy
+from engine.scheduler import make_scheduler
 import config
 
 # 設定日誌輸出格式與等級
@@ -20,10 +21,14 @@ def main():
     )
     topone_client = TopOneClient(
         api_key=config.TOPONE_API_KEY,
-        secret_key=config.TOPONE_SECRET_KEY
+        secret_key=config.TOPONE_SECRET_KEY,
+        contract_specs=config.TOPONE_CONTRACT_SPECS
     )
 
-    # 持續執行策略循環
+    # 每根K線收盤後執行（或固定間隔，同樣對齊時間格點，不因回合耗時而漂移）
+    scheduler = make_scheduler(config.EXECUTION_INTERVAL_SECONDS, config.SCHEDULE_BAR_MINUTES,
+                               config.SCHEDULE_INTRA_BAR_SECONDS, config.SCHEDULE_SETTLE_SECONDS)
+    tick = None
     while True:
         try:
             logger.info(f"開始執行策略，交易幣種：{config.SYMBOL}...")
@@ -36,17 +41,20 @@ def main():
                 tp_percentage=config.TP_PERCENTAGE,
                 sl_percentage=config.SL_PERCENTAGE,
                 lookback_bars=config.LOOKBACK_BARS,
-                pullback_pct=config.PULLBACK_PCT
+                pullback_pct=config.PULLBACK_PCT,
+                bar_close_at=tick.bar_close_at if tick else None
             )
 
             logger.info(f"策略執行完成 ✅ 狀態：{results.get('status')}｜訊息：{results.get('message')}")
-            logger.debug(f"完整回傳結果：{results}")
+            logger.debug("完整回傳結果：%s", results)
 
         except Exception as e:
             logger.error(f"⚠️ 策略執行過程中發生錯誤：{e}", exc_info=True)
 
-        logger.info(f"🕒 等待 {config.EXECUTION_INTERVAL_SECONDS} 秒後再次執行策略...\n")
-        time.sleep(config.EXECUTION_INTERVAL_SECONDS)
+        wake_at, kind = scheduler.peek()
+        logger.info(f"🕒 等待至 {time.strftime('%H:%M:%S', time.localtime(wake_at))} ({kind}) 再次執行策略...\n")
+        tick = scheduler.wait_next()
+        logger.info(f"排程喚醒，距K線邊界延遲 {tick.lateness_ms:.0f} ms")
 
 if __name__ == "__main__":
     main()
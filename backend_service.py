@@ -1,43 +1,159 @@
 import os
 import time
 import logging
+import logging.handlers
 import importlib
-import sys 
-import json 
+import sys
+import json
+import asyncio
+import functools
 from dotenv import load_dotenv
 
+import config
 from exchanges.bitmart_client import BitmartClient
 from exchanges.topone_client import TopOneClient
+from exchanges.async_clients import AsyncBitmartClient, AsyncTopOneClient
+from exchanges.symbol_registry import symbol_registry
+from exchanges.rate_limit import format_rate_limits
+from engine.account_snapshot import AccountSnapshot
+from data.market_feed import MarketDataFeed, BITMART_FUTURES_WS_URL
+from engine.scheduler import make_scheduler
+from engine.multi_symbol import MultiSymbolRunner, build_instances
+from engine.metrics import instrument_client, collect_stages
+from engine.queued_logging import install_queue_logging, logging_time, logging_time_since
 
 # Configure logging for the backend service
+# 依大小輪替；每次啟動先輪替一次，沿用原本「每次啟動一份新日誌」的行為
+# 寫檔在背景執行緒進行，交易執行緒只把記錄放進佇列
 log_file_path = "backend_logs.txt"
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(name)s - %(message)s',
-    handlers=[
-        logging.FileHandler(log_file_path, mode='w',encoding='utf-8')
-    ]
-)
+log_file_handler = logging.handlers.RotatingFileHandler(log_file_path, maxBytes=config.LOG_MAX_BYTES,
+                                                        backupCount=config.LOG_BACKUP_COUNT, encoding='utf-8')
+if os.path.exists(log_file_path) and os.path.getsize(log_file_path) > 0:
+    log_file_handler.doRollover()
+log_file_handler.setFormatter(logging.Formatter('%(asctime)s - %(levelname)s - %(name)s - %(message)s'))
+install_queue_logging(log_file_handler, level=logging.DEBUG if config.LOG_DEBUG else logging.INFO)
 logger = logging.getLogger(__name__)
 
 # Load environment variables
 load_dotenv()
 
-def run_strategy_continuously(strategy_name: str, interval_seconds: int, max_rounds: int = -1, progress_file_path: str = None, **strategy_kwargs):
-    logger.info(f"開始持續執行 {strategy_name} 策略。")
-    logger.info(f"輪詢間隔: {interval_seconds} 秒, 最大回合: {max_rounds}")
-
-    # Initialize clients
+def create_clients(symbols=None):
+    # 設定 SIM_SERVER_URL 時兩個客戶端都連到本機模擬交易所 (sim/exchange_server.py)
+    urls = {"base_url": config.SIM_SERVER_URL} if config.SIM_SERVER_URL else {}
     bitmart_client = BitmartClient(
         api_key=os.getenv("BITMART_API_KEY"),
         secret_key=os.getenv("BITMART_SECRET_KEY"),
-        memo=os.getenv("BITMART_MEMO")
+        memo=os.getenv("BITMART_MEMO"),
+        **urls
     )
     topone_client = TopOneClient(
         api_key=os.getenv("TOPONE_API_KEY"),
         secret_key=os.getenv("TOPONE_SECRET_KEY"),
+        contract_specs=config.TOPONE_CONTRACT_SPECS,
+        **urls
     )
 
+    # 每個客戶端方法的延遲與錯誤記入 engine.metrics
+    instrument_client(bitmart_client, "bitmart")
+    instrument_client(topone_client, "topone")
+    attach_market_feed(bitmart_client, topone_client, symbols)
+    return bitmart_client, topone_client
+
+def setup_clients(symbols, interval_seconds, schedule, paper=None):
+    """(bitmart_client, topone_client, scheduler) for the live exchanges on the wall-clock
+    schedule, or, with ``paper`` (kwargs of create_paper_clients), paper accounts on a
+    replay of the local kline store whose scheduler advances the replay instead of sleeping."""
+    if paper is None:
+        bitmart_client, topone_client = create_clients(symbols)
+        return bitmart_client, topone_client, make_scheduler(interval_seconds, **(schedule or {}))
+    # 只有紙上交易才載入K線庫與模擬撮合
+    from sim.paper_broker import create_paper_clients, replay_scheduler
+    bitmart_client, topone_client = create_paper_clients(symbols, **paper)
+    instrument_client(bitmart_client, "bitmart")
+    instrument_client(topone_client, "topone")
+    return bitmart_client, topone_client, replay_scheduler(bitmart_client.exchange.market)
+
+def attach_market_feed(bitmart_client, topone_client, symbols):
+    # 兩個客戶端共用同一份串流報價表；交易對改變時換一條新的串流
+    if not config.MARKET_DATA_STREAM or not symbols:
+        return None
+    feed = bitmart_client.market_feed
+    if feed is not None and sorted(feed.symbols) == sorted(symbols):
+        return feed
+    if feed is not None:
+        feed.stop()
+    # 模擬交易所沒有 websocket，行情只走 REST 輪詢
+    feed = MarketDataFeed(symbols, url=None if config.SIM_SERVER_URL else BITMART_FUTURES_WS_URL,
+                          rest_fetch=bitmart_client.get_top_of_book,
+                          stale_after=config.MARKET_DATA_STALE_SECONDS,
+                          poll_interval=config.MARKET_DATA_POLL_SECONDS).start()
+    bitmart_client.market_feed = topone_client.market_feed = feed
+    return feed
+
+def preload_contract_specs(symbols):
+    # 啟動時預先載入合約規格，下單路徑不再需要查詢 details
+    if symbols:
+        for exchange in ("bitmart", "topone"):
+            loaded = symbol_registry.load_all(exchange, symbols)
+            if loaded < len(symbols):
+                logger.warning(f"未能預先載入 {exchange} 全部 {len(symbols)} 個交易對的合約規格 (已載入 {loaded})，將於下單時再載入。")
+
+def write_progress(progress_file_path, round_count):
+    if progress_file_path:
+        try:
+            with open(progress_file_path, "w") as f:
+                f.write(str(round_count))
+        except Exception as e:
+            logger.error(f"Error writing progress to file {progress_file_path}: {e}")
+
+def has_sufficient_margin(required_margin, bitmart_balance, topone_balance):
+    if required_margin is None:
+        logger.error("策略參數 'margin' 缺失。無法檢查保證金是否不足。")
+        return False
+
+    if bitmart_balance is None or topone_balance is None:
+        logger.error("無法從一個或兩個交易所獲取餘額。無法檢查保證金是否不足。")
+        return False
+
+    logger.info(f"Bitmart 可用餘額: {bitmart_balance:.2f} USDT, TopOne 可用餘額: {topone_balance:.2f} USDT")
+
+    if bitmart_balance < required_margin:
+        logger.error(f"Bitmart 保證金不足。需要: {required_margin:.2f}, 可用: {bitmart_balance:.2f}。停止策略。")
+        return False
+    if topone_balance < required_margin:
+        logger.error(f"TopOne 保證金不足。需要: {required_margin:.2f}, 可用: {topone_balance:.2f}。停止策略。")
+        return False
+    return True
+
+def log_logging_cost(round_count, mark):
+    records, ms = logging_time_since(mark)
+    logger.info(f"第 {round_count} 回合日誌耗時 {ms:.2f} ms ({records} 筆)")
+
+def log_tick(tick, scheduler):
+    logger.info(f"限流器: {format_rate_limits()}")
+    logger.info(f"排程喚醒 ({tick.kind})，距K線邊界延遲 {tick.lateness_ms:.0f} ms")
+    if tick.missed:
+        logger.info(f"排程統計: {scheduler.stats()}")
+
+def wait_next_tick(scheduler):
+    """scheduler.wait_next(), or None once a paper-trading replay has run out of data."""
+    try:
+        return scheduler.wait_next()
+    except Exception as e:
+        from sim.matching import ReplayFinished
+        if isinstance(e, ReplayFinished):
+            return None
+        raise
+
+def run_strategy_continuously(strategy_name: str, interval_seconds: int, max_rounds: int = -1, progress_file_path: str = None, schedule: dict = None, paper: dict = None, **strategy_kwargs):
+    logger.info(f"開始持續執行 {strategy_name} 策略。")
+    logger.info(f"輪詢間隔: {interval_seconds} 秒, 最大回合: {max_rounds}, 排程: {schedule}, 紙上交易: {paper}")
+
+    # Initialize clients
+    symbols = [strategy_kwargs['symbol']] if strategy_kwargs.get('symbol') else []
+    bitmart_client, topone_client, scheduler = setup_clients(symbols, interval_seconds, schedule, paper)
+    preload_contract_specs(symbols)
+
     # Dynamically import the selected strategy
     try:
         strategy_module = importlib.import_module(f"strategies.{strategy_name}")
@@ -48,51 +164,140 @@ def run_strategy_continuously(strategy_name: str, interval_seconds: int, max_rou
         return
 
     round_count = 0
+    tick = None  # 第一回合啟動後立即執行
     while True:
         round_count += 1
-        if progress_file_path:
-            try:
-                with open(progress_file_path, "w") as f:
-                    f.write(str(round_count))
-            except Exception as e:
-                logger.error(f"Error writing progress to file {progress_file_path}: {e}")
+        write_progress(progress_file_path, round_count)
 
         logger.info(f"--- 執行 {strategy_name} 策略 第 {round_count} 回合 ---")
+        log_mark = logging_time()
 
-        # --- Implement check for insufficient margin ---
-        required_margin = strategy_kwargs.get('margin')
-        if required_margin is None:
-            logger.error("策略參數 'margin' 缺失。無法檢查保證金是否不足。")
+        # 每回合一次、同時查詢兩邊的餘額與持倉；保證金檢查與策略都讀這份快照
+        snapshot = AccountSnapshot(bitmart_client, topone_client, strategy_kwargs.get('symbol')).refresh()
+        if not has_sufficient_margin(strategy_kwargs.get('margin'), snapshot.balances["bitmart"], snapshot.balances["topone"]):
             break
 
-        bitmart_balance = bitmart_client.get_balance()
-        topone_balance = topone_client.get_balance()
+        # Execute the strategy
+        with collect_stages() as stages:
+            results = run_strategy_func(bitmart_client, topone_client, account_snapshot=snapshot,
+                                        bar_close_at=tick.bar_close_at if tick else None, **strategy_kwargs)
+        logger.info(f"第 {round_count} 回合的策略結果: {results.get('status')}: {results.get('message')}")
+        # 完整結果（含下單/平倉回應）只在 DEBUG 時格式化
+        logger.debug("第 %d 回合的完整策略結果: %s", round_count, results)
+        logger.info(f"第 {round_count} 回合階段耗時(ms): { {k: round(v, 1) for k, v in stages.items()} }")
+        log_logging_cost(round_count, log_mark)
+        if tick is not None:
+            logger.info(f"第 {round_count} 回合耗時 {scheduler.record_round(tick):.0f} ms")
 
-        if bitmart_balance is None or topone_balance is None:
-            logger.error("無法從一個或兩個交易所獲取餘額。無法檢查保證金是否不足。")
+        # Check stopping conditions
+        if max_rounds != -1 and round_count >= max_rounds:
+            logger.info(f"已達到最大回合數 ({max_rounds})。停止策略。")
             break
 
-        logger.info(f"Bitmart 可用餘額: {bitmart_balance:.2f} USDT, TopOne 可用餘額: {topone_balance:.2f} USDT")
-
-        if bitmart_balance < required_margin:
-            logger.error(f"Bitmart 保證金不足。需要: {required_margin:.2f}, 可用: {bitmart_balance:.2f}。停止策略。")
+        wake_at, kind = scheduler.peek()
+        logger.info(f"等待至 {time.strftime('%H:%M:%S', time.localtime(wake_at))} ({kind}) 進入下一回合...")
+        tick = wait_next_tick(scheduler)
+        if tick is None:
+            logger.info("紙上交易的回放資料已結束。停止策略。")
             break
-        if topone_balance < required_margin:
-            logger.error(f"TopOne 保證金不足。需要: {required_margin:.2f}, 可用: {topone_balance:.2f}。停止策略。")
+        log_tick(tick, scheduler)
+
+async def run_strategy_continuously_async(strategy_name: str, interval_seconds: int, max_rounds: int = -1, progress_file_path: str = None, schedule: dict = None, **strategy_kwargs):
+    """asyncio variant of run_strategy_continuously.
+
+    Uses ``run_<strategy>_async`` when the strategy provides one; otherwise the
+    synchronous strategy runs in a worker thread so the loop stays responsive.
+    """
+    logger.info(f"開始持續執行 {strategy_name} 策略 (asyncio)。")
+    logger.info(f"輪詢間隔: {interval_seconds} 秒, 最大回合: {max_rounds}, 排程: {schedule}")
+    scheduler = make_scheduler(interval_seconds, **(schedule or {}))
+
+    symbols = [strategy_kwargs['symbol']] if strategy_kwargs.get('symbol') else []
+    sync_bitmart, sync_topone = create_clients(symbols)
+    bitmart_client = AsyncBitmartClient(client=sync_bitmart)
+    topone_client = AsyncTopOneClient(client=sync_topone)
+    loop = asyncio.get_running_loop()
+    await loop.run_in_executor(None, preload_contract_specs, symbols)
+
+    try:
+        strategy_module = importlib.import_module(f"strategies.{strategy_name}")
+        run_strategy_func = getattr(strategy_module, f"run_{strategy_name}_async", None)
+        if run_strategy_func is None:
+            sync_func = getattr(strategy_module, f"run_{strategy_name}")
+            async def run_strategy_func(bitmart, topone, **kwargs):
+                return await loop.run_in_executor(None, functools.partial(sync_func, bitmart.sync, topone.sync, **kwargs))
+    except Exception as e:
+        logger.error(f"加載策略 {strategy_name} 時出錯: {e}")
+        return
+
+    round_count = 0
+    tick = None  # 第一回合啟動後立即執行
+    while True:
+        round_count += 1
+        write_progress(progress_file_path, round_count)
+
+        logger.info(f"--- 執行 {strategy_name} 策略 第 {round_count} 回合 ---")
+        log_mark = logging_time()
+
+        snapshot = await AccountSnapshot(bitmart_client, topone_client, strategy_kwargs.get('symbol')).refresh_async()
+        if not has_sufficient_margin(strategy_kwargs.get('margin'), snapshot.balances["bitmart"], snapshot.balances["topone"]):
             break
-        # --- End of insufficient margin check ---
 
-        # Execute the strategy
-        results = run_strategy_func(bitmart_client, topone_client, **strategy_kwargs)
-        logger.info(f"第 {round_count} 回合的策略結果: {results}")
+        with collect_stages() as stages:
+            results = await run_strategy_func(bitmart_client, topone_client, account_snapshot=snapshot,
+                                              bar_close_at=tick.bar_close_at if tick else None, **strategy_kwargs)
+        logger.info(f"第 {round_count} 回合的策略結果: {results.get('status')}: {results.get('message')}")
+        # 完整結果（含下單/平倉回應）只在 DEBUG 時格式化
+        logger.debug("第 %d 回合的完整策略結果: %s", round_count, results)
+        logger.info(f"第 {round_count} 回合階段耗時(ms): { {k: round(v, 1) for k, v in stages.items()} }")
+        log_logging_cost(round_count, log_mark)
+        if tick is not None:
+            logger.info(f"第 {round_count} 回合耗時 {scheduler.record_round(tick):.0f} ms")
 
-        # Check stopping conditions
         if max_rounds != -1 and round_count >= max_rounds:
             logger.info(f"已達到最大回合數 ({max_rounds})。停止策略。")
             break
-        
-        logger.info(f"等待 {interval_seconds} 秒後進入下一回合...")
-        time.sleep(interval_seconds)
+
+        wake_at, kind = scheduler.peek()
+        logger.info(f"等待至 {time.strftime('%H:%M:%S', time.localtime(wake_at))} ({kind}) 進入下一回合...")
+        tick = await scheduler.wait_next_async()
+        log_tick(tick, scheduler)
+
+def run_multi_symbol(instances: list, interval_seconds: int, max_rounds: int = -1, progress_file_path: str = None, schedule: dict = None, max_workers: int = 16, paper: dict = None):
+    """Host many symbol/strategy instances (see engine.multi_symbol.build_instances) in this one process."""
+    symbols = sorted({i.symbol for i in instances})
+    logger.info(f"多交易對模式: {len(instances)} 個策略實例, {len(symbols)} 個交易對, 排程: {schedule}, 紙上交易: {paper}")
+
+    bitmart_client, topone_client, scheduler = setup_clients(symbols, interval_seconds, schedule, paper)
+    preload_contract_specs(symbols)
+    try:
+        runner = MultiSymbolRunner(bitmart_client, topone_client, instances, max_workers=max_workers)
+    except Exception as e:
+        logger.error(f"加載策略時出錯: {e}")
+        return
+
+    tick = None
+    while True:
+        write_progress(progress_file_path, runner.round_count + 1)
+        logger.info(f"--- 多交易對 第 {runner.round_count + 1} 回合 ---")
+        log_mark = logging_time()
+        results = runner.run_round(bar_close_at=tick.bar_close_at if tick else None)
+        for key, result in results.items():
+            logger.info(f"[{key}] {result.get('status')}: {result.get('message')}")
+        log_logging_cost(runner.round_count, log_mark)
+        if tick is not None:
+            logger.info(f"第 {runner.round_count} 回合耗時 {scheduler.record_round(tick):.0f} ms")
+
+        if max_rounds != -1 and runner.round_count >= max_rounds:
+            logger.info(f"已達到最大回合數 ({max_rounds})。停止策略。")
+            break
+
+        tick = wait_next_tick(scheduler)
+        if tick is None:
+            logger.info("紙上交易的回放資料已結束。停止策略。")
+            break
+        log_tick(tick, scheduler)
+    runner.close()
 
 if __name__ == "__main__":
     if len(sys.argv) > 2:
@@ -101,12 +306,31 @@ if __name__ == "__main__":
             progress_file_path = sys.argv[2]
             strategy_config = json.loads(params_json)
 
-            strategy_to_run = strategy_config["strategy_name"]
+            strategy_to_run = strategy_config.get("strategy_name")
             polling_interval = strategy_config["interval_seconds"]
             max_execution_rounds = strategy_config["max_rounds"]
-            strategy_params = strategy_config["kwargs"]
+            strategy_params = strategy_config.get("kwargs", {})
+
+            schedule = strategy_config.get("schedule", {
+                "bar_minutes": config.SCHEDULE_BAR_MINUTES,
+                "intra_bar_seconds": config.SCHEDULE_INTRA_BAR_SECONDS,
+                "settle_seconds": config.SCHEDULE_SETTLE_SECONDS,
+            })
+
+            # "paper": {...} 改用紙上帳戶回放本機K線庫（參數見 sim.paper_broker.create_paper_clients，{} 為預設）
+            paper = strategy_config.get("paper")
 
-            run_strategy_continuously(strategy_to_run, polling_interval, max_execution_rounds, progress_file_path, **strategy_params)
+            if strategy_config.get("instances"):
+                # 每個實例可覆寫策略名稱與參數，未指定者沿用頂層設定
+                run_multi_symbol(build_instances(strategy_config), polling_interval, max_execution_rounds, progress_file_path,
+                                 schedule=schedule, max_workers=strategy_config.get("max_workers", 16), paper=paper)
+            elif paper is not None:
+                # 回放時鐘只接在同步排程上，紙上交易一律走同步迴圈
+                run_strategy_continuously(strategy_to_run, polling_interval, max_execution_rounds, progress_file_path, schedule=schedule, paper=paper, **strategy_params)
+            elif strategy_config.get("use_async", False):
+                asyncio.run(run_strategy_continuously_async(strategy_to_run, polling_interval, max_execution_rounds, progress_file_path, schedule=schedule, **strategy_params))
+            else:
+                run_strategy_continuously(strategy_to_run, polling_interval, max_execution_rounds, progress_file_path, schedule=schedule, **strategy_params)
         except Exception as e:
             logger.error(f"解析命令行參數或運行策略時出錯: {e}")
     else:
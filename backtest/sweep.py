@@ -0,0 +1,173 @@
+import os
+import math
+import itertools
+import numpy as np
+import pandas as pd
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+from indicators.cci import cci_batch
+from backtest.voger_backtest import signal_arrays, trend_arrays, desired_directions, hedge_summary
+
+# 訊號參數決定進場點；出場參數只影響模擬，同一組訊號共用
+SIGNAL_PARAMS = ("cci_len", "lookback_bars", "pullback_len", "pullback_pct")
+EXIT_PARAMS = ("tp_percentage", "sl_percentage", "trend_filter")
+PARAMS = SIGNAL_PARAMS + EXIT_PARAMS
+DEFAULTS = {"cci_len": 20, "lookback_bars": 5, "pullback_len": 5, "pullback_pct": 0.01, "trend_filter": True}
+METRICS = ("net_pnl", "hedges", "fees", "leg_win_rate", "max_drawdown", "open_legs")
+
+
+class SharedArrays:
+    """Named NumPy arrays copied once into shared memory; ``spec`` lets worker
+    processes map them without copying. Closes and unlinks on exit."""
+
+    def __init__(self, arrays):
+        self._blocks = []
+        self.spec = {}
+        for name, array in arrays.items():
+            array = np.ascontiguousarray(array)
+            block = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+            np.ndarray(array.shape, array.dtype, buffer=block.buf)[...] = array
+            self._blocks.append(block)
+            self.spec[name] = (block.name, array.shape, array.dtype.str)
+
+    def close(self):
+        for block in self._blocks:
+            block.close()
+            block.unlink()
+        self._blocks = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+# 工作進程內的共享陣列（由 _attach 設定）
+_arrays = {}
+_blocks = []
+
+
+def _attach(spec):
+    for name, (block_name, shape, dtype) in spec.items():
+        block = shared_memory.SharedMemory(name=block_name)
+        _blocks.append(block)
+        _arrays[name] = np.ndarray(shape, dtype, buffer=block.buf)
+
+
+def parameter_grid(**values):
+    """Every combination of the given parameter lists, as dicts; unspecified
+    signal parameters and the trend filter take the strategy defaults."""
+    unknown = set(values) - set(PARAMS)
+    if unknown:
+        raise ValueError(f"unknown sweep parameters: {sorted(unknown)}")
+    missing = {"tp_percentage", "sl_percentage"} - set(values)
+    if missing:
+        raise ValueError(f"sweep needs values for {sorted(missing)}")
+    lists = [list(values.get(name, [DEFAULTS.get(name)])) for name in PARAMS]
+    return [dict(zip(PARAMS, combo)) for combo in itertools.product(*lists)]
+
+
+def _run_group(task):
+    """All exit combinations of one signal-parameter combination, on every window."""
+    (cci_row, cci_len, lookback_bars, pullback_len, pullback_pct), exits, windows, strategy = task
+    bars = _arrays["bars"]
+    long_signal, short_signal = signal_arrays(bars[:, 2], bars[:, 3], bars[:, 4], cci_len, lookback_bars,
+                                              pullback_len, pullback_pct, cci=_arrays["cci"][cci_row])
+    directions = {}
+    rows = []
+    for tp_percentage, sl_percentage, trend_filter in exits:
+        if trend_filter not in directions:
+            trend = _arrays["trend"] if trend_filter else None
+            directions[trend_filter] = desired_directions(long_signal, short_signal, trend)
+        direction = directions[trend_filter]
+        for window, (start, end) in enumerate(windows):
+            summary = hedge_summary(bars[start:end], direction[start:end], tp_percentage=tp_percentage,
+                                    sl_percentage=sl_percentage, **strategy)
+            rows.append((cci_len, lookback_bars, pullback_len, pullback_pct, tp_percentage, sl_percentage,
+                         trend_filter, window) + tuple(summary[m] for m in METRICS))
+    return rows
+
+
+def _tasks(grid, cci_lens, windows, strategy, target_tasks):
+    groups = {}
+    for combo in grid:
+        key = (cci_lens.index(combo["cci_len"]),) + tuple(combo[p] for p in SIGNAL_PARAMS)
+        groups.setdefault(key, []).append(tuple(combo[p] for p in EXIT_PARAMS))
+    # 訊號組太少時把出場組合切塊，讓每個工作進程都有事做
+    splits = max(1, math.ceil(target_tasks / len(groups)))
+    for key, exits in groups.items():
+        size = max(1, math.ceil(len(exits) / splits))
+        for lo in range(0, len(exits), size):
+            yield key, exits[lo:lo + size], windows, strategy
+
+
+def sweep(bars, grid, margin, leverage, windows=None, workers=None, base_interval=15, trend_interval=240,
+          **sim_kwargs):
+    """Backtest every parameter combination of ``grid`` (see parameter_grid) on ``bars``.
+
+    The bars, the CCI for each distinct ``cci_len`` and the 4h trend are
+    computed once and shared with the worker processes through shared
+    memory; each task derives the signals of one signal-parameter set and
+    simulates all its TP/SL/trend-filter combinations. ``windows`` is a list
+    of (start, end) bar ranges to evaluate separately (default: all bars);
+    indicators always see the full history before a window, as live.
+    ``workers`` 0 runs in this process. Returns one row per combination and
+    window with the parameters and the summary metrics.
+    """
+    bars = np.ascontiguousarray(bars, dtype=float)
+    windows = [(0, len(bars))] if windows is None else [tuple(w) for w in windows]
+    cci_lens = sorted({combo["cci_len"] for combo in grid})
+    high, low, close = bars[:, 2], bars[:, 3], bars[:, 4]
+    arrays = {
+        "bars": bars,
+        "cci": np.stack([cci_batch(high, low, close, cci_len) for cci_len in cci_lens]),
+        "trend": trend_arrays(bars[:, 0], high, low, close, base_interval, trend_interval),
+    }
+    strategy = {"margin": margin, "leverage": leverage, **sim_kwargs}
+    workers = os.cpu_count() if workers is None else workers
+
+    if workers == 0:
+        _arrays.update(arrays)
+        try:
+            results = [_run_group(task) for task in _tasks(grid, cci_lens, windows, strategy, 1)]
+        finally:
+            _arrays.clear()
+    else:
+        with SharedArrays(arrays) as shared, \
+                ProcessPoolExecutor(workers, initializer=_attach, initargs=(shared.spec,)) as pool:
+            results = list(pool.map(_run_group, _tasks(grid, cci_lens, windows, strategy, workers * 8)))
+    return pd.DataFrame([row for rows in results for row in rows], columns=PARAMS + ("window",) + METRICS)
+
+
+def walk_forward_windows(n, train_bars, test_bars, step_bars=None):
+    """(train, test) bar ranges rolling forward by ``step_bars`` (default ``test_bars``)."""
+    step_bars = step_bars or test_bars
+    return [((start, start + train_bars), (start + train_bars, start + train_bars + test_bars))
+            for start in range(0, n - train_bars - test_bars + 1, step_bars)]
+
+
+def walk_forward(bars, grid, margin, leverage, train_bars, test_bars, step_bars=None, metric="net_pnl",
+                 maximize=True, workers=None, **sim_kwargs):
+    """Walk-forward optimisation: on each fold pick the combination with the best
+    ``metric`` on the training range and report how it did on the following
+    test range. All folds are evaluated in a single sweep. Returns one row per fold."""
+    bars = np.ascontiguousarray(bars, dtype=float)
+    folds = walk_forward_windows(len(bars), train_bars, test_bars, step_bars)
+    if not folds:
+        raise ValueError(f"{len(bars)} bars are not enough for train={train_bars} + test={test_bars}")
+    windows = [window for fold in folds for window in fold]
+    results = sweep(bars, grid, margin, leverage, windows=windows, workers=workers, **sim_kwargs)
+
+    rows = []
+    for k, ((train_start, _), (test_start, test_end)) in enumerate(folds):
+        train = results[results["window"] == 2 * k]
+        best = train.loc[train[metric].idxmax() if maximize else train[metric].idxmin()]
+        params = best[list(PARAMS)]
+        test = results[results["window"] == 2 * k + 1]
+        chosen = test[(test[list(PARAMS)] == params.values).all(axis=1)].iloc[0]
+        rows.append({"fold": k, "train_start_ts": bars[train_start, 0], "test_start_ts": bars[test_start, 0],
+                     "test_end_ts": bars[test_end - 1, 0], **params.to_dict(), f"train_{metric}": best[metric],
+                     **{f"test_{m}": chosen[m] for m in METRICS}})
+    return pd.DataFrame(rows)
@@ -0,0 +1,360 @@
+import numpy as np
+import pandas as pd
+from dataclasses import dataclass, field
+from numpy.lib.stride_tricks import sliding_window_view
+
+from indicators.cci import cci_batch, CCI_CONSTANT, EPSILON
+from strategies.voger_strategy import pullback_signals, prepare_order_params
+
+VENUES = ("bitmart", "topone")
+# 吃單手續費率（名目價值比例），依帳戶等級調整
+DEFAULT_FEE_RATES = {"bitmart": 0.0006, "topone": 0.0006}
+LONG, SHORT = 1, -1
+TREND_UP, TREND_DOWN, TREND_NONE = 1, -1, 0
+
+
+# ---------- 訊號（與 signal_generation / mtf_trend / decide_direction 相同規則的陣列版） ----------
+def _rolling_prev(close, window, reducer):
+    # close.shift(1).rolling(window).max()/min()，以 window 次逐元素比較代替滑動視窗
+    n = len(close)
+    out = np.full(n, np.nan)
+    if window >= 1 and n > window:
+        acc = close[:n - window].copy()
+        for k in range(1, window):
+            reducer(acc, close[k:n - window + k], out=acc)
+        out[window:] = acc
+    return out
+
+
+def signal_arrays(high, low, close, cci_len=20, lookback_bars=5, pullback_len=5, pullback_pct=0.01, cci=None):
+    """LongSignal / ShortSignal of signal_generation for every bar of a history.
+
+    Each bar's value equals the last row of signal_generation run on the
+    trailing window ending at that bar. ``cci`` may be passed in when it was
+    already computed for this ``cci_len``.
+    """
+    close = np.asarray(close, dtype=float)
+    if cci is None:
+        cci = cci_batch(high, low, close, cci_len)
+    trend_up = cci >= 0
+    # shift(1).astype(bool) 把第一根的 NaN 視為 True
+    trend_up_prev = np.concatenate(([True], trend_up[:-1]))
+    with np.errstate(invalid='ignore'):
+        bull_cross = ~trend_up_prev & trend_up & (close > _rolling_prev(close, lookback_bars, np.maximum))
+        bear_cross = trend_up_prev & ~trend_up & (close < _rolling_prev(close, lookback_bars, np.minimum))
+    long_signal = pullback_signals(bull_cross, close, np.asarray(low, dtype=float), pullback_len, pullback_pct, bullish=True)
+    short_signal = pullback_signals(bear_cross, close, np.asarray(high, dtype=float), pullback_len, pullback_pct, bullish=False)
+    return long_signal, short_signal
+
+
+def trend_arrays(ts, high, low, close, base_interval=15, trend_interval=240, cci_len=20, at=None, chunk_size=1 << 16):
+    """mtf_trend per base bar: TREND_UP / TREND_DOWN, or TREND_NONE while no
+    complete higher-timeframe bucket exists yet ('無資料').
+
+    Like the live BarAggregator frame, the last higher-timeframe bar is the one
+    still forming, built from the base bars up to and including this one, and
+    buckets only partly covered by the history are left out. ``at`` limits the
+    CCI evaluation to those bar indices (e.g. the signal bars) and returns
+    their trends only.
+    """
+    ts = np.asarray(ts, dtype=np.int64)
+    n = len(ts)
+    at = np.arange(n) if at is None else np.asarray(at, dtype=np.int64)
+    trend = np.full(len(at), TREND_NONE, dtype=np.int8)
+    if n == 0:
+        return trend
+    step, base_step = trend_interval * 60, base_interval * 60
+    bucket = ts - ts % step
+    # ts 遞增，完整桶之後的K線是一段後綴
+    v0 = int(np.searchsorted(bucket, -(-ts[0] // step) * step))
+    if v0 == n:
+        return trend
+    high, low, close = (np.asarray(a, dtype=float)[v0:] for a in (high, low, close))
+    bucket = bucket[v0:]
+    gid = np.r_[0, np.cumsum(bucket[1:] != bucket[:-1])]
+    pos = (ts[v0:] - bucket) // base_step
+
+    # 以 (桶, 桶內位置) 矩陣做桶內累積最高/最低
+    h = np.full((gid[-1] + 1, step // base_step), np.nan)
+    l = np.full_like(h, np.nan)
+    h[gid, pos], l[gid, pos] = high, low
+    h, l = np.fmax.accumulate(h, axis=1), np.fmin.accumulate(l, axis=1)
+    partial_tp = (h[gid, pos] + l[gid, pos] + close) / 3
+    # 每桶最後一根的累積值即該桶完整K線
+    group_tp = partial_tp[np.flatnonzero(np.r_[gid[1:] != gid[:-1], True])]
+
+    selected = np.flatnonzero(at >= v0)
+    local = at[selected] - v0
+    # CCI 為 NaN（完整K線不足）時 mtf_trend 回傳空頭
+    trend[selected] = TREND_DOWN
+    if cci_len < 2 or len(group_tp) < cci_len:
+        return trend
+    ready = np.flatnonzero(gid[local] >= cci_len - 1)
+    prev = sliding_window_view(group_tp, cci_len - 1)
+    # 前 cci_len-1 根完整K線 + 形成中的一根
+    for lo in range(0, len(ready), chunk_size):
+        idx = ready[lo:lo + chunk_size]
+        window = prev[gid[local[idx]] - cci_len + 1]
+        tp = partial_tp[local[idx]]
+        mean = (window.sum(axis=1) + tp) / cci_len
+        md = (np.abs(window - mean[:, None]).sum(axis=1) + np.abs(tp - mean)) / cci_len
+        value = (tp - mean) / (CCI_CONSTANT * md + EPSILON)
+        trend[selected[idx]] = np.where(value >= 0, TREND_UP, TREND_DOWN)
+    return trend
+
+
+def desired_directions(long_signal, short_signal, trend=None):
+    """decide_direction per bar: LONG / SHORT / 0. ``trend`` None skips the 4h filter
+    (the DEBUG_MODE branch)."""
+    if trend is None:
+        return np.where(long_signal, LONG, np.where(short_signal, SHORT, 0)).astype(np.int8)
+    return np.where(long_signal & (trend != TREND_DOWN), LONG,
+                    np.where(short_signal & (trend != TREND_UP), SHORT, 0)).astype(np.int8)
+
+
+# ---------- 對沖兩腿的 TP/SL 模擬 ----------
+EXIT_TP, EXIT_SL, EXIT_LIQUIDATION, EXIT_SIGNAL, EXIT_OPEN = range(5)
+EXIT_REASONS = ("tp", "sl", "liquidation", "signal", "open")
+
+
+def first_touches(open_, high, low, starts, up, down, first_window=32, max_cells=1 << 22):
+    """For each i, the first bar >= starts[i] whose range reaches up[i] or down[i].
+
+    Returns (bar, price, hit_up); bar is len(high) when neither level is ever
+    reached. Gaps fill at the open; when both levels are inside one bar the
+    one nearer the open is taken first. All candidates are scanned together
+    in growing windows, so the cost follows the holding periods, not the
+    number of legs.
+    """
+    n, m = len(high), len(starts)
+    bar = np.full(m, n, dtype=np.int64)
+    pending = np.arange(m)
+    offset, size = 0, first_window
+    while len(pending):
+        lo = starts[pending] + offset
+        window = lo[:, None] + np.arange(size)
+        inside = window < n
+        window = np.minimum(window, n - 1)
+        hit = ((high[window] >= up[pending, None]) | (low[window] <= down[pending, None])) & inside
+        found = hit.any(axis=1)
+        bar[pending[found]] = window[found, hit[found].argmax(axis=1)]
+        pending = pending[~found & (lo + size < n)]
+        offset += size
+        size = max(first_window, min(size * 4, max_cells // max(len(pending), 1)))
+
+    touched = bar < n
+    k = np.minimum(bar, n - 1)
+    o = open_[k]
+    reach_up, reach_down = high[k] >= up, low[k] <= down
+    gap_up, gap_down = o >= up, o <= down
+    nearer_up = np.where(reach_up & reach_down, up - o <= o - down, reach_up)
+    hit_up = np.where(gap_up, True, np.where(gap_down, False, nearer_up)) & touched
+    price = np.where(gap_up | gap_down, o, np.where(hit_up, up, down))
+    return bar, np.where(touched, price, np.nan), hit_up
+
+
+@dataclass
+class BacktestResult:
+    trades: pd.DataFrame
+    equity: pd.DataFrame
+    summary: dict = field(default_factory=dict)
+
+
+def _leg_exits(bars, entry_bars, sides, bm_sides, margin, leverage, tp_percentage, sl_percentage,
+               maintenance_margin_rate):
+    """Natural exit of one leg opened at the close of each entry bar: (bar, price, reason)."""
+    open_, high, low, close = bars[:, 1], bars[:, 2], bars[:, 3], bars[:, 4]
+    price = close[entry_bars]
+    long_tp, long_sl = prepare_order_params('long', price, tp_percentage, sl_percentage)
+    short_tp, short_sl = prepare_order_params('short', price, tp_percentage, sl_percentage)
+    bm_tp = np.where(bm_sides == LONG, long_tp, short_tp)
+    bm_sl = np.where(bm_sides == LONG, long_sl, short_sl)
+    # TopOne 腿方向相反，TP/SL 對調
+    is_bitmart = sides == bm_sides
+    tp, sl = np.where(is_bitmart, bm_tp, bm_sl), np.where(is_bitmart, bm_sl, bm_tp)
+    liq = price * (1 - sides * (1 / leverage - maintenance_margin_rate))
+    is_long = sides == LONG
+    up = np.where(is_long, tp, np.minimum(sl, liq))
+    down = np.where(is_long, np.maximum(sl, liq), tp)
+    bar, fill, hit_up = first_touches(open_, high, low, entry_bars + 1, up, down)
+    liq_first = np.where(is_long, liq > sl, liq < sl)
+    reason = np.where(hit_up == is_long, EXIT_TP, np.where(liq_first, EXIT_LIQUIDATION, EXIT_SL))
+    reason[bar == len(bars)] = EXIT_OPEN
+    return bar, np.where(bar == len(bars), close[-1], fill), reason
+
+
+def _hedge_legs(bars, direction, margin, leverage, tp_percentage, sl_percentage, fee_rates=None,
+                initial_balance=None, maintenance_margin_rate=0.005):
+    """The legs simulate_hedge takes, as arrays, plus the per-venue fee rates."""
+    bars = np.asarray(bars, dtype=float)
+    close = bars[:, 4]
+    fee_rates = {**DEFAULT_FEE_RATES, **(fee_rates or {})}
+    fees = np.array([fee_rates[v] for v in VENUES])
+
+    # 每個候選進場點兩腿的自然出場（TP/SL/強平）先整批算好，逐訊號迴圈只做帳務
+    candidates = np.flatnonzero(direction)
+    directions = np.asarray(direction)[candidates].astype(np.int64)
+    entry_bars = np.repeat(candidates, 2)
+    bm_sides = np.repeat(directions, 2)
+    sides = bm_sides * np.tile([1, -1], len(candidates))
+    exit_bar, exit_price, reason = _leg_exits(bars, entry_bars, sides, bm_sides, margin, leverage,
+                                              tp_percentage, sl_percentage, maintenance_margin_rate)
+    exit_bar, exit_price, reason = exit_bar.tolist(), exit_price.tolist(), reason.tolist()
+    entry_price = close[entry_bars].tolist()
+    qty = (margin * leverage / close[entry_bars]).tolist()
+    close_list, side_list, fee_list = close.tolist(), sides.tolist(), fees.tolist()
+
+    taken = []
+    open_legs = []
+    hedge_side = 0
+    balance = None if initial_balance is None else [float(initial_balance)] * len(VENUES)
+
+    def settle(k):
+        if balance is not None:
+            gross = max(side_list[k] * qty[k] * (exit_price[k] - entry_price[k]), -margin)
+            balance[k % 2] += gross - fee_list[k % 2] * qty[k] * (entry_price[k] + exit_price[k])
+
+    for c, (j, d) in enumerate(zip(candidates.tolist(), directions.tolist())):
+        if open_legs:
+            # 本回合之前已在盤中觸發 TP/SL 的腿
+            for k in open_legs:
+                if exit_bar[k] <= j:
+                    settle(k)
+            open_legs = [k for k in open_legs if exit_bar[k] > j]
+        if balance is not None and any(balance[v] - margin * sum(k % 2 == v for k in open_legs) < margin
+                                       for v in range(len(VENUES))):
+            continue
+        if len(open_legs) == 2 and hedge_side == d:
+            continue
+        for k in open_legs:
+            exit_bar[k], exit_price[k], reason[k] = j, close_list[j], EXIT_SIGNAL
+            settle(k)
+        open_legs = [2 * c, 2 * c + 1]
+        taken += open_legs
+        hedge_side = d
+
+    taken = np.asarray(taken, dtype=np.int64)
+    legs = {
+        "venue": taken % 2,
+        "side": sides[taken],
+        "entry_bar": entry_bars[taken],
+        "entry_price": np.asarray(entry_price)[taken],
+        "qty": np.asarray(qty)[taken],
+        "exit_bar": np.asarray(exit_bar, dtype=np.int64)[taken],
+        "exit_price": np.asarray(exit_price)[taken],
+        "reason": np.asarray(reason, dtype=np.int64)[taken],
+    }
+    return legs, fees
+
+
+def _leg_pnl(legs, fees, margin):
+    # 強平最多損失該腿保證金
+    gross = np.maximum(legs["side"] * legs["qty"] * (legs["exit_price"] - legs["entry_price"]), -margin)
+    fee = fees[legs["venue"]] * legs["qty"] * (legs["entry_price"] + legs["exit_price"])
+    return gross - fee, fee
+
+
+def _equity_by_venue(legs, pnl, close, initial_balance):
+    n = len(close)
+    venue, entry_bar, exit_bar = legs["venue"], legs["entry_bar"], legs["exit_bar"]
+    entry_price, is_open = legs["entry_price"], legs["reason"] == EXIT_OPEN
+    start = 0.0 if initial_balance is None else float(initial_balance)
+    position = legs["side"] * legs["qty"]
+    by_venue = np.empty((len(VENUES), n))
+    for v in range(len(VENUES)):
+        mine = venue == v
+        closed = mine & ~is_open
+        realized = np.bincount(exit_bar[closed], weights=pnl[closed], minlength=n + 1)
+        # 持倉期間 [entry, exit) 以收盤價計未實現損益
+        held = np.bincount(entry_bar[mine], weights=position[mine], minlength=n + 1) \
+            - np.bincount(exit_bar[mine], weights=position[mine], minlength=n + 1)
+        cost = np.bincount(entry_bar[mine], weights=position[mine] * entry_price[mine], minlength=n + 1) \
+            - np.bincount(exit_bar[mine], weights=position[mine] * entry_price[mine], minlength=n + 1)
+        by_venue[v] = start + np.cumsum(realized)[:n] + close * np.cumsum(held)[:n] - np.cumsum(cost)[:n]
+    return by_venue
+
+
+def _summarize(legs, pnl, fee, total):
+    venue, is_open = legs["venue"], legs["reason"] == EXIT_OPEN
+    closed = ~is_open
+    return {
+        "bars": len(total),
+        "hedges": len(venue) // 2,
+        "net_pnl": float(pnl[closed].sum()),
+        "fees": float(fee[closed].sum()),
+        "pnl_by_venue": {name: float(pnl[closed & (venue == v)].sum()) for v, name in enumerate(VENUES)},
+        "exits": {name: int((legs["reason"] == code).sum()) for code, name in enumerate(EXIT_REASONS[:EXIT_OPEN])},
+        "leg_win_rate": float((pnl[closed] > 0).mean()) if closed.any() else None,
+        "max_drawdown": float((np.maximum.accumulate(total) - total).max()) if len(total) else 0.0,
+        "open_legs": int(is_open.sum()),
+    }
+
+
+def simulate_hedge(bars, direction, margin, leverage, tp_percentage, sl_percentage, fee_rates=None,
+                   initial_balance=None, maintenance_margin_rate=0.005):
+    """Replay run_voger_strategy's position logic over per-bar decisions.
+
+    At each bar with a direction (decided at its close, filled at its close):
+    with no position, open the hedge (Bitmart ``direction``, TopOne opposite,
+    TP/SL from prepare_order_params, TopOne's mirrored); with the same complete
+    hedge open, do nothing; otherwise close what is open and reopen. Each leg
+    exits on its own at TP, SL or liquidation, intrabar. Legs still open at
+    the end are marked 'open' at the last close. With ``initial_balance`` a
+    round is skipped when either venue's free balance is below ``margin``,
+    like MultiSymbolRunner's margin check.
+    """
+    bars = np.asarray(bars, dtype=float)
+    ts, close = bars[:, 0], bars[:, 4]
+    legs, fees = _hedge_legs(bars, direction, margin, leverage, tp_percentage, sl_percentage, fee_rates,
+                             initial_balance, maintenance_margin_rate)
+    pnl, fee = _leg_pnl(legs, fees, margin)
+    by_venue = _equity_by_venue(legs, pnl, close, initial_balance)
+    venue, side, exit_bar = legs["venue"], legs["side"], legs["exit_bar"]
+    last = max(len(close) - 1, 0)
+    trades = pd.DataFrame({
+        "venue": np.asarray(VENUES)[venue],
+        "side": np.where(side == LONG, "long", "short"),
+        "entry_ts": ts[legs["entry_bar"]],
+        "entry_price": legs["entry_price"],
+        "exit_ts": ts[np.minimum(exit_bar, last)],
+        "exit_price": legs["exit_price"],
+        "reason": np.asarray(EXIT_REASONS)[legs["reason"]],
+        "qty": legs["qty"],
+        "pnl": pnl,
+        "fee": fee,
+    })
+    equity = pd.DataFrame({"timestamp": ts, VENUES[0]: by_venue[0], VENUES[1]: by_venue[1]})
+    equity["total"] = by_venue.sum(axis=0)
+    return BacktestResult(trades, equity, _summarize(legs, pnl, fee, equity["total"].to_numpy()))
+
+
+def hedge_summary(bars, direction, margin, leverage, tp_percentage, sl_percentage, **sim_kwargs):
+    """simulate_hedge's summary only, without building the trade and equity frames."""
+    bars = np.asarray(bars, dtype=float)
+    legs, fees = _hedge_legs(bars, direction, margin, leverage, tp_percentage, sl_percentage, **sim_kwargs)
+    pnl, fee = _leg_pnl(legs, fees, margin)
+    total = _equity_by_venue(legs, pnl, bars[:, 4], sim_kwargs.get("initial_balance")).sum(axis=0)
+    return _summarize(legs, pnl, fee, total)
+
+
+def run_voger_backtest(bars, margin, leverage, tp_percentage, sl_percentage, lookback_bars=5, pullback_pct=0.01,
+                       cci_len=20, pullback_len=5, trend_filter=True, base_interval=15, trend_interval=240, **sim_kwargs):
+    """Backtest run_voger_strategy on 15m bars ([ts, O, H, L, C, V] rows, ts in seconds).
+
+    Parameters are the strategy's kwargs; ``trend_filter=False`` reproduces the
+    DEBUG_MODE branch of decide_direction without the debug signal sequence.
+    Decisions are taken at each bar close, i.e. the live round that runs right
+    after the bar closes. Returns a BacktestResult with the leg trades, the
+    per-venue and total equity at every bar close and a summary.
+    """
+    bars = np.asarray(bars, dtype=float)
+    high, low, close = bars[:, 2], bars[:, 3], bars[:, 4]
+    long_signal, short_signal = signal_arrays(high, low, close, cci_len, lookback_bars, pullback_len, pullback_pct)
+    trend = None
+    if trend_filter:
+        # 4h 趨勢只在有訊號的K線上才會用到
+        signal_bars = np.flatnonzero(long_signal | short_signal)
+        trend = np.full(len(bars), TREND_NONE, dtype=np.int8)
+        trend[signal_bars] = trend_arrays(bars[:, 0], high, low, close, base_interval, trend_interval, at=signal_bars)
+    direction = desired_directions(long_signal, short_signal, trend)
+    return simulate_hedge(bars, direction, margin, leverage, tp_percentage, sl_percentage, **sim_kwargs)
@@ -3,6 +3,8 @@ import logging
 
 from exchanges.bitmart_client import BitmartClient
 from exchanges.topone_client import TopOneClient
+from engine.hedge_execution import open_hedge
+from engine.confirmation import confirm_positions
 
 logger = logging.getLogger(__name__)
 
@@ -15,6 +17,8 @@ def run_hedge_strategy(bitmart_client: BitmartClient, topone_client: TopOneClien
     leverage = kwargs.get('leverage')
     tp_percentage = kwargs.get('tp_percentage')
     sl_percentage = kwargs.get('sl_percentage')
+    hold_seconds = kwargs.get('hold_seconds', 60)
+    confirm_timeout = kwargs.get('confirm_timeout', 15)
 
     results = {
         "strategy": "Hedge",
@@ -75,31 +79,28 @@ def run_hedge_strategy(bitmart_client: BitmartClient, topone_client: TopOneClien
     logger.info(f"TopOne TP: {topone_tp_price:.4f}, SL: {topone_sl_price:.4f}")
 
     logger.info("Opening Positions...")
-    bitmart_order_response = bitmart_client.place_order(
-        symbol=symbol,
-        side=bitmart_side,
-        margin=margin,
-        leverage=leverage,
-        tp_price=bitmart_tp_price,
-        sl_price=bitmart_sl_price
+    # 兩腿同時送出，縮短單邊裸露時間
+    hedge = open_hedge(
+        bitmart_client, topone_client, symbol, bitmart_side.lower(), margin, leverage,
+        bitmart_tp=bitmart_tp_price, bitmart_sl=bitmart_sl_price,
+        topone_tp=topone_tp_price, topone_sl=topone_sl_price,
+        unwind_on_failure=False  # 持倉結束後兩邊一起平倉
     )
+    bitmart_order_response = hedge["bitmart_order"]
+    topone_order_response = hedge["topone_order"]
+    results["leg_latency_ms"] = {k: hedge[k] for k in ("bitmart_ack_ms", "topone_ack_ms", "skew_ms")}
+
     if bitmart_order_response:
-        logger.info(f"Bitmart order placed successfully: {bitmart_order_response}")
+        logger.info("Bitmart order placed successfully.")
+        logger.debug("Bitmart order response: %s", bitmart_order_response)
         results["bitmart_order"] = bitmart_order_response
     else:
         logger.error("Failed to place Bitmart order.")
         results["message"] = "Failed to place Bitmart order."
 
-    topone_order_response = topone_client.place_order(
-        symbol=symbol,
-        side=topone_side,
-        margin=margin,
-        leverage=leverage,
-        tp_price=topone_tp_price,
-        sl_price=topone_sl_price
-    )
     if topone_order_response:
-        logger.info(f"TopOne order placed successfully: {topone_order_response}")
+        logger.info("TopOne order placed successfully.")
+        logger.debug("TopOne order response: %s", topone_order_response)
         results["topone_order"] = topone_order_response
     else:
         logger.error("Failed to place TopOne order.")
@@ -110,13 +111,20 @@ def run_hedge_strategy(bitmart_client: BitmartClient, topone_client: TopOneClien
         results["message"] = "No orders were placed."
         return results
 
-    logger.info("Holding positions for 1 minute...")
-    time.sleep(60)
+    clients = {"bitmart": bitmart_client, "topone": topone_client}
+    opened = {venue: True for venue, order in (("bitmart", bitmart_order_response), ("topone", topone_order_response)) if order}
+    # 持倉時間從交易所確認成交後起算，而非下單送出時
+    confirmations = confirm_positions(clients, symbol, opened, timeout=confirm_timeout)
+    results["open_confirm_ms"] = {venue: c.elapsed_ms for venue, c in confirmations.items()}
+
+    logger.info(f"Holding positions for {hold_seconds} seconds...")
+    time.sleep(hold_seconds)
 
     logger.info("Closing Positions...")
     bitmart_close_response = bitmart_client.close_position(symbol)
     if bitmart_close_response:
-        logger.info(f"Bitmart position closed successfully: {bitmart_close_response}")
+        logger.info("Bitmart position closed successfully.")
+        logger.debug("Bitmart close response: %s", bitmart_close_response)
         results["bitmart_close"] = bitmart_close_response
     else:
         logger.error("Failed to close Bitmart position.")
@@ -124,12 +132,19 @@ def run_hedge_strategy(bitmart_client: BitmartClient, topone_client: TopOneClien
 
     topone_close_response = topone_client.close_position(symbol)
     if topone_close_response:
-        logger.info(f"TopOne position closed successfully: {topone_close_response}")
+        logger.info("TopOne position closed successfully.")
+        logger.debug("TopOne close response: %s", topone_close_response)
         results["topone_close"] = topone_close_response
     else:
         logger.error("Failed to close TopOne position.")
         results["message"] += " Failed to close TopOne position."
 
+    closed = {venue: False for venue in opened}
+    confirmations = confirm_positions(clients, symbol, closed, timeout=confirm_timeout)
+    results["close_confirm_ms"] = {venue: c.elapsed_ms for venue, c in confirmations.items()}
+    if not all(c.confirmed for c in confirmations.values()):
+        logger.warning("Positions still open after close confirmation deadline.")
+
     results["status"] = "completed"
     results["message"] = "Hedge strategy completed."
     logger.info("Hedge Strategy Completed!")
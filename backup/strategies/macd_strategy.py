@@ -1,11 +1,12 @@
 import pandas as pd
-import ta
 from datetime import datetime, timedelta
 import time
 import logging
 
 from exchanges.bitmart_client import BitmartClient
 from exchanges.topone_client import TopOneClient
+from data.kline_cache import parse_kline_rows
+from indicators.engine import IndicatorEngine, MACD, CLOSE, get_indicator_engine
 
 logger = logging.getLogger(__name__)
 
@@ -48,28 +49,29 @@ def run_macd_strategy(bitmart_client: BitmartClient, topone_client: TopOneClient
         return results
 
     # --- Process K-line data ---
-    df = pd.DataFrame(kline_data, columns=['timestamp', 'open', 'high', 'low', 'close', 'volume'])
-    df['close'] = pd.to_numeric(df['close'])
-    df['timestamp'] = pd.to_datetime(df['timestamp'], unit='ms')
+    bars = parse_kline_rows(kline_data)
 
     # --- Calculate MACD ---
+    # 指標引擎跨回合保存狀態，每回合只折入新收盤的K線
     logger.info("Calculating MACD indicator...")
-    df['macd'] = ta.trend.macd(df['close'], window_slow=SLOW_PERIOD, window_fast=FAST_PERIOD, fillna=False)
-    df['macd_signal'] = ta.trend.macd_signal(df['close'], window_slow=SLOW_PERIOD, window_fast=FAST_PERIOD, window_sign=SIGNAL_PERIOD, fillna=False)
-    df['macd_diff'] = ta.trend.macd_diff(df['close'], window_slow=SLOW_PERIOD, window_fast=FAST_PERIOD, window_sign=SIGNAL_PERIOD, fillna=False)
+    engine = get_indicator_engine(
+        bitmart_client, ("macd_strategy", symbol, KLINE_INTERVAL),
+        lambda: IndicatorEngine(macd=MACD(FAST_PERIOD, SLOW_PERIOD, SIGNAL_PERIOD))
+    )
+    engine.ingest(bars)
+
+    # Get the last two MACD and Signal values to detect crosses
+    last_macd = engine.values['macd']['macd']
+    last_signal = engine.values['macd']['signal']
+    prev_macd = engine.committed['macd']['macd']
+    prev_signal = engine.committed['macd']['signal']
 
     # Ensure we have enough data for MACD calculation
-    if len(df) < SLOW_PERIOD + SIGNAL_PERIOD:
+    if pd.isna(prev_signal) or pd.isna(last_signal):
         logger.warning("Not enough K-line data to calculate MACD. Please increase KLINE_LIMIT.")
         results["message"] = "Not enough K-line data for MACD."
         return results
 
-    # Get the last two MACD and Signal values to detect crosses
-    last_macd = df['macd'].iloc[-1]
-    last_signal = df['macd_signal'].iloc[-1]
-    prev_macd = df['macd'].iloc[-2]
-    prev_signal = df['macd_signal'].iloc[-2]
-
     logger.info(f"Last MACD: {last_macd:.4f}, Last Signal: {last_signal:.4f}")
     logger.info(f"Previous MACD: {prev_macd:.4f}, Previous Signal: {prev_signal:.4f}")
 
@@ -88,7 +90,7 @@ def run_macd_strategy(bitmart_client: BitmartClient, topone_client: TopOneClient
         return results
 
     # --- Execute trades based on signal ---
-    current_price = df['close'].iloc[-1] # Use the latest close price as current price
+    current_price = bars[-1][CLOSE] # Use the latest close price as current price
     logger.info(f"Current price for order execution: {current_price}")
 
     if signal == "golden_cross":
@@ -1,11 +1,11 @@
 import pandas as pd
-import ta
 from datetime import datetime, timedelta
 import time
 import logging
 
 from exchanges.bitmart_client import BitmartClient
 from exchanges.topone_client import TopOneClient
+from indicators.engine import IndicatorEngine, RSI, get_indicator_engine
 
 logger = logging.getLogger(__name__)
 
@@ -74,8 +74,9 @@ def run_rsi_strategy(bitmart_client: BitmartClient, topone_client: TopOneClient,
         logger.info("K-line data is in array format")
         df = pd.DataFrame(kline_data, columns=['timestamp', 'open', 'high', 'low', 'close', 'volume'])
     
-    # Debug: Check raw data after initial processing
-    logger.info(f"Raw close prices before conversion: {df['close'].head().tolist()}")
+    # Debug: Check raw data after initial processing（只在啟用 DEBUG 時才取樣）
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug(f"Raw close prices before conversion: {df['close'].head().tolist()}")
     
     # Convert data types with error handling
     df['close'] = pd.to_numeric(df['close'], errors='coerce')
@@ -106,11 +107,20 @@ def run_rsi_strategy(bitmart_client: BitmartClient, topone_client: TopOneClient,
     
     # Debug: Log some data info
     logger.info(f"K-line data: {len(df)} bars")
-    logger.info(f"Price range: {df['close'].min():.2f} - {df['close'].max():.2f}")
-    logger.info(f"Latest prices: {df['close'].tail(5).tolist()}")
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug(f"Price range: {df['close'].min():.2f} - {df['close'].max():.2f}")
+        logger.debug(f"Latest prices: {df['close'].tail(5).tolist()}")
     
-    # Calculate RSI with proper handling
-    df['rsi'] = ta.momentum.rsi(df['close'], window=RSI_PERIOD, fillna=False)
+    # Calculate RSI incrementally: the engine keeps its state between rounds,
+    # so only bars that closed since the last round are folded in
+    engine = get_indicator_engine(
+        bitmart_client, ("rsi_strategy", symbol, KLINE_INTERVAL),
+        lambda: IndicatorEngine(rsi=RSI(RSI_PERIOD))
+    )
+    bars = df[['timestamp', 'open', 'high', 'low', 'close', 'volume']].assign(
+        timestamp=df['timestamp'].values.astype('datetime64[s]').astype('int64')
+    ).to_numpy(dtype=float)
+    engine.ingest(bars)
 
     # Ensure we have enough data for RSI calculation
     if len(df) < RSI_PERIOD:
@@ -119,15 +129,14 @@ def run_rsi_strategy(bitmart_client: BitmartClient, topone_client: TopOneClient,
         return results
 
     # Check for valid RSI value
-    last_rsi = df['rsi'].iloc[-1]
+    last_rsi = engine.values['rsi']
     
     # Validate RSI value
     if pd.isna(last_rsi):
-        logger.error("RSI calculation resulted in NaN. Checking recent RSI values...")
+        logger.error("RSI calculation resulted in NaN. Checking last closed-bar RSI...")
         # Try to get the last valid RSI value
-        valid_rsi_values = df['rsi'].dropna()
-        if len(valid_rsi_values) > 0:
-            last_rsi = valid_rsi_values.iloc[-1]
+        last_rsi = engine.committed['rsi']
+        if not pd.isna(last_rsi):
             logger.info(f"Using last valid RSI: {last_rsi:.2f}")
         else:
             logger.error("No valid RSI values found. Cannot proceed.")
@@ -138,16 +147,11 @@ def run_rsi_strategy(bitmart_client: BitmartClient, topone_client: TopOneClient,
     if last_rsi < 0 or last_rsi > 100:
         logger.error(f"RSI value out of range: {last_rsi:.2f}. This indicates a calculation error.")
         # Log recent RSI values for debugging
-        recent_rsi = df['rsi'].tail(10).dropna()
-        logger.info(f"Recent RSI values: {recent_rsi.tolist()}")
+        logger.info(f"Recent RSI values: closed={engine.committed['rsi']}, forming={engine.values['rsi']}")
         results["message"] = f"Invalid RSI value: {last_rsi:.2f}"
         return results
     
-    logger.info(f"Last RSI: {last_rsi:.2f}")
-    
-    # Log additional RSI info for debugging
-    rsi_stats = df['rsi'].describe()
-    logger.info(f"RSI stats - Min: {rsi_stats['min']:.2f}, Max: {rsi_stats['max']:.2f}, Mean: {rsi_stats['mean']:.2f}")
+    logger.info(f"Last RSI: {last_rsi:.2f}, previous closed-bar RSI: {engine.committed['rsi']:.2f}")
 
     # --- Check current positions first ---
     logger.info("Fetching current positions...")
@@ -169,9 +173,7 @@ def run_rsi_strategy(bitmart_client: BitmartClient, topone_client: TopOneClient,
             
             # Get contract size to convert contract count to actual size
             try:
-                details_data = bitmart_client.futuresAPI.get_details(symbol)[0]['data']
-                symbol_details = details_data['symbols'][0]
-                contract_size = float(symbol_details['contract_size'])
+                contract_size = bitmart_client.get_contract_spec(symbol).contract_size
                 
                 # Convert contract amount to actual position size
                 actual_position_size = current_amount * contract_size
@@ -0,0 +1,184 @@
+# Voger 回測：陣列版訊號 / 4h 趨勢 / 對沖模擬 vs. 逐根參考實作，以及每秒可回放的K線數
+#
+# 檢查:
+#   - signal_arrays 每一根 == signal_generation 對該根結尾 200 根視窗的最後一列
+#   - trend_arrays 每一根 == BarAggregator 逐根餵入後 mtf_trend(frame(240, 60))
+#   - simulate_hedge 的成交與權益曲線 == 逐根持倉的參考迴圈
+# 用法: python -m benchmarks.backtest_bench
+
+import time
+import numpy as np
+
+from backtest.voger_backtest import (signal_arrays, trend_arrays, desired_directions, simulate_hedge,
+                                     run_voger_backtest, DEFAULT_FEE_RATES, VENUES, LONG, TREND_UP, TREND_DOWN,
+                                     TREND_NONE)
+from data.bar_aggregator import BarAggregator
+from data.kline_cache import bars_to_df
+from indicators.cci import cci_batch
+from strategies.voger_strategy import signal_generation, prepare_order_params
+
+STRATEGY = dict(margin=10, leverage=20, tp_percentage=1.5, sl_percentage=1.0)
+
+
+def synthetic_bars(n, seed=0, start=1_600_000_000 + 7 * 900):
+    """15m bars of a random walk; ``start`` deliberately not aligned to 4h."""
+    rng = np.random.default_rng(seed)
+    close = 100 * np.exp(np.cumsum(rng.normal(0, 0.004, n)))
+    open_ = np.r_[close[0], close[:-1]] * np.exp(rng.normal(0, 0.0005, n))
+    wick = np.abs(rng.normal(0, 0.002, (2, n))) * close
+    bars = np.empty((n, 6))
+    bars[:, 0] = start - start % 900 + np.arange(n) * 900
+    bars[:, 1], bars[:, 4] = open_, close
+    bars[:, 2] = np.maximum(open_, close) + wick[0]
+    bars[:, 3] = np.minimum(open_, close) - wick[1]
+    bars[:, 5] = rng.random(n) * 1000
+    return bars
+
+
+def check_signals(n=3000, window=200, params=((20, 5, 5, 0.01), (14, 3, 2, 0.002), (30, 8, 1, 0.0))):
+    bars = synthetic_bars(n, seed=1)
+    checked = 0
+    for cci_len, lookback, pullback_len, pullback_pct in params:
+        long_signal, short_signal = signal_arrays(bars[:, 2], bars[:, 3], bars[:, 4], cci_len, lookback,
+                                                  pullback_len, pullback_pct)
+        for i in range(window - 1, n):
+            df = signal_generation(bars_to_df(bars[i - window + 1:i + 1]), cci_len, lookback, pullback_len, pullback_pct)
+            assert df['LongSignal'].iloc[-1] == long_signal[i], (cci_len, i)
+            assert df['ShortSignal'].iloc[-1] == short_signal[i], (cci_len, i)
+            checked += 1
+    print(f"訊號等價: {checked} 根，其中訊號 {int(long_signal.sum() + short_signal.sum())} 根（最後一組參數）")
+
+
+def check_trend(n=3000):
+    bars = synthetic_bars(n, seed=2)
+    trend = trend_arrays(bars[:, 0], bars[:, 2], bars[:, 3], bars[:, 4])
+    sample = np.arange(0, n, 7)
+    assert np.array_equal(trend_arrays(bars[:, 0], bars[:, 2], bars[:, 3], bars[:, 4], at=sample), trend[sample])
+    aggregator = BarAggregator(15, [240])
+    counts = {TREND_UP: 0, TREND_DOWN: 0, TREND_NONE: 0}
+    for i, bar in enumerate(bars):
+        aggregator.update(bar)
+        frame = aggregator.frame(240, 60)
+        if frame is None:
+            expected = TREND_NONE
+        else:
+            value = cci_batch(frame['High'], frame['Low'], frame['Close'], 20)[-1]
+            if abs(value) < 1e-6:
+                continue  # 浮點誤差可能翻轉符號
+            expected = TREND_UP if value >= 0 else TREND_DOWN
+        assert trend[i] == expected, (i, trend[i], expected)
+        counts[expected] += 1
+    print(f"4h 趨勢等價: {n} 根 (多頭 {counts[TREND_UP]} / 空頭 {counts[TREND_DOWN]} / 無資料 {counts[TREND_NONE]})")
+
+
+def reference_hedge(bars, direction, margin, leverage, tp_percentage, sl_percentage, initial_balance=None,
+                    maintenance_margin_rate=0.005):
+    """Bar-by-bar position book: intrabar exits first, then the decision at the close."""
+    ts, open_, high, low, close = bars[:, 0], bars[:, 1], bars[:, 2], bars[:, 3], bars[:, 4]
+    fees = [DEFAULT_FEE_RATES[v] for v in VENUES]
+    balance = [float(initial_balance or 0.0)] * 2
+    trades, book, equity = [], [], []
+    hedge_side = 0
+
+    def close_leg(leg, t, price, reason):
+        gross = max(leg["side"] * leg["qty"] * (price - leg["entry"]), -margin)
+        fee = fees[leg["venue"]] * leg["qty"] * (leg["entry"] + price)
+        balance[leg["venue"]] += gross - fee
+        trades.append((leg["venue"], leg["side"], ts[leg["bar"]], leg["entry"], ts[t], price, reason, gross - fee))
+
+    for t in range(len(bars)):
+        for leg in list(book):
+            if leg["bar"] >= t:
+                continue
+            up, down, o = leg["up"], leg["down"], open_[t]
+            hit_up, hit_down = high[t] >= up, low[t] <= down
+            if not (hit_up or hit_down):
+                continue
+            if o >= up:
+                price, hit_up = o, True
+            elif o <= down:
+                price, hit_up = o, False
+            else:
+                if hit_up and hit_down:
+                    hit_up = up - o <= o - down
+                price = up if hit_up else down
+            if hit_up == (leg["side"] == LONG):
+                reason = "tp"
+            else:
+                liq_first = leg["liq"] > leg["sl"] if leg["side"] == LONG else leg["liq"] < leg["sl"]
+                reason = "liquidation" if liq_first else "sl"
+            close_leg(leg, t, price, reason)
+            book.remove(leg)
+
+        d = int(direction[t])
+        skip = initial_balance is not None and any(
+            balance[v] - margin * sum(leg["venue"] == v for leg in book) < margin for v in range(2))
+        if d and not skip and not (len(book) == 2 and hedge_side == d):
+            for leg in book:
+                close_leg(leg, t, close[t], "signal")
+            book = []
+            price = close[t]
+            bm_tp, bm_sl = prepare_order_params('long' if d == LONG else 'short', price, tp_percentage, sl_percentage)
+            for venue, side, tp, sl in ((0, d, bm_tp, bm_sl), (1, -d, bm_sl, bm_tp)):
+                liq = price * (1 - side * (1 / leverage - maintenance_margin_rate))
+                up, down = (tp, max(sl, liq)) if side == LONG else (min(sl, liq), tp)
+                book.append(dict(venue=venue, side=side, bar=t, entry=price, qty=margin * leverage / price,
+                                 up=up, down=down, sl=sl, liq=liq))
+            hedge_side = d
+
+        equity.append(sum(balance) + sum(leg["side"] * leg["qty"] * (close[t] - leg["entry"]) for leg in book))
+    return trades, np.array(equity), len(book)
+
+
+def check_simulation(n=20_000):
+    bars = synthetic_bars(n, seed=3)
+    long_signal, short_signal = signal_arrays(bars[:, 2], bars[:, 3], bars[:, 4])
+    trend = trend_arrays(bars[:, 0], bars[:, 2], bars[:, 3], bars[:, 4])
+    cases = 0
+    for direction in (desired_directions(long_signal, short_signal, trend),
+                      desired_directions(long_signal, short_signal)):
+        for leverage, tp, sl, initial_balance in ((20, 1.5, 1.0, None), (50, 0.4, 3.0, None), (125, 5.0, 5.0, None),
+                                                  (20, 1.5, 1.0, 25.0)):
+            kwargs = dict(margin=10, leverage=leverage, tp_percentage=tp, sl_percentage=sl)
+            result = simulate_hedge(bars, direction, initial_balance=initial_balance, **kwargs)
+            trades, equity, still_open = reference_hedge(bars, direction, initial_balance=initial_balance, **kwargs)
+            closed = result.trades[result.trades["reason"] != "open"]
+            got = sorted(zip(closed["venue"].map(VENUES.index), closed["side"].map({'long': 1, 'short': -1}),
+                             closed["entry_ts"], closed["entry_price"], closed["exit_ts"], closed["exit_price"],
+                             closed["reason"], closed["pnl"]))
+            expected = sorted(trades)
+            assert len(got) == len(expected), (leverage, len(got), len(expected))
+            for a, b in zip(got, expected):
+                assert a[:3] == b[:3] and a[4] == b[4] and a[6] == b[6], (a, b)
+                assert np.allclose([a[3], a[5], a[7]], [b[3], b[5], b[7]]), (a, b)
+            assert (result.trades["reason"] == "open").sum() == still_open
+            assert np.allclose(result.equity["total"].to_numpy(), equity), leverage
+            cases += 1
+    print(f"對沖模擬等價: {cases} 組參數，最後一組 {len(result.trades)} 筆腿, {result.summary['exits']}")
+
+
+def run():
+    check_signals()
+    check_trend()
+    check_simulation()
+    for n in (35_040, 1_000_000, 4_000_000):
+        bars = synthetic_bars(n)
+        t0 = time.perf_counter()
+        long_signal, short_signal = signal_arrays(bars[:, 2], bars[:, 3], bars[:, 4])
+        t1 = time.perf_counter()
+        signal_bars = np.flatnonzero(long_signal | short_signal)
+        trend = np.full(n, TREND_NONE, dtype=np.int8)
+        trend[signal_bars] = trend_arrays(bars[:, 0], bars[:, 2], bars[:, 3], bars[:, 4], at=signal_bars)
+        t2 = time.perf_counter()
+        result = simulate_hedge(bars, desired_directions(long_signal, short_signal, trend), **STRATEGY)
+        t3 = time.perf_counter()
+        total_result = run_voger_backtest(bars, **STRATEGY)
+        total = time.perf_counter() - t3
+        assert total_result.trades.equals(result.trades)
+        print(f"{n:>10,} bars  total={total * 1000:8.1f}ms ({n / total / 1e6:5.2f}M bars/s)  "
+              f"signals={(t1 - t0) * 1000:7.1f}ms trend={(t2 - t1) * 1000:7.1f}ms "
+              f"simulate={(t3 - t2) * 1000:7.1f}ms  hedges={result.summary['hedges']}")
+
+
+if __name__ == "__main__":
+    run()
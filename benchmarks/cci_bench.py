@@ -0,0 +1,79 @@
+# CCI：原本 rolling().apply(lambda) vs. cci_batch 滑動視窗 vs. StreamingCCI 逐根更新
+#
+# 同時驗證三者結果在浮點誤差內一致。
+# 用法: python -m benchmarks.cci_bench
+
+import time
+import numpy as np
+import pandas as pd
+
+from indicators.cci import cci_batch, StreamingCCI
+
+
+def reference_cci(df, period=20):
+    """The original strategies.voger_strategy.cci, verbatim."""
+    tp = (df['High'] + df['Low'] + df['Close']) / 3
+    ma = tp.rolling(period).mean()
+    md = tp.rolling(period).apply(lambda x: np.mean(np.abs(x - np.mean(x))), raw=True)
+    return (tp - ma) / (0.015 * md + 1e-9)
+
+
+def synthetic_df(n, seed=0, with_nan=False):
+    rng = np.random.default_rng(seed)
+    close = 100 + np.cumsum(rng.normal(0, 0.5, n))
+    spread = rng.random(n)
+    df = pd.DataFrame({'High': close + spread, 'Low': close - spread, 'Close': close})
+    if with_nan and n > 10:
+        df.iloc[rng.integers(0, n, 3), 2] = np.nan
+    return df
+
+
+def streaming_cci(df, period):
+    stream = StreamingCCI(period)
+    return np.array([stream.update(h, l, c) for h, l, c in zip(df['High'], df['Low'], df['Close'])])
+
+
+def check_equivalence():
+    for n in (0, 5, 19, 20, 21, 300, 20_000):
+        for period in (1, 5, 14, 20, 50):
+            for with_nan in (False, True):
+                df = synthetic_df(n, seed=n + period, with_nan=with_nan)
+                expected = reference_cci(df, period).to_numpy()
+                for name, got in (("batch", cci_batch(df['High'], df['Low'], df['Close'], period)),
+                                  ("streaming", streaming_cci(df, period))):
+                    assert np.array_equal(np.isnan(expected), np.isnan(got)), (name, n, period, with_nan)
+                    assert np.allclose(expected, got, rtol=1e-7, atol=1e-6, equal_nan=True), (name, n, period, with_nan)
+    print("等價性檢查通過")
+
+
+def _time(fn, *args):
+    t0 = time.perf_counter()
+    fn(*args)
+    return time.perf_counter() - t0
+
+
+def run():
+    check_equivalence()
+    for n in (200, 100_000, 1_000_000):
+        df = synthetic_df(n)
+        t_batch = _time(cci_batch, df['High'], df['Low'], df['Close'], 20)
+        line = f"{n:>10,} bars  batch={t_batch * 1000:9.2f}ms"
+        if n <= 100_000:
+            line += f"  original={_time(reference_cci, df, 20) * 1000:9.2f}ms"
+        print(line)
+
+    # 逐根更新：單根成本與歷史長度無關
+    df = synthetic_df(100_000)
+    stream = StreamingCCI(20)
+    stream.seed(df['High'].iloc[:-1000], df['Low'].iloc[:-1000], df['Close'].iloc[:-1000])
+    tail = df.iloc[-1000:]
+    t0 = time.perf_counter()
+    for h, l, c in zip(tail['High'], tail['Low'], tail['Close']):
+        stream.update(h, l, c)
+    per_bar = (time.perf_counter() - t0) / 1000
+    t_full = _time(reference_cci, df.iloc[-200:], 20)
+    print(f"streaming update={per_bar * 1e6:7.2f}us/bar  vs. recomputing 200 bars with original={t_full * 1e6:9.1f}us")
+
+
+if __name__ == "__main__":
+    run()
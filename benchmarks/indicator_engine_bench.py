@@ -0,0 +1,86 @@
+# IndicatorEngine 逐根更新 vs. 每回合用 ta / pandas 重算整個視窗
+#
+# 先驗證與 ta / pandas 結果一致（含形成中K線修訂與序列化還原），再比較每回合成本。
+# 用法: python -m benchmarks.indicator_engine_bench
+
+import json
+import time
+import numpy as np
+import pandas as pd
+import ta
+
+from indicators.engine import IndicatorEngine, CCI, RSI, MACD, RollingExtreme, CLOSE, HIGH
+from benchmarks.cci_bench import reference_cci
+
+
+def synthetic_bars(n, seed=3):
+    rng = np.random.default_rng(seed)
+    close = 100 + np.cumsum(rng.normal(0, 1, n))
+    high, low = close + rng.random(n), close - rng.random(n)
+    return np.c_[np.arange(n) * 60.0, close, high, low, close, np.ones(n)]
+
+
+def make_engine():
+    return IndicatorEngine(cci=CCI(20), rsi=RSI(14), macd=MACD(12, 26, 9),
+                           prev_high=RollingExtreme(5, CLOSE, "max"), low_high=RollingExtreme(7, HIGH, "min"))
+
+
+def references(bars):
+    df = pd.DataFrame({'High': bars[:, 2], 'Low': bars[:, 3], 'Close': bars[:, 4]})
+    return {
+        "cci": reference_cci(df, 20).to_numpy(),
+        "rsi": ta.momentum.rsi(df['Close'], window=14, fillna=False).to_numpy(),
+        "macd": ta.trend.macd(df['Close'], window_slow=26, window_fast=12, fillna=False).to_numpy(),
+        "signal": ta.trend.macd_signal(df['Close'], window_slow=26, window_fast=12, window_sign=9, fillna=False).to_numpy(),
+        "diff": ta.trend.macd_diff(df['Close'], window_slow=26, window_fast=12, window_sign=9, fillna=False).to_numpy(),
+        "prev_high": df['Close'].rolling(5).max().to_numpy(),
+        "low_high": df['High'].rolling(7).min().to_numpy(),
+    }
+
+
+def _check(values, refs, i):
+    flat = {"cci": values["cci"], "rsi": values["rsi"], "prev_high": values["prev_high"],
+            "low_high": values["low_high"], **values["macd"]}
+    for name, got in flat.items():
+        assert np.allclose(got, refs[name][i], rtol=1e-9, atol=1e-7, equal_nan=True), (name, i, got, refs[name][i])
+
+
+def check_equivalence(n=600):
+    bars = synthetic_bars(n)
+    refs = references(bars)
+    engine = make_engine()
+    for i, bar in enumerate(bars):
+        # 先送一根價格不同的形成中K線，再修訂成最終值
+        forming = bar.copy()
+        forming[CLOSE] += 5
+        forming[HIGH] = forming[CLOSE] + 3
+        engine.update(forming)
+        _check(engine.update(bar), refs, i)
+        if i == n // 2:
+            engine = IndicatorEngine.from_dict(json.loads(json.dumps(engine.to_dict())))
+            _check(engine.values, refs, i)
+    print("等價性檢查通過 (CCI / RSI / MACD / rolling high-low)")
+
+
+def run():
+    check_equivalence()
+    window = 200
+    bars = synthetic_bars(window + 1000)
+    engine = make_engine()
+    engine.ingest(bars[:window])
+
+    t0 = time.perf_counter()
+    for bar in bars[window:]:
+        engine.update(bar)
+    per_round_engine = (time.perf_counter() - t0) / 1000
+
+    t0 = time.perf_counter()
+    for end in range(window, window + 20):
+        references(bars[end - window:end])
+    per_round_full = (time.perf_counter() - t0) / 20
+
+    print(f"每回合成本: 引擎逐根更新={per_round_engine * 1e6:8.1f}us  重算 {window} 根={per_round_full * 1e6:8.1f}us")
+
+
+if __name__ == "__main__":
+    run()
@@ -0,0 +1,51 @@
+# LogTail：儀表板每秒刷新時，整份讀取 backend_logs.txt 與增量讀取的成本比較
+#
+# 用法: python -m benchmarks.log_tail_bench [日誌大小MB]
+
+import os
+import sys
+import time
+import tempfile
+
+from engine.log_tail import LogTail
+
+LINE = "2024-01-01 00:00:00,000 - INFO - strategies.voger_strategy - 第 {i} 回合的策略結果: {{'status': 'no_action', 'bitmart_order': {{'code': 1000, 'data': {{'order_id': 123456789}}}}}}\n"
+
+
+def run(size_mb=50):
+    path = os.path.join(tempfile.mkdtemp(), "backend_logs.txt")
+    with open(path, "w", encoding="utf-8") as f:
+        i = 0
+        while f.tell() < size_mb * 1024 * 1024:
+            f.write(LINE.format(i=i))
+            i += 1
+
+    start = time.perf_counter()
+    with open(path, "r", encoding="utf-8") as f:
+        f.read()
+    full_ms = (time.perf_counter() - start) * 1000
+
+    tail = LogTail(path, max_lines=500)
+    start = time.perf_counter()
+    tail.poll()
+    first_ms = (time.perf_counter() - start) * 1000
+
+    # 每次刷新之間新增 20 行
+    timings = []
+    for n in range(100):
+        with open(path, "a", encoding="utf-8") as f:
+            for j in range(20):
+                f.write(LINE.format(i=i + n * 20 + j))
+        start = time.perf_counter()
+        tail.poll()
+        tail.lines(keyword="no_action")
+        timings.append((time.perf_counter() - start) * 1000)
+    timings.sort()
+    print(f"{size_mb}MB 日誌: 整份讀取 {full_ms:.1f}ms, LogTail 首次 {first_ms:.2f}ms, "
+          f"之後每次 p50 {timings[50]:.3f}ms / max {timings[-1]:.3f}ms, 保留 {len(tail.entries)} 行")
+    assert tail.lines()[-1].startswith("2024") and len(tail.entries) == 500
+    os.remove(path)
+
+
+if __name__ == "__main__":
+    run(int(sys.argv[1]) if len(sys.argv) > 1 else 50)
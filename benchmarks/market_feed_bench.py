@@ -0,0 +1,180 @@
+# 串流行情 MarketDataFeed 對本地 websocket 替身：報價讀取延遲、斷線時 REST 備援、重新連線
+#
+# 用法: python -m benchmarks.market_feed_bench
+
+import json
+import time
+import socket
+import base64
+import struct
+import hashlib
+import threading
+import socketserver
+
+from data.market_feed import MarketDataFeed
+
+WS_GUID = "258EAFA5-E914-47DA-95CA-C5AB0DC85B11"
+REST_LATENCY = 0.02  # 模擬一次 REST get_depth 的往返時間
+
+
+def _send_frame(sock, payload, opcode=0x1):
+    header = bytes([0x80 | opcode])
+    n = len(payload)
+    if n < 126:
+        header += bytes([n])
+    elif n < 1 << 16:
+        header += bytes([126]) + struct.pack(">H", n)
+    else:
+        header += bytes([127]) + struct.pack(">Q", n)
+    sock.sendall(header + payload)
+
+
+def _recv_exact(sock, n):
+    data = b""
+    while len(data) < n:
+        chunk = sock.recv(n - len(data))
+        if not chunk:
+            raise ConnectionError("closed")
+        data += chunk
+    return data
+
+
+def _recv_frame(sock):
+    b0, b1 = _recv_exact(sock, 2)
+    n = b1 & 0x7F
+    if n == 126:
+        n = struct.unpack(">H", _recv_exact(sock, 2))[0]
+    elif n == 127:
+        n = struct.unpack(">Q", _recv_exact(sock, 8))[0]
+    mask = _recv_exact(sock, 4) if b1 & 0x80 else b"\0\0\0\0"
+    payload = bytes(b ^ mask[i % 4] for i, b in enumerate(_recv_exact(sock, n)))
+    return b0 & 0x0F, payload
+
+
+class _WsHandler(socketserver.BaseRequestHandler):
+    """Minimal RFC 6455 server speaking the Bitmart futures public channels."""
+
+    def handle(self):
+        sock = self.request
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        request = b""
+        while b"\r\n\r\n" not in request:
+            request += sock.recv(4096)
+        key = next(line.split(":", 1)[1].strip() for line in request.decode().split("\r\n")
+                   if line.lower().startswith("sec-websocket-key"))
+        accept = base64.b64encode(hashlib.sha1((key + WS_GUID).encode()).digest()).decode()
+        sock.sendall(("HTTP/1.1 101 Switching Protocols\r\nUpgrade: websocket\r\nConnection: Upgrade\r\n"
+                      f"Sec-WebSocket-Accept: {accept}\r\n\r\n").encode())
+        self.server.connections.append(sock)
+        subscribed = []
+        pusher = threading.Thread(target=self._push, args=(sock, subscribed), daemon=True)
+        pusher.start()
+        try:
+            while True:
+                opcode, payload = _recv_frame(sock)
+                if opcode == 0x8:
+                    _send_frame(sock, b"", 0x8)
+                    break
+                if opcode == 0x9:
+                    _send_frame(sock, payload, 0xA)
+                elif opcode == 0x1:
+                    msg = json.loads(payload)
+                    if msg.get("action") == "subscribe":
+                        subscribed.extend(msg["args"])
+        except (ConnectionError, OSError):
+            pass
+
+    def _push(self, sock, subscribed):
+        price = 100.0
+        try:
+            while True:
+                price += 0.01
+                for group in list(subscribed):
+                    channel, symbol = group.split(":")
+                    if channel == "futures/ticker":
+                        data = {"symbol": symbol, "last_price": f"{price:.2f}", "bid_price": f"{price - 0.05:.2f}",
+                                "ask_price": f"{price + 0.05:.2f}", "bid_vol": "10", "ask_vol": "12"}
+                    elif channel.startswith("futures/depth"):
+                        data = {"symbol": symbol, "way": 1, "depths": [{"price": f"{price - 0.05:.2f}", "vol": "10"}]}
+                    else:
+                        ts = int(time.time()) // 900 * 900
+                        data = {"symbol": symbol, "items": [{"o": "100", "h": f"{price:.2f}", "l": "99",
+                                                             "c": f"{price:.2f}", "v": "5", "ts": ts}]}
+                    _send_frame(sock, json.dumps({"group": group, "data": data}).encode())
+                time.sleep(0.01)
+        except OSError:
+            pass
+
+
+class _WsServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, address):
+        super().__init__(address, _WsHandler)
+        self.connections = []
+
+    def drop_all(self):
+        self.shutdown()
+        self.server_close()
+        for sock in self.connections:
+            try:
+                sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+
+
+def start_ws_stand_in(port=0):
+    server = _WsServer(("127.0.0.1", port))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"ws://127.0.0.1:{server.server_address[1]}"
+
+
+def fake_rest_top_of_book(symbol):
+    time.sleep(REST_LATENCY)
+    return {"bid": 99.0, "ask": 99.1, "bid_size": 1.0, "ask_size": 1.0}
+
+
+def _wait(predicate, timeout=5.0):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if predicate():
+            return True
+        time.sleep(0.01)
+    return False
+
+
+def run():
+    server, url = start_ws_stand_in()
+    port = server.server_address[1]
+    feed = MarketDataFeed(["ETHUSDT"], url=url, rest_fetch=fake_rest_top_of_book, kline_steps=[15],
+                          stale_after=0.5, poll_interval=0.1, reconnect_delay=0.2).start()
+
+    assert _wait(lambda: feed.stream_healthy("ETHUSDT")), "stream never became healthy"
+    assert feed.klines.get(("ETHUSDT", 15)) is not None
+    quote = feed.quote("ETHUSDT")
+    print(f"串流報價: bid={quote.bid} ask={quote.ask} last={quote.last} source={quote.source}")
+
+    n = 100_000
+    t0 = time.perf_counter()
+    for _ in range(n):
+        feed.mid_price("ETHUSDT")
+    per_read = (time.perf_counter() - t0) / n
+    print(f"讀取報價: {per_read * 1e6:.2f}us / 次  (REST 往返約 {REST_LATENCY * 1000:.0f}ms)")
+
+    # 串流中斷 -> REST 備援
+    server.drop_all()
+    assert _wait(lambda: feed.quotes.get("ETHUSDT").source == "rest"), "no REST fallback"
+    print(f"串流中斷後報價來源: {feed.quote('ETHUSDT').source}  REST 輪詢次數={feed.stats['rest_polls']}")
+
+    # 替身重新上線 -> 自動重連並回到串流
+    server, _ = start_ws_stand_in(port)
+    assert _wait(lambda: feed.stream_healthy("ETHUSDT") and feed.quote("ETHUSDT").source == "stream"), "no reconnect"
+    print(f"重新連線: reconnects={feed.stats['reconnects']}  messages={feed.stats['messages']}")
+
+    feed.stop()
+    server.drop_all()
+
+
+if __name__ == "__main__":
+    run()
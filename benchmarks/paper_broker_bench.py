@@ -0,0 +1,125 @@
+# 紙上交易：PaperBitmartClient / PaperTopOneClient 在本機K線回放上驅動策略與 backend 迴圈
+#
+# 驗證紙上客戶端的方法與簽名和真實客戶端一致、帳戶結算（餘額 = 初始 + Σ(損益 - 手續費)）、
+# TP/SL 在回放價格上觸發，且沒有任何回合在牆上時鐘等待（持倉確認不空等）；再量測每秒回合數：
+# 純券商回合（快照 + 兩腿開倉 + 確認 + 平倉）、run_voger_strategy、backend_service 的同步迴圈。
+# 用法: python -m benchmarks.paper_broker_bench
+
+import os
+import time
+import inspect
+import logging
+import tempfile
+from collections import Counter
+
+import config
+from exchanges.bitmart_client import BitmartClient
+from exchanges.topone_client import TopOneClient
+from engine.account_snapshot import AccountSnapshot
+from data.kline_store import KlineStore
+from sim.matching import ReplayMarket
+from sim.paper_broker import PaperBitmartClient, PaperTopOneClient, create_paper_clients
+from strategies.voger_strategy import run_voger_strategy
+from benchmarks.backtest_bench import synthetic_bars
+
+SYMBOL = "ETHUSDT"
+HISTORY = 1000
+METHODS = ("get_balance", "get_position", "place_order", "close_position", "get_kline_data", "get_current_price")
+STRATEGY = dict(symbol=SYMBOL, margin=10, leverage=20, tp_percentage=1.0, sl_percentage=1.0)
+
+
+def check_surface():
+    # TopOne 沒有K線端點，紙上版本的 get_kline_data 與 Bitmart 的簽名相同
+    for paper, real in ((PaperBitmartClient, BitmartClient), (PaperTopOneClient, TopOneClient)):
+        for name in METHODS:
+            reference = getattr(real, name, None) or getattr(BitmartClient, name)
+            assert inspect.signature(getattr(paper, name)) == inspect.signature(reference), (paper.__name__, name)
+    print(f"方法與簽名一致: {', '.join(METHODS)}")
+
+
+def check_accounts(exchange, balance=config.PAPER_BALANCE):
+    actions = Counter()
+    for venue, account in exchange.accounts.items():
+        settled = balance + sum(f.pnl - f.fee for f in account.fills)
+        assert abs(account.wallet - settled) < 1e-9, (venue, account.wallet, settled)
+        actions.update(f.action for f in account.fills)
+    return actions
+
+
+def broker_rounds(bars, n=2000):
+    """Snapshot, both legs open, confirm, both legs close, confirm; one replay tick per round."""
+    market = ReplayMarket({SYMBOL: bars}, start_bar=HISTORY)
+    bitmart, topone = create_paper_clients([SYMBOL], market=market)
+    t0 = time.perf_counter()
+    for _ in range(n):
+        snapshot = AccountSnapshot(bitmart, topone, SYMBOL).refresh()
+        price = bitmart.get_current_price(SYMBOL)
+        assert bitmart.place_order(SYMBOL, "long", 10, 20, price * 1.01, price * 0.99) is not None
+        assert topone.place_order(SYMBOL, "short", 10, 20, price * 0.99, price * 1.01) is not None
+        assert all(c.confirmed for c in snapshot.await_positions({"bitmart": True, "topone": True}).values())
+        snapshot.close_all()
+        assert all(c.confirmed for c in snapshot.await_positions({"bitmart": False, "topone": False}).values())
+        market.step_ticks()
+    elapsed = time.perf_counter() - t0
+    actions = check_accounts(bitmart.exchange)
+    assert actions["open"] == actions["close"] == 2 * n, actions
+    print(f"券商回合（快照+開倉+確認+平倉+確認）: {n / elapsed:.0f} 回合/s")
+
+
+def strategy_rounds(bars):
+    """run_voger_strategy once per bar close until the replay ends."""
+    market = ReplayMarket({SYMBOL: bars}, start_bar=HISTORY)
+    bitmart, topone = create_paper_clients([SYMBOL], market=market)
+    statuses, slowest = Counter(), 0.0
+    t0 = time.perf_counter()
+    while not market.finished():
+        start = time.perf_counter()
+        snapshot = AccountSnapshot(bitmart, topone, SYMBOL).refresh()
+        statuses[run_voger_strategy(bitmart, topone, account_snapshot=snapshot, **STRATEGY)["status"]] += 1
+        slowest = max(slowest, time.perf_counter() - start)
+        market.step_bars(1)
+    elapsed = time.perf_counter() - t0
+    rounds = sum(statuses.values())
+    actions = check_accounts(bitmart.exchange)
+    assert statuses["completed"] > 0 and actions["tp"] + actions["sl"] > 0, (statuses, actions)
+    assert not statuses["failed_to_close"] and not statuses["failed_to_open"], statuses
+    # 確認逾時會在牆上時鐘等滿 CONFIRM_TIMEOUT_SECONDS；紙上帳戶不該有任何一回合接近
+    assert slowest < 1.0, slowest
+    print(f"run_voger_strategy: {rounds} 回合 {rounds / elapsed:.0f} 回合/s（最慢 {slowest * 1000:.1f}ms），"
+          f"{dict(statuses)}，成交 {dict(actions)}")
+
+
+def backend_rounds(bars):
+    """backend_service.run_strategy_continuously with the "paper" option over a temporary kline store."""
+    with tempfile.TemporaryDirectory() as root:
+        KlineStore(root).series("bitmart", SYMBOL, 15).append(bars)
+        cwd = os.getcwd()
+        # backend_service 在匯入時開啟（並輪替）工作目錄下的 backend_logs.txt
+        os.chdir(root)
+        try:
+            import backend_service
+            progress = os.path.join(root, "progress.txt")
+            t0 = time.perf_counter()
+            backend_service.run_strategy_continuously("voger_strategy", 900, -1, progress,
+                                                      paper={"root": root, "history_bars": HISTORY}, **STRATEGY)
+            elapsed = time.perf_counter() - t0
+            with open(progress) as f:
+                rounds = int(f.read())
+        finally:
+            os.chdir(cwd)
+    # 第一回合在回放起點立即執行，之後每根K線收盤一回合
+    assert rounds == len(bars) - HISTORY + 1, rounds
+    print(f"backend_service 同步迴圈（紙上交易）: {rounds} 回合 {rounds / elapsed:.0f} 回合/s")
+
+
+def run():
+    logging.getLogger().setLevel(logging.WARNING)
+    bars = synthetic_bars(HISTORY + 3000)
+    check_surface()
+    broker_rounds(bars)
+    strategy_rounds(bars)
+    backend_rounds(bars)
+
+
+if __name__ == "__main__":
+    run()
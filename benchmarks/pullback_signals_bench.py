@@ -0,0 +1,128 @@
+# signal_generation 回調觸發狀態機：原本逐列 pandas 迴圈 vs. pullback_signals 陣列版
+#
+# 同時檢查兩者的 LongSignal / ShortSignal 完全一致。
+# 用法: python -m benchmarks.pullback_signals_bench
+
+import time
+import numpy as np
+import pandas as pd
+
+from strategies.voger_strategy import pullback_signals
+
+
+def synthetic_bars(n, seed=0):
+    rng = np.random.default_rng(seed)
+    close = 100 + np.cumsum(rng.normal(0, 0.5, n))
+    spread = rng.random(n)
+    return close, close - spread, close + spread
+
+
+def random_crosses(n, rate, seed=1):
+    rng = np.random.default_rng(seed)
+    return rng.random(n) < rate, rng.random(n) < rate
+
+
+def reference_loop_pandas(df, pullback_len, pullback_pct):
+    """The original signal_generation loop, verbatim."""
+    df['LongSignal'], df['ShortSignal'] = False, False
+    bull_trigger = bear_trigger = None
+    bull_count = bear_count = 0
+
+    for i in range(len(df)):
+        if df['BullCross'].iloc[i]:
+            bull_trigger, bull_count = df['Close'].iloc[i] * (1 - pullback_pct), 0
+        if bull_trigger:
+            bull_count += 1
+            if df['Low'].iloc[i] <= bull_trigger or bull_count >= pullback_len:
+                df.at[i, 'LongSignal'], bull_trigger = True, None
+
+        if df['BearCross'].iloc[i]:
+            bear_trigger, bear_count = df['Close'].iloc[i] * (1 + pullback_pct), 0
+        if bear_trigger:
+            bear_count += 1
+            if df['High'].iloc[i] >= bear_trigger or bear_count >= pullback_len:
+                df.at[i, 'ShortSignal'], bear_trigger = True, None
+    return df['LongSignal'].to_numpy(), df['ShortSignal'].to_numpy()
+
+
+def reference_loop(bull, bear, close, low, high, pullback_len, pullback_pct):
+    """Same state machine as reference_loop_pandas over plain lists, for large sizes."""
+    n = len(close)
+    long_sig, short_sig = np.zeros(n, dtype=bool), np.zeros(n, dtype=bool)
+    bull_trigger = bear_trigger = None
+    bull_count = bear_count = 0
+    bull, bear, close, low, high = bull.tolist(), bear.tolist(), close.tolist(), low.tolist(), high.tolist()
+    for i in range(n):
+        if bull[i]:
+            bull_trigger, bull_count = close[i] * (1 - pullback_pct), 0
+        if bull_trigger:
+            bull_count += 1
+            if low[i] <= bull_trigger or bull_count >= pullback_len:
+                long_sig[i], bull_trigger = True, None
+        if bear[i]:
+            bear_trigger, bear_count = close[i] * (1 + pullback_pct), 0
+        if bear_trigger:
+            bear_count += 1
+            if high[i] >= bear_trigger or bear_count >= pullback_len:
+                short_sig[i], bear_trigger = True, None
+    return long_sig, short_sig
+
+
+def vectorized(bull, bear, close, low, high, pullback_len, pullback_pct):
+    return (pullback_signals(bull, close, low, pullback_len, pullback_pct, bullish=True),
+            pullback_signals(bear, close, high, pullback_len, pullback_pct, bullish=False))
+
+
+def check_equivalence():
+    cases = 0
+    for n in (1, 2, 7, 200, 5000):
+        close, low, high = synthetic_bars(n, seed=n)
+        for rate in (0.0, 0.01, 0.2, 0.9):
+            bull, bear = random_crosses(n, rate, seed=n + int(rate * 100))
+            for pullback_len in (0, 1, 2, 5, 12):
+                for pullback_pct in (0.0, 0.001, 0.01, 0.05, 1.0):
+                    expected = reference_loop(bull, bear, close, low, high, pullback_len, pullback_pct)
+                    got = vectorized(bull, bear, close, low, high, pullback_len, pullback_pct)
+                    assert np.array_equal(expected[0], got[0]) and np.array_equal(expected[1], got[1]), \
+                        (n, rate, pullback_len, pullback_pct)
+                    cases += 1
+
+    # 原始 pandas 版本（逐列 iloc）也比對一次
+    close, low, high = synthetic_bars(200)
+    bull, bear = random_crosses(200, 0.1)
+    df = pd.DataFrame({'Close': close, 'Low': low, 'High': high, 'BullCross': bull, 'BearCross': bear})
+    expected = reference_loop_pandas(df, 5, 0.01)
+    got = vectorized(bull, bear, close, low, high, 5, 0.01)
+    assert np.array_equal(expected[0], got[0]) and np.array_equal(expected[1], got[1])
+    print(f"等價性檢查通過: {cases + 1} 組參數")
+
+
+def _time(fn, *args, repeat=3):
+    best = float('inf')
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn(*args)
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+
+def run():
+    check_equivalence()
+    for n in (200, 100_000, 10_000_000):
+        close, low, high = synthetic_bars(n)
+        bull, bear = random_crosses(n, 0.02)
+        args = (bull, bear, close, low, high, 5, 0.01)
+        t_vec = _time(vectorized, *args)
+        line = f"{n:>10,} bars  array={t_vec * 1000:9.2f}ms ({n / t_vec / 1e6:7.1f}M bars/s)"
+        if n <= 100_000:
+            t_loop = _time(reference_loop, *args, repeat=1)
+            line += f"  python loop={t_loop * 1000:9.2f}ms"
+        if n <= 200:
+            df = pd.DataFrame({'Close': close, 'Low': low, 'High': high, 'BullCross': bull, 'BearCross': bear})
+            t_pd = _time(reference_loop_pandas, df, 5, 0.01, repeat=1)
+            line += f"  pandas loop={t_pd * 1000:9.2f}ms"
+        print(line)
+
+
+if __name__ == "__main__":
+    run()
@@ -0,0 +1,52 @@
+# RateLimitGovernor：行情請求塞滿桶子時，下單/平倉請求仍優先放行；被 429 後整桶暫停
+#
+# 用法: python -m benchmarks.rate_limit_bench
+
+import time
+import threading
+
+from exchanges.rate_limit import RateLimitGovernor, MARKET, TRADING, CLASS_PRIORITY, urgent
+
+
+def run():
+    governor = RateLimitGovernor("bench", {MARKET: (20.0, 5), TRADING: (20.0, 5)},
+                                 {"get_kline": MARKET, "get_depth": MARKET, "post_submit_order": TRADING})
+    served = []
+    t0 = time.monotonic()
+
+    def call(endpoint, tag, use_urgent=False):
+        if use_urgent:
+            with urgent():
+                governor.acquire(endpoint)
+        else:
+            governor.acquire(endpoint)
+        served.append((tag, time.monotonic() - t0))
+
+    threads = [threading.Thread(target=call, args=("get_kline", f"kline{i}")) for i in range(30)]
+    for thread in threads:
+        thread.start()
+    time.sleep(0.1)
+    # 下單前的報價查詢與行情共用同一個桶，但以 urgent() 插隊；下單本身走 trading 桶
+    late = [threading.Thread(target=call, args=("get_depth", "order-depth", True)),
+            threading.Thread(target=call, args=("post_submit_order", "order"))]
+    for thread in late:
+        thread.start()
+    for thread in threads + late:
+        thread.join()
+
+    position = {tag: i for i, (tag, _) in enumerate(served)}
+    print(f"30 個行情請求排隊中送出下單: order-depth 第 {position['order-depth'] + 1} 個放行, "
+          f"order 第 {position['order'] + 1} 個放行 (共 {len(served)})")
+    assert position["order-depth"] < 10 and position["order"] < 10
+    print(f"行情請求全部完成耗時 {served[-1][1]:.2f}s (20/s, 桶容量 5)")
+
+    governor.penalize("get_kline", retry_after=0.5)
+    start = time.monotonic()
+    governor.acquire("get_kline", priority=CLASS_PRIORITY[MARKET])
+    print(f"429 後下一個行情請求等待 {time.monotonic() - start:.2f}s")
+    for cls, metrics in governor.metrics().items():
+        print(f"  {cls:<8} {metrics}")
+
+
+if __name__ == "__main__":
+    run()
@@ -0,0 +1,196 @@
+# 模擬交易所：真實 BitmartClient / TopOneClient 經 HTTP 連到本機回放伺服器
+#
+# 驗證規格/深度/K線/餘額/下單/持倉/平倉的回應能被客戶端正確解析、預設 TP/SL 依回放價格觸發
+# 並結算到餘額，再量測請求延遲與吞吐、延遲抖動注入、錯誤注入（GET 重試）與伺服器端限流（429）。
+# 用法: python -m benchmarks.sim_server_bench
+
+import time
+import logging
+import numpy as np
+
+from exchanges.bitmart_client import BitmartClient
+from exchanges.topone_client import TopOneClient
+from exchanges.symbol_registry import SymbolRegistry
+from exchanges.rate_limit import RateLimitGovernor, BITMART_LIMITS, BITMART_ENDPOINT_CLASSES, TOPONE_LIMITS, \
+    TOPONE_ENDPOINT_CLASSES
+from data.market_feed import MarketDataFeed
+from sim.matching import ReplayMarket, TICKS_PER_BAR
+from sim.exchange_server import SimExchange, serve_exchange
+from benchmarks.backtest_bench import synthetic_bars
+
+SYMBOL = "ETHUSDT"
+HISTORY = 300
+
+
+def make_clients(url, unlimited=True):
+    # unlimited: 客戶端限流器放寬，讓伺服器端的限流真正被觸發
+    scale = 1000 if unlimited else 1
+    registry = SymbolRegistry()
+    bitmart = BitmartClient("key", "secret", "memo", registry=registry, base_url=url,
+                            governor=RateLimitGovernor("bitmart", {k: (r * scale, c * scale) for k, (r, c) in
+                                                                   BITMART_LIMITS.items()}, BITMART_ENDPOINT_CLASSES))
+    topone = TopOneClient("key", "secret", base_url=url, registry=registry,
+                          governor=RateLimitGovernor("topone", {k: (r * scale, c * scale) for k, (r, c) in
+                                                                TOPONE_LIMITS.items()}, TOPONE_ENDPOINT_CLASSES))
+    return bitmart, topone
+
+
+def expected_exit(market, symbol, side, entry, tp, sl):
+    """First tick after now where the straight-line path reaches tp/sl: (price, action)."""
+    sign = 1 if side == "long" else -1
+    path = market.paths[symbol]
+    bar, tick = market.bar, market.tick
+    while True:
+        bar, tick = (bar + 1, 0) if tick == TICKS_PER_BAR - 1 else (bar, tick + 1)
+        price = path[bar, tick]
+        if sign * (price - tp) >= 0:
+            return (price if tick == 0 else tp), "tp", bar
+        if sign * (price - sl) <= 0:
+            return (price if tick == 0 else sl), "sl", bar
+
+
+def check_round_trip(exchange, bitmart, topone, feed):
+    market = exchange.market
+    assert bitmart.get_balance() == 1000.0 and topone.get_balance() == 1000.0
+    spec = bitmart.get_contract_spec(SYMBOL)
+    assert spec.contract_size == 0.01 and spec.price_precision == 2, spec
+
+    # K線：客戶端取得的就是回放資料（含正在形成的一根）
+    now = market.now()
+    rows = bitmart.get_kline_data(SYMBOL, 15, now - 100 * 900, now)
+    closes = np.array([float(r["close_price"]) for r in rows])
+    assert len(rows) == 101 and np.allclose(closes[:-1], market.bars[SYMBOL][market.bar - 100:market.bar, 4])
+    rows_4h = bitmart.get_kline_data(SYMBOL, 240, now - 10 * 14400, now)
+    assert float(rows_4h[-1]["close_price"]) == float(rows[-1]["close_price"])
+
+    price = bitmart.get_current_price(SYMBOL)
+    tp, sl = round(price * 1.01, 2), round(price * 0.99, 2)
+    assert bitmart.place_order(SYMBOL, "long", 10, 20, tp, sl) is not None
+    assert topone.place_order(SYMBOL, "short", 10, 20, sl, tp) is not None
+    position = bitmart.get_position(SYMBOL)
+    top_position = topone.get_position(SYMBOL)
+    assert position["position_type"] == 1 and int(position["current_amount"]) == int(200 / (price * 0.01))
+    assert top_position["side"] == "short" and float(top_position["size"]) > 0
+
+    entry = float(position["open_avg_price"])
+    exit_price, action, exit_bar = expected_exit(market, SYMBOL, "long", entry, tp, sl)
+    qty = int(position["current_amount"]) * 0.01
+    fee = exchange.accounts["bitmart"].fee_rate
+    expected = 1000 - qty * entry * fee + qty * (exit_price - entry) - qty * exit_price * fee
+
+    # 逐根推進直到觸發；兩邊的止盈止損是鏡像，同一根K線觸發
+    bars = 0
+    while bitmart.get_position(SYMBOL) is not None:
+        exchange.step({"bars": 1})
+        bars += 1
+    assert market.bar == exit_bar, (market.bar, exit_bar)
+    assert topone.get_position(SYMBOL) is None
+    fills = exchange.accounts["bitmart"].fills
+    assert fills[-1].action == action and abs(fills[-1].price - exit_price) < 1e-9
+    assert abs(bitmart.get_balance() - expected) < 1e-6, (bitmart.get_balance(), expected)
+    print(f"下單/持倉/觸發: 多單於 {bars} 根K線後 {action} @ {exit_price:.2f}，"
+          f"Bitmart 餘額 {bitmart.get_balance():.4f}，TopOne 餘額 {topone.get_balance():.4f}")
+
+    # 手動平倉（兩邊都走客戶端的 close_position）
+    feed.quotes.update(SYMBOL, source="rest", **bitmart.get_top_of_book(SYMBOL))
+    price = bitmart.get_current_price(SYMBOL)
+    assert bitmart.place_order(SYMBOL, "short", 10, 20, round(price * 0.9, 2), round(price * 1.1, 2)) is not None
+    assert topone.place_order(SYMBOL, "long", 10, 20, price * 1.1, price * 0.9) is not None
+    exchange.step({"ticks": 2})
+    assert bitmart.close_position(SYMBOL) is not None
+    results = topone.close_position(SYMBOL)
+    assert results and all(r["status"] == "success" for r in results)
+    assert bitmart.get_position(SYMBOL) is None and topone.get_position(SYMBOL) is None
+    for venue, account in exchange.accounts.items():
+        settled = 1000 + sum(f.pnl - f.fee for f in account.fills)
+        assert abs(account.wallet - settled) < 1e-9 and account.available() == account.wallet, venue
+
+    # TopOne 平倉數量經 8 位小數四捨五入仍要全部平掉（不留殘量）；數量 0 要被拒絕而不是「成功平掉 0」
+    assert topone.place_order(SYMBOL, "short", 7, 20, price * 0.9, price * 1.1) is not None
+    position = topone.get_open_positions(SYMBOL)[0]
+    assert float(position["quantity"]) == exchange.accounts["topone"].position_by_id(position["position_id"]).qty
+    rounded = dict(position, quantity=f"{float(position['quantity']):.8f}")
+    assert topone.close_position(SYMBOL, open_positions=[rounded])[0]["status"] == "success"
+    assert topone.get_position(SYMBOL) is None
+    assert topone.place_order(SYMBOL, "long", 7, 20, price * 1.1, price * 0.9) is not None
+    position = topone.get_open_positions(SYMBOL)[0]
+    assert topone.close_position(SYMBOL, open_positions=[dict(position, quantity="0.00000000")])[0]["status"] == "failed"
+    assert topone.close_position(SYMBOL)[0]["status"] == "success" and topone.get_position(SYMBOL) is None
+
+    # 餘額不足與錯誤方向的止損由伺服器拒絕，客戶端回傳 None
+    assert bitmart.place_order(SYMBOL, "long", 5000, 20, price * 1.1, price * 0.9) is None
+    assert topone.place_order(SYMBOL, "long", 10, 20, price * 1.1, price * 1.05) is None
+    print("平倉/結算/拒單檢查通過")
+
+
+def measure(label, call, n):
+    samples = []
+    t0 = time.perf_counter()
+    for _ in range(n):
+        start = time.perf_counter()
+        call()
+        samples.append((time.perf_counter() - start) * 1000)
+    elapsed = time.perf_counter() - t0
+    p50, p99 = np.percentile(samples, [50, 99])
+    print(f"{label}: {n / elapsed:.0f} req/s, p50={p50:.2f}ms p99={p99:.2f}ms")
+    return p50
+
+
+def run():
+    # 拒單、注入錯誤與 429 都是預期中的，不輸出客戶端的錯誤日誌
+    logging.getLogger("exchanges").setLevel(logging.CRITICAL)
+    bars = synthetic_bars(2000)
+    market = ReplayMarket({SYMBOL: bars}, start_bar=HISTORY)
+    exchange = SimExchange(market, rate_limits=False, seed=1)
+    server = serve_exchange(exchange, port=0)
+    url = f"http://127.0.0.1:{server.server_address[1]}"
+    bitmart, topone = make_clients(url)
+    feed = MarketDataFeed([SYMBOL], url=None, rest_fetch=bitmart.get_top_of_book, poll_interval=0.2).start()
+    bitmart.market_feed = topone.market_feed = feed
+    try:
+        check_round_trip(exchange, bitmart, topone, feed)
+
+        # 吞吐與延遲：無注入 vs 20ms + 0~10ms 抖動
+        measure("Bitmart get_balance", bitmart.get_balance, 500)
+        measure("TopOne get_balance", topone.get_balance, 500)
+        measure("Bitmart get_kline_data (100 根)", lambda: bitmart.get_kline_data(SYMBOL, 15, market.now() - 99 * 900,
+                                                                                 market.now()), 300)
+        exchange.configure({"latency_ms": 20, "jitter_ms": 10})
+        p50 = measure("Bitmart get_balance (20ms+抖動)", bitmart.get_balance, 50)
+        assert 20 <= p50 < 40, p50
+        exchange.configure({"latency_ms": 0, "jitter_ms": 0})
+
+        # 錯誤注入：TopOne GET 由 HttpTransport 重試，Bitmart SDK 不重試
+        exchange.configure({"error_rate": 0.3})
+        topone.transport.backoff_base = 0.001
+        ok_topone = sum(topone.get_balance() is not None for _ in range(200))
+        ok_bitmart = sum(bitmart.get_balance() is not None for _ in range(200))
+        print(f"錯誤率 30%: TopOne 成功 {ok_topone}/200（重試後），Bitmart 成功 {ok_bitmart}/200，"
+              f"注入 {exchange.stats['injected_errors']} 次")
+        assert ok_topone > ok_bitmart
+        exchange.configure({"error_rate": 0})
+
+        # 伺服器端限流：放寬的客戶端限流器會收到 429；預設限流器（與伺服器同額）不會
+        exchange.configure({"rate_limits": True})
+        before = exchange.stats["rate_limited"]
+        ok = sum(bitmart.get_top_of_book(SYMBOL) is not None for _ in range(40))
+        limited = exchange.stats["rate_limited"] - before
+        print(f"限流（客戶端未節流）: 40 次深度請求 {ok} 次成功，{limited} 次 429")
+        assert limited > 0 and ok + limited == 40
+
+        feed.stop()  # 行情輪詢也吃同一個 market 額度
+        exchange.configure({"rate_limits": True})
+        governed, _ = make_clients(url, unlimited=False)
+        before = exchange.stats["rate_limited"]
+        t0 = time.perf_counter()
+        ok = sum(governed.get_top_of_book(SYMBOL) is not None for _ in range(24))
+        print(f"限流（客戶端限流器）: 24 次深度請求 {ok} 次成功，"
+              f"{exchange.stats['rate_limited'] - before} 次 429，耗時 {time.perf_counter() - t0:.2f}s")
+        assert ok == 24 and exchange.stats["rate_limited"] == before
+    finally:
+        feed.stop()
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    run()
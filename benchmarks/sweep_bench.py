@@ -0,0 +1,68 @@
+# 參數掃描：一年 15m K線 × 10k 組參數的耗時，並抽樣比對 run_voger_backtest 的結果
+#
+# 用法: python -m benchmarks.sweep_bench [workers]
+
+import sys
+import time
+import numpy as np
+
+from backtest.sweep import sweep, walk_forward, parameter_grid, PARAMS
+from backtest.voger_backtest import run_voger_backtest
+from benchmarks.backtest_bench import synthetic_bars
+
+YEAR_OF_15M = 365 * 96
+STRATEGY = dict(margin=10, leverage=20)
+GRID = dict(
+    cci_len=[14, 20, 30, 40],
+    lookback_bars=[3, 5, 8, 13, 21],
+    pullback_len=[1, 3, 5, 8, 12],
+    pullback_pct=[0.0, 0.002, 0.005, 0.01, 0.02],
+    tp_percentage=[0.5, 1.0, 1.5, 2.0, 3.0],
+    sl_percentage=[1.0, 2.0],
+    trend_filter=[True, False],
+)
+
+
+def check_against_backtest(bars, results, samples=20, seed=0):
+    rng = np.random.default_rng(seed)
+    for i in rng.choice(len(results), samples, replace=False):
+        row = results.iloc[i]
+        params = {p: row[p].item() if hasattr(row[p], "item") else row[p] for p in PARAMS}
+        summary = run_voger_backtest(bars, **STRATEGY, **params).summary
+        assert summary["hedges"] == row["hedges"], (params, summary["hedges"], row["hedges"])
+        assert np.isclose(summary["net_pnl"], row["net_pnl"]), (params, summary["net_pnl"], row["net_pnl"])
+        assert np.isclose(summary["max_drawdown"], row["max_drawdown"]), params
+    print(f"抽樣 {samples} 組與 run_voger_backtest 一致")
+
+
+def run(workers=None):
+    bars = synthetic_bars(YEAR_OF_15M, seed=7)
+
+    small = parameter_grid(cci_len=[14, 20], lookback_bars=[5], pullback_pct=[0.0, 0.01], tp_percentage=[1.0, 2.0],
+                           sl_percentage=[1.0], trend_filter=[True, False])
+    in_process = sweep(bars, small, **STRATEGY, workers=0)
+    pooled = sweep(bars, small, **STRATEGY, workers=2)
+    assert in_process.sort_values(list(PARAMS)).reset_index(drop=True).equals(
+        pooled.sort_values(list(PARAMS)).reset_index(drop=True))
+    print("進程池與單進程結果一致")
+
+    grid = parameter_grid(**GRID)
+    t0 = time.perf_counter()
+    results = sweep(bars, grid, **STRATEGY, workers=workers)
+    elapsed = time.perf_counter() - t0
+    print(f"{len(grid):,} 組 × {len(bars):,} 根: {elapsed:.1f}s ({len(grid) / elapsed:.0f} 組/s, "
+          f"{len(grid) * len(bars) / elapsed / 1e6:.0f}M bar-組/s)")
+    check_against_backtest(bars, results)
+    print(results.sort_values("net_pnl", ascending=False).head(5).to_string(index=False))
+
+    # 90 天訓練、30 天驗證，每 30 天滾動
+    t0 = time.perf_counter()
+    folds = walk_forward(bars, parameter_grid(**{**GRID, "cci_len": [20], "pullback_len": [5]}), **STRATEGY,
+                         train_bars=90 * 96, test_bars=30 * 96, workers=workers)
+    print(f"walk-forward {len(folds)} 折: {time.perf_counter() - t0:.1f}s，樣本外淨損益 {folds['test_net_pnl'].sum():.2f}")
+    print(folds[["fold", "lookback_bars", "pullback_pct", "tp_percentage", "sl_percentage", "trend_filter",
+                 "train_net_pnl", "test_net_pnl", "test_hedges"]].to_string(index=False))
+
+
+if __name__ == "__main__":
+    run(int(sys.argv[1]) if len(sys.argv) > 1 else None)
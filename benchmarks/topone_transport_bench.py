@@ -0,0 +1,83 @@
+# TopOne 傳輸層延遲比較：舊版每次 requests.get 新建連線 vs. HttpTransport 連線池
+#
+# 用法: python -m benchmarks.topone_transport_bench [呼叫次數]
+
+import sys
+import json
+import time
+import threading
+import statistics
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+
+from exchanges.topone_client import TopOneClient
+from exchanges.http_transport import HttpTransport
+
+BALANCE_BODY = json.dumps({
+    "status": {"code": 102000, "error": None, "messages": "success"},
+    "data": {"trading": [{"code": "USDT", "available": "100.0"}]},
+}).encode("utf-8")
+
+
+class _StandInHandler(BaseHTTPRequestHandler):
+    # HTTP/1.1 才能保持 keep-alive
+    protocol_version = "HTTP/1.1"
+    # 標頭與本文分兩次寫入，關閉 Nagle 以免 keep-alive 連線被延遲 ACK 拖慢
+    disable_nagle_algorithm = True
+
+    def _reply(self):
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(BALANCE_BODY)))
+        self.end_headers()
+        if self.command != "HEAD":
+            self.wfile.write(BALANCE_BODY)
+
+    do_GET = do_HEAD = _reply
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_stand_in():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _StandInHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+
+def _summary(label, samples):
+    samples_ms = sorted(s * 1000 for s in samples)
+    p95 = samples_ms[int(len(samples_ms) * 0.95) - 1]
+    print(f"{label:<28} mean={statistics.mean(samples_ms):7.3f}ms  p50={statistics.median(samples_ms):7.3f}ms  p95={p95:7.3f}ms")
+
+
+def run(calls=500):
+    server, base_url = start_stand_in()
+    # 量測的是傳輸層本身，不經過限流器
+    client = TopOneClient("key", "secret", base_url=base_url, transport=HttpTransport(base_url))
+
+    # 舊版行為：模組層級 requests.get，每次新建連線
+    before = []
+    for _ in range(calls):
+        headers = client._get_signed_headers("GET", "/api/v1/balance")
+        t0 = time.perf_counter()
+        requests.get(base_url + "/api/v1/balance", headers=headers).json()
+        before.append(time.perf_counter() - t0)
+
+    after = []
+    for _ in range(calls):
+        t0 = time.perf_counter()
+        client.get_balance()
+        after.append(time.perf_counter() - t0)
+
+    print(f"{calls} 次 get_balance 對本地 HTTP 替身 ({base_url})")
+    _summary("before (requests.get)", before)
+    _summary("after (HttpTransport)", after)
+
+    client.transport.close()
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    run(int(sys.argv[1]) if len(sys.argv) > 1 else 500)
@@ -22,8 +22,53 @@ SL_PERCENTAGE = 0.5      # 止損百分比（%）
 LOOKBACK_BARS = 5        # 用於訊號產生的回看K線數量
 PULLBACK_PCT = 0.01      # 用於回調觸發的百分比（1%）
 
+# TopOne 合約規格（TopOne 未提供規格查詢端點，依交易對手動設定）
+# 例: {"XRPUSDT": {"contract_size": 1, "price_precision": 4, "qty_precision": 0, "min_size": 1, "max_leverage": 100}}
+TOPONE_CONTRACT_SPECS = {}
+
+# 平倉/開倉後等待交易所確認持倉狀態的最長時間（秒）
+CONFIRM_TIMEOUT_SECONDS = 15
+
+# 串流行情（websocket），斷線或報價過期時改以 REST 輪詢
+MARKET_DATA_STREAM = True
+MARKET_DATA_STALE_SECONDS = 5      # 報價超過幾秒未更新視為過期
+MARKET_DATA_POLL_SECONDS = 2       # 串流中斷時 REST 輪詢間隔
+
 # 策略執行頻率（秒）
 EXECUTION_INTERVAL_SECONDS = 10  # 每隔幾秒執行一次策略
 
+# K線收盤排程：設定 BAR_MINUTES 時於每根K線收盤後立即執行，取代固定間隔輪詢
+SCHEDULE_BAR_MINUTES = 15          # None 表示改用 EXECUTION_INTERVAL_SECONDS 固定間隔（同樣對齊時間格點）
+SCHEDULE_SETTLE_SECONDS = 1.0      # 收盤後等待交易所產生完整K線的秒數
+SCHEDULE_INTRA_BAR_SECONDS = None  # K線之間額外檢查的間隔（秒），None 表示不檢查
+
+# 常駐策略服務 (worker_service.py) 的本機控制 API 連接埠
+WORKER_CONTROL_PORT = 8765
+# 策略服務每回合發布的狀態記錄（記憶體映射檔），None 表示 /dev/shm 或系統暫存目錄下的預設位置
+STATUS_CHANNEL_PATH = None
+# 每個交易所方法/策略階段的延遲統計 (p50/p95/p99) 定期寫出的檔案；控制 API 的 GET /metrics 也可取得
+METRICS_EXPORT_PATH = "metrics.json"
+METRICS_EXPORT_SECONDS = 10
+
+# 後端日誌依大小輪替: backend_logs.txt 超過上限即改名為 .1、.2 ...
+LOG_MAX_BYTES = 5 * 1024 * 1024
+LOG_BACKUP_COUNT = 3
+LOG_TAIL_LINES = 500               # 儀表板保留並顯示的最新日誌行數
+LOG_DEBUG = False                  # 後端是否輸出 DEBUG 日誌（原始回應、K線取樣等，較耗時）
+
+# 本機K線庫（每個 交易所/交易對/週期 一組欄位檔，供回測與重啟使用）
+KLINE_STORE_DIR = "kline_store"
+KLINE_PAGE_BARS = 500              # 回補時每次 get_kline_data 請求的K線數
+KLINE_BACKFILL_WORKERS = 4         # 回補時同時進行的請求數（仍受交易所限速器約束）
+
+# 模擬交易所 (sim/exchange_server.py)：設定 URL 時兩個客戶端都改連到該伺服器，行情只走 REST
+SIM_SERVER_URL = None              # 例: "http://127.0.0.1:8780"
+SIM_SERVER_PORT = 8780
+
+# 紙上交易（backend_service 策略設定的 "paper" 選項）：以本機K線庫回放，帳戶在記憶體中撮合
+PAPER_BALANCE = 1000.0             # 兩個紙上帳戶各自的初始 USDT
+PAPER_FEE_RATE = 0.0006            # 開平倉手續費率（名目價值）
+PAPER_HISTORY_BARS = 1000          # 回放起點前已可見的K線數（4h 趨勢需要約 20 根 4h = 320 根 15m）
+
 # Debug Mode
 DEBUG_MODE = True
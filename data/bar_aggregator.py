@@ -0,0 +1,135 @@
+import threading
+from collections import deque
+import numpy as np
+
+from data.kline_cache import bars_to_df
+
+
+def df_to_bars(df):
+    """load_kline_df 格式的 DataFrame -> (n, 6) float array [ts, O, H, L, C, V]"""
+    arr = np.empty((len(df), 6))
+    arr[:, 0] = df['timestamp'].values.astype('datetime64[s]').astype(np.int64)
+    arr[:, 1:] = df[['Open', 'High', 'Low', 'Close', 'Volume']].to_numpy(dtype=float)
+    return arr
+
+
+def _fold(acc, bar):
+    acc[2] = max(acc[2], bar[2])
+    acc[3] = min(acc[3], bar[3])
+    acc[4] = bar[4]
+    acc[5] += bar[5]
+    return acc
+
+
+class BarAggregator:
+    """Derive higher timeframes from one base timeframe, bar by bar.
+
+    ``update`` accepts the newest base bar; a bar with the same timestamp as
+    the current forming bar revises it, a newer one commits it. Derived bars
+    are aligned to UTC epoch multiples of their interval, like exchange klines.
+    Buckets only partially covered by base history are left out; ``seed``
+    supplies older derived bars fetched from the exchange once. Thread-safe:
+    several strategy instances on the same symbol share one aggregator.
+    """
+
+    def __init__(self, base_interval: int, intervals, max_bars: int = 500):
+        for interval in intervals:
+            if interval % base_interval:
+                raise ValueError(f"{interval}m is not a multiple of the {base_interval}m base timeframe")
+        self.base_interval = base_interval
+        self.intervals = list(intervals)
+        self._closed = {i: deque(maxlen=max_bars) for i in self.intervals}
+        self._acc = {i: None for i in self.intervals}
+        self._seed = {i: np.empty((0, 6)) for i in self.intervals}
+        self._forming = None
+        self._first_ts = None
+        # 多個策略實例可能同時更新同一交易對的聚合器；RLock 讓 ingest 可以呼叫 update
+        self._lock = threading.RLock()
+
+    def update(self, bar):
+        ts = bar[0]
+        with self._lock:
+            if self._forming is not None:
+                if ts < self._forming[0]:
+                    return
+                if ts > self._forming[0]:
+                    self._commit(self._forming)
+            elif self._first_ts is None:
+                self._first_ts = ts
+            self._forming = [float(x) for x in bar[:6]]
+
+    def ingest(self, rows):
+        """Feed base bars (oldest first); rows older than the forming bar are skipped."""
+        with self._lock:
+            for row in rows:
+                if self._forming is None or row[0] >= self._forming[0]:
+                    self.update(row)
+
+    def ingest_df(self, df):
+        self.ingest(df_to_bars(df))
+
+    def _commit(self, bar):
+        for interval in self.intervals:
+            bucket = bar[0] - bar[0] % (interval * 60)
+            acc = self._acc[interval]
+            if acc is not None and acc[0] == bucket:
+                _fold(acc, bar)
+            else:
+                if acc is not None:
+                    self._closed[interval].append(acc)
+                self._acc[interval] = [bucket] + bar[1:]
+
+    def seed(self, interval: int, rows):
+        rows = np.asarray(rows, dtype=float).reshape(-1, 6)
+        with self._lock:
+            self._seed[interval] = rows
+
+    def seed_df(self, interval: int, df):
+        self.seed(interval, df_to_bars(df))
+
+    def is_seeded(self, interval: int):
+        return len(self._seed[interval]) > 0
+
+    def bars(self, interval: int):
+        step = interval * 60
+        # 在鎖內複製狀態，之後的計算不阻塞其他實例的 update
+        with self._lock:
+            rows = [list(r) for r in self._closed[interval]]
+            acc = list(self._acc[interval]) if self._acc[interval] is not None else None
+            forming = self._forming
+            first_ts = self._first_ts
+            seed = self._seed[interval]
+        if forming is not None:
+            bucket = forming[0] - forming[0] % step
+            if acc is not None and acc[0] == bucket:
+                _fold(acc, forming)
+            else:
+                if acc is not None:
+                    rows.append(acc)
+                acc = [bucket] + forming[1:]
+        if acc is not None:
+            rows.append(acc)
+
+        if first_ts is not None:
+            first_complete = -(-first_ts // step) * step
+            rows = [r for r in rows if r[0] >= first_complete]
+        derived = np.asarray(rows, dtype=float).reshape(-1, 6)
+
+        if len(derived):
+            seed = seed[seed[:, 0] < derived[0, 0]]
+        return np.concatenate((seed, derived))
+
+    def frame(self, interval: int, bars: int):
+        arr = self.bars(interval)
+        if len(arr) == 0:
+            return None
+        return bars_to_df(arr[-bars:])
+
+
+def get_bar_aggregator(client, symbol: str, base_interval: int, intervals):
+    """The BarAggregator for (symbol, base_interval) attached to a client (created on first use)."""
+    aggregators = vars(client).setdefault("bar_aggregators", {})
+    key = (symbol, base_interval)
+    if key not in aggregators:
+        aggregators.setdefault(key, BarAggregator(base_interval, intervals))
+    return aggregators[key]
@@ -0,0 +1,176 @@
+import time
+import logging
+import threading
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+COLUMNS = ['timestamp', 'Open', 'High', 'Low', 'Close', 'Volume']
+
+
+def parse_kline_rows(data):
+    """Exchange kline rows (Bitmart dicts or plain lists) -> float array of shape (n, 6), sorted by timestamp."""
+    rows = []
+    for k in data or []:
+        if isinstance(k, dict):
+            k = [k['timestamp'], k['open_price'], k['high_price'], k['low_price'], k['close_price'], k['volume']]
+        try:
+            rows.append([float(x) for x in k[:6]])
+        except (TypeError, ValueError):
+            continue
+    if not rows:
+        return np.empty((0, 6))
+    arr = np.asarray(rows, dtype=float)
+    arr = arr[~np.isnan(arr).any(axis=1)]
+    return arr[np.argsort(arr[:, 0], kind='stable')]
+
+
+def bars_to_df(arr):
+    df = pd.DataFrame(arr[:, 1:], columns=COLUMNS[1:])
+    df.insert(0, 'timestamp', pd.to_datetime(arr[:, 0], unit='s'))
+    return df
+
+
+class KlineRing:
+    """Fixed-capacity ring of OHLCV rows; the newest row is the forming bar."""
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self.data = np.empty((capacity, 6))
+        self.start = 0
+        self.count = 0
+
+    def __len__(self):
+        return self.count
+
+    def _index(self, i):
+        return (self.start + i) % self.capacity
+
+    def last_ts(self):
+        return self.data[self._index(self.count - 1), 0] if self.count else None
+
+    def append(self, row):
+        if self.count < self.capacity:
+            self.data[self._index(self.count)] = row
+            self.count += 1
+        else:
+            self.data[self.start] = row
+            self.start = (self.start + 1) % self.capacity
+
+    def overwrite_last(self, row):
+        self.data[self._index(self.count - 1)] = row
+
+    def window(self, n: int):
+        n = min(n, self.count)
+        first = self._index(self.count - n)
+        end = first + n
+        if end <= self.capacity:
+            return self.data[first:end].copy()
+        return np.concatenate((self.data[first:], self.data[:end - self.capacity]))
+
+
+class KlineCache:
+    """Per-(symbol, interval) kline cache behind load_kline_df.
+
+    The first request downloads the full window; later requests only ask the
+    exchange for bars from the last cached (forming) bar onwards, overwrite that
+    bar, append the new ones and backfill any hole in between.
+    """
+
+    def __init__(self, headroom: int = 2, clock=time.time):
+        self.headroom = headroom
+        # 決定抓取區間的「現在」；紙上交易以回放時鐘取代 (見 sim.paper_broker)
+        self.clock = clock
+        self._rings = {}
+        # 每個 (symbol, interval) 各自一把鎖，多個交易對可同時抓取
+        self._locks = {}
+        self._lock = threading.Lock()
+
+    def _key_lock(self, symbol, interval):
+        return self._locks.setdefault((symbol, interval), threading.Lock())
+
+    def invalidate(self, symbol: str = None, interval: int = None):
+        with self._lock:
+            for key in list(self._rings):
+                if (symbol is None or key[0] == symbol) and (interval is None or key[1] == interval):
+                    del self._rings[key]
+
+    def _plan(self, symbol, interval, bars, now):
+        """Return (start, end, full_refresh) for the next fetch."""
+        ring = self._rings.get((symbol, interval))
+        step = interval * 60
+        if ring is None or len(ring) == 0 or ring.capacity < bars or now - ring.last_ts() > ring.capacity * step:
+            return now - bars * step, now, True
+        return int(ring.last_ts()), now, False
+
+    def _gaps(self, last_ts, rows, step):
+        """Missing (start, end) ranges between the cached bar and the fetched rows."""
+        ts = rows[:, 0] if last_ts is None else np.concatenate(([last_ts], rows[:, 0]))
+        holes = np.nonzero(np.diff(ts) > step)[0]
+        return [(int(ts[i] + step), int(ts[i + 1] - step)) for i in holes]
+
+    def _merge(self, symbol, interval, bars, rows, full_refresh):
+        key = (symbol, interval)
+        ring = self._rings.get(key)
+        if full_refresh or ring is None:
+            ring = KlineRing(max(bars, len(rows)) * self.headroom)
+            self._rings[key] = ring
+        for row in rows:
+            last_ts = ring.last_ts()
+            if last_ts is not None and row[0] < last_ts:
+                continue
+            if last_ts is not None and row[0] == last_ts:
+                ring.overwrite_last(row)
+            else:
+                ring.append(row)
+        return ring
+
+    def get(self, client, symbol: str, interval: int, bars: int):
+        now = int(self.clock())
+        with self._key_lock(symbol, interval):
+            start, end, full_refresh = self._plan(symbol, interval, bars, now)
+            data = client.get_kline_data(symbol, interval, start, end)
+            if data is None:
+                # 請求失敗時不回傳舊資料，與原本 load_kline_df 的行為一致
+                return None
+            rows = parse_kline_rows(data)
+            if len(rows) == 0 and full_refresh:
+                return None
+            last_ts = None if full_refresh else self._rings[(symbol, interval)].last_ts()
+            for gap_start, gap_end in self._gaps(last_ts, rows, interval * 60):
+                logger.info(f"K線缺口 {symbol} {interval}m: {gap_start} ~ {gap_end}，補抓中")
+                rows = np.concatenate((rows, parse_kline_rows(client.get_kline_data(symbol, interval, gap_start, gap_end))))
+            rows = rows[np.argsort(rows[:, 0], kind='stable')]
+            ring = self._merge(symbol, interval, bars, rows, full_refresh)
+            return bars_to_df(ring.window(bars))
+
+    async def get_async(self, client, symbol: str, interval: int, bars: int):
+        # 非同步版本：抓取用 await，合併邏輯與 get 相同；單一事件迴圈內不需要鎖
+        now = int(self.clock())
+        start, end, full_refresh = self._plan(symbol, interval, bars, now)
+        data = await client.get_kline_data(symbol, interval, start, end)
+        if data is None:
+            # 請求失敗時不回傳舊資料，與原本 load_kline_df 的行為一致
+            return None
+        rows = parse_kline_rows(data)
+        if len(rows) == 0 and full_refresh:
+            return None
+        last_ts = None if full_refresh else self._rings[(symbol, interval)].last_ts()
+        for gap_start, gap_end in self._gaps(last_ts, rows, interval * 60):
+            logger.info(f"K線缺口 {symbol} {interval}m: {gap_start} ~ {gap_end}，補抓中")
+            rows = np.concatenate((rows, parse_kline_rows(await client.get_kline_data(symbol, interval, gap_start, gap_end))))
+        rows = rows[np.argsort(rows[:, 0], kind='stable')]
+        ring = self._merge(symbol, interval, bars, rows, full_refresh)
+        return bars_to_df(ring.window(bars))
+
+
+def get_kline_cache(client):
+    """The KlineCache attached to an exchange client (created on first use)."""
+    cache = getattr(client, "kline_cache", None)
+    if cache is None:
+        # 客戶端（或 async 包裝的 .sync）帶有 clock 時沿用，例如紙上交易的回放時鐘
+        clock = getattr(getattr(client, "sync", client), "clock", time.time)
+        # setdefault 讓多執行緒同時首次取用時仍只保留一份
+        cache = vars(client).setdefault("kline_cache", KlineCache(clock=clock))
+    return cache
@@ -0,0 +1,381 @@
+import os
+import json
+import time
+import logging
+import argparse
+import threading
+from typing import NamedTuple
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+import config
+from data.kline_cache import parse_kline_rows, COLUMNS
+
+logger = logging.getLogger(__name__)
+
+FIELDS = ("timestamp", "open", "high", "low", "close", "volume")
+DTYPES = {"timestamp": np.dtype("<i8"), **{name: np.dtype("<f8") for name in FIELDS[1:]}}
+META_FILE = "meta.json"
+FORMAT_VERSION = 1
+
+
+class Klines(NamedTuple):
+    """Column views of a time range; backed by the store's memory maps, not copies."""
+    timestamp: np.ndarray
+    open: np.ndarray
+    high: np.ndarray
+    low: np.ndarray
+    close: np.ndarray
+    volume: np.ndarray
+
+    def to_bars(self):
+        """(n, 6) float array [ts, O, H, L, C, V] as used by the backtester and BarAggregator (a copy)."""
+        return np.column_stack(self).astype(float)
+
+    def to_df(self):
+        """load_kline_df-style DataFrame (a copy)."""
+        df = pd.DataFrame({name: column for name, column in zip(COLUMNS[1:], self[1:])})
+        df.insert(0, 'timestamp', pd.to_datetime(self.timestamp, unit='s'))
+        return df
+
+
+def _empty_klines():
+    return Klines(*(np.empty(0, dtype=DTYPES[name]) for name in FIELDS))
+
+
+class KlineSeries:
+    """Closed klines of one (exchange, symbol, timeframe), stored column by column.
+
+    Each column is a raw little-endian file (``<field>.<generation>.bin``);
+    ``meta.json`` holds the committed row count and generation and is replaced
+    atomically after the column data is flushed, so a reader never sees a row
+    that is not fully written and a crash mid-append only leaves ignored bytes
+    past the committed count. Rows are appended in timestamp order only; a
+    rewrite (merging older history, filling gaps) writes a new generation and
+    switches ``meta.json`` to it, while readers still holding the old maps
+    keep valid views. One writer per series; any number of readers.
+    """
+
+    def __init__(self, path, interval):
+        self.path = path
+        self.interval = interval
+        self.step = interval * 60
+        self._lock = threading.Lock()
+        self._maps = None
+        self._mapped = None
+        os.makedirs(path, exist_ok=True)
+        self.meta = self._read_meta() or {"version": FORMAT_VERSION, "interval": interval, "generation": 0, "count": 0}
+        if self.meta["interval"] != interval:
+            raise ValueError(f"{path} holds {self.meta['interval']}m klines, not {interval}m")
+
+    # ---------- 中繼資料 ----------
+    def _read_meta(self):
+        try:
+            with open(os.path.join(self.path, META_FILE), encoding="utf-8") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    def _write_meta(self, meta):
+        tmp_path = os.path.join(self.path, META_FILE + ".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(meta, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, os.path.join(self.path, META_FILE))
+        self.meta = meta
+
+    def _column_path(self, name, generation=None):
+        generation = self.meta["generation"] if generation is None else generation
+        return os.path.join(self.path, f"{name}.{generation}.bin")
+
+    def refresh(self):
+        """Pick up rows committed by another process; returns the row count."""
+        self.meta = self._read_meta() or self.meta
+        return self.meta["count"]
+
+    def __len__(self):
+        return self.meta["count"]
+
+    # ---------- 讀取 ----------
+    def _columns(self):
+        key = (self.meta["generation"], self.meta["count"])
+        if self._mapped != key:
+            count = self.meta["count"]
+            if count == 0:
+                self._maps = _empty_klines()
+            else:
+                self._maps = Klines(*(np.memmap(self._column_path(name), dtype=DTYPES[name], mode="r", shape=(count,))
+                                      for name in FIELDS))
+            self._mapped = key
+        return self._maps
+
+    def first_ts(self):
+        return int(self._columns().timestamp[0]) if len(self) else None
+
+    def last_ts(self):
+        return int(self._columns().timestamp[-1]) if len(self) else None
+
+    def view(self, start=None, end=None):
+        """Zero-copy column views of the bars with start <= timestamp < end (seconds)."""
+        columns = self._columns()
+        ts = columns.timestamp
+        lo = 0 if start is None else int(np.searchsorted(ts, start, side="left"))
+        hi = len(ts) if end is None else int(np.searchsorted(ts, end, side="left"))
+        return Klines(*(column[lo:hi] for column in columns))
+
+    def tail(self, bars):
+        columns = self._columns()
+        return Klines(*(column[max(0, len(column) - bars):] for column in columns))
+
+    # ---------- 寫入 ----------
+    def _normalize(self, rows):
+        rows = np.asarray(rows, dtype=float).reshape(-1, 6)
+        rows = rows[~np.isnan(rows).any(axis=1)]
+        rows = rows[np.argsort(rows[:, 0], kind="stable")]
+        misaligned = rows[:, 0] % self.step != 0
+        if misaligned.any():
+            raise ValueError(f"{int(misaligned.sum())} rows are not aligned to {self.interval}m, "
+                             f"e.g. ts={int(rows[misaligned][0, 0])}")
+        # 同一時間戳保留最後一筆
+        keep = np.r_[rows[1:, 0] != rows[:-1, 0], True] if len(rows) else np.empty(0, dtype=bool)
+        return rows[keep]
+
+    def _write_columns(self, rows, generation, offset):
+        for k, name in enumerate(FIELDS):
+            path = self._column_path(name, generation)
+            with open(path, "r+b" if os.path.exists(path) else "wb") as f:
+                # 截掉上次寫入中斷留下、未提交的尾端
+                f.truncate(offset * 8)
+                f.seek(offset * 8)
+                f.write(rows[:, k].astype(DTYPES[name]).tobytes())
+                f.flush()
+                os.fsync(f.fileno())
+
+    def append(self, rows):
+        """Append closed bars newer than the last stored one; returns how many were added.
+
+        Rows at or before the last stored timestamp are ignored; rows not aligned
+        to the timeframe raise ValueError.
+        """
+        rows = self._normalize(rows)
+        with self._lock:
+            last_ts = self.last_ts()
+            if last_ts is not None:
+                rows = rows[rows[:, 0] > last_ts]
+            if len(rows) == 0:
+                return 0
+            count = self.meta["count"]
+            self._write_columns(rows, self.meta["generation"], count)
+            self._write_meta({**self.meta, "count": count + len(rows)})
+        return len(rows)
+
+    def rewrite(self, rows):
+        """Merge ``rows`` with the stored bars (stored values win) into a new generation."""
+        rows = self._normalize(rows)
+        with self._lock:
+            stored = self._columns().to_bars()
+            merged = np.concatenate((rows, stored))
+            merged = merged[np.argsort(merged[:, 0], kind="stable")]
+            merged = merged[np.r_[merged[1:, 0] != merged[:-1, 0], True]]
+            old_generation = self.meta["generation"]
+            generation = old_generation + 1
+            self._write_columns(merged, generation, 0)
+            self._write_meta({**self.meta, "generation": generation, "count": len(merged)})
+            for name in FIELDS:
+                try:
+                    os.remove(self._column_path(name, old_generation))
+                except FileNotFoundError:
+                    pass
+        return len(merged) - len(stored)
+
+    # ---------- 檢查 ----------
+    def gaps(self, start=None, end=None):
+        """Missing bars as inclusive (first_missing_ts, last_missing_ts) ranges, like KlineCache._gaps."""
+        ts = self.view(start, end).timestamp
+        holes = np.flatnonzero(np.diff(ts) > self.step)
+        return [(int(ts[i] + self.step), int(ts[i + 1] - self.step)) for i in holes]
+
+    def verify(self):
+        """Integrity report: file sizes vs. the committed count, ordering, alignment,
+        NaNs, OHLC consistency and gaps. ``ok`` is False on anything but gaps and
+        uncommitted tail bytes."""
+        count = self.meta["count"]
+        problems, uncommitted = [], []
+        for name in FIELDS:
+            try:
+                size = os.path.getsize(self._column_path(name))
+            except FileNotFoundError:
+                size = 0
+            if size < count * 8:
+                problems.append(f"{name}: {size // 8} rows on disk, {count} committed")
+            elif size > count * 8:
+                uncommitted.append(f"{name}: {size - count * 8} uncommitted bytes (interrupted append)")
+        readable = not problems
+        if readable and count:
+            k = self._columns()
+            ts = k.timestamp
+            checks = {
+                "timestamps not increasing": int((np.diff(ts) <= 0).sum()),
+                "timestamps not aligned": int((ts % self.step != 0).sum()),
+                "NaN values": int(sum(np.isnan(column).sum() for column in k[1:])),
+                "high below open/close/low": int((k.high < np.maximum(np.maximum(k.open, k.close), k.low)).sum()),
+                "low above open/close": int((k.low > np.minimum(k.open, k.close)).sum()),
+                "negative volume": int((k.volume < 0).sum()),
+            }
+            problems += [f"{label}: {n}" for label, n in checks.items() if n]
+        gaps = self.gaps() if readable else []
+        return {
+            "path": self.path,
+            "rows": count,
+            "first_ts": self.first_ts() if readable else None,
+            "last_ts": self.last_ts() if readable else None,
+            "gaps": gaps,
+            "missing_bars": sum((end - start) // self.step + 1 for start, end in gaps),
+            # 中斷的寫入留下的未提交尾端不影響讀取，下次 append 會截掉
+            "problems": problems + uncommitted,
+            "ok": not problems,
+        }
+
+
+class KlineStore:
+    """Directory of KlineSeries laid out as ``<root>/<exchange>/<symbol>/<interval>m``."""
+
+    def __init__(self, root=None):
+        self.root = root or config.KLINE_STORE_DIR
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def series(self, exchange, symbol, interval):
+        key = (exchange, symbol, interval)
+        with self._lock:
+            if key not in self._series:
+                self._series[key] = KlineSeries(os.path.join(self.root, exchange, symbol, f"{interval}m"), interval)
+            return self._series[key]
+
+    def list(self):
+        """(exchange, symbol, interval) of every series on disk."""
+        found = []
+        for dirpath, _, filenames in os.walk(self.root):
+            if META_FILE in filenames:
+                rel = os.path.relpath(dirpath, self.root).split(os.sep)
+                if len(rel) == 3 and rel[2].endswith("m"):
+                    found.append((rel[0], rel[1], int(rel[2][:-1])))
+        return sorted(found)
+
+
+# ---------- 回補 ----------
+def _missing_ranges(series, start, end):
+    """[start, end) minus what the series holds, as half-open ranges."""
+    if len(series) == 0:
+        return [(start, end)]
+    step = series.step
+    first, last = series.first_ts(), series.last_ts()
+    ranges = []
+    if start < first:
+        ranges.append((start, min(first, end)))
+    ranges += [(max(gap_start, start), min(gap_end + step, end)) for gap_start, gap_end in series.gaps(start, end)]
+    if last + step < end:
+        ranges.append((max(last + step, start), end))
+    return [(lo, hi) for lo, hi in ranges if lo < hi]
+
+
+def backfill(store, client, exchange, symbol, interval, start, end=None, page_bars=None, workers=None):
+    """Fetch the closed bars in [start, end) missing from the store with concurrent
+    get_kline_data pages and store them.
+
+    New bars after the last stored one are appended; older history and filled
+    gaps go through a rewrite. Pages that fail are logged and reported, and can
+    be retried by running the backfill again. Returns a summary dict.
+    """
+    series = store.series(exchange, symbol, interval)
+    step = interval * 60
+    page_bars = page_bars or config.KLINE_PAGE_BARS
+    now = int(time.time())
+    # 只存已收盤的K線
+    end = min(int(end) if end is not None else now, now - now % step)
+    start = int(start) - int(start) % step
+    pages = [(lo, min(lo + page_bars * step, hi)) for range_start, hi in _missing_ranges(series, start, end)
+             for lo in range(range_start, hi, page_bars * step)]
+
+    def fetch(page):
+        lo, hi = page
+        data = client.get_kline_data(symbol, interval, lo, hi - step)
+        if data is None:
+            return None
+        rows = parse_kline_rows(data)
+        return rows[(rows[:, 0] >= lo) & (rows[:, 0] < hi) & (rows[:, 0] % step == 0)]
+
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers or config.KLINE_BACKFILL_WORKERS) as pool:
+        results = list(pool.map(fetch, pages))
+    failed = [page for page, rows in zip(pages, results) if rows is None]
+    for lo, hi in failed:
+        logger.error(f"K線回補失敗 {exchange} {symbol} {interval}m: {lo} ~ {hi}")
+    fetched = [rows for rows in results if rows is not None and len(rows)]
+    rows = np.concatenate(fetched) if fetched else np.empty((0, 6))
+
+    last_ts = series.last_ts()
+    if len(rows) == 0:
+        added = 0
+    elif last_ts is None or rows[:, 0].min() > last_ts:
+        added = series.append(rows)
+    else:
+        added = series.rewrite(rows)
+    summary = {"pages": len(pages), "failed_pages": len(failed), "rows_added": added, "rows": len(series),
+               "gaps": len(series.gaps()), "seconds": round(time.perf_counter() - t0, 3)}
+    logger.info(f"K線回補 {exchange} {symbol} {interval}m: {summary}")
+    return summary
+
+
+def _create_client(exchange):
+    if exchange != "bitmart":
+        # 目前只有 BitmartClient 提供 get_kline_data
+        raise SystemExit(f"no kline source for exchange {exchange!r}")
+    from dotenv import load_dotenv
+    from exchanges.bitmart_client import BitmartClient
+    load_dotenv()
+    return BitmartClient(api_key=os.getenv("BITMART_API_KEY"), secret_key=os.getenv("BITMART_SECRET_KEY"),
+                         memo=os.getenv("BITMART_MEMO"))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="本機K線庫：回補、檢查與列出")
+    parser.add_argument("--root", default=config.KLINE_STORE_DIR)
+    commands = parser.add_subparsers(dest="command", required=True)
+    fill = commands.add_parser("backfill", help="以 get_kline_data 分頁並行回補缺少的K線")
+    check = commands.add_parser("check", help="檢查完整性與缺口")
+    commands.add_parser("list", help="列出已存的K線序列")
+    for sub in (fill, check):
+        sub.add_argument("--exchange", default="bitmart")
+        sub.add_argument("--symbol", default=config.SYMBOL)
+        sub.add_argument("--interval", type=int, default=15)
+    fill.add_argument("--days", type=float, default=365, help="回補最近幾天（或以 --start 指定起點）")
+    fill.add_argument("--start", type=int, help="起始時間戳（秒）")
+    fill.add_argument("--end", type=int, help="結束時間戳（秒，不含），預設為最後一根已收盤K線")
+    fill.add_argument("--workers", type=int, default=config.KLINE_BACKFILL_WORKERS)
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(name)s - %(message)s')
+
+    store = KlineStore(args.root)
+    if args.command == "list":
+        for exchange, symbol, interval in store.list():
+            series = store.series(exchange, symbol, interval)
+            print(f"{exchange}/{symbol}/{interval}m: {len(series)} bars, {series.first_ts()} ~ {series.last_ts()}")
+    elif args.command == "check":
+        report = store.series(args.exchange, args.symbol, args.interval).verify()
+        print(json.dumps(report, indent=2))
+        return 0 if report["ok"] else 1
+    else:
+        start = args.start if args.start is not None else int(time.time() - args.days * 86400)
+        summary = backfill(store, _create_client(args.exchange), args.exchange, args.symbol, args.interval,
+                           start, args.end, workers=args.workers)
+        print(json.dumps(summary, indent=2))
+        return 0 if summary["failed_pages"] == 0 else 1
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
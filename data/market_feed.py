@@ -0,0 +1,207 @@
+import json
+import time
+import logging
+import threading
+from dataclasses import dataclass, replace
+
+import websocket
+
+logger = logging.getLogger(__name__)
+
+BITMART_FUTURES_WS_URL = "wss://openapi-ws-v2.bitmart.com/api?protocol=1.1"
+
+# K線週期（分鐘）-> Bitmart 頻道後綴
+KLINE_CHANNELS = {1: "1m", 5: "5m", 15: "15m", 30: "30m", 60: "1H", 120: "2H", 240: "4H", 1440: "1D", 10080: "1W"}
+KLINE_STEPS = {suffix: step for step, suffix in KLINE_CHANNELS.items()}
+
+
+@dataclass(frozen=True)
+class Quote:
+    symbol: str
+    bid: float = None
+    ask: float = None
+    bid_size: float = None
+    ask_size: float = None
+    last: float = None
+    updated_at: float = 0.0   # 本地收到的時間 (time.time())
+    source: str = "stream"    # "stream" 或 "rest"
+
+    @property
+    def mid(self):
+        if self.bid is not None and self.ask is not None:
+            return (self.bid + self.ask) / 2
+        return self.last
+
+    @property
+    def age(self):
+        return time.time() - self.updated_at
+
+
+class QuoteTable:
+    """Latest quote per symbol. Writers replace the whole Quote, readers never block on I/O."""
+
+    def __init__(self):
+        self._quotes = {}
+        self._lock = threading.Lock()
+
+    def update(self, symbol, source="stream", **fields):
+        fields = {k: v for k, v in fields.items() if v is not None}
+        with self._lock:
+            quote = self._quotes.get(symbol) or Quote(symbol)
+            self._quotes[symbol] = replace(quote, updated_at=time.time(), source=source, **fields)
+            return self._quotes[symbol]
+
+    def get(self, symbol, max_age=None):
+        """The quote for ``symbol``, or None if there is none or it is older than ``max_age`` seconds."""
+        quote = self._quotes.get(symbol)
+        if quote is None or (max_age is not None and quote.age > max_age):
+            return None
+        return quote
+
+
+def _float(value):
+    return float(value) if value not in (None, "") else None
+
+
+class MarketDataFeed:
+    """Push-based ticker / top-of-book / kline feed with REST fallback.
+
+    A background thread keeps a websocket subscription open (reconnecting on
+    drop) and writes every update into ``quotes``. A second thread polls
+    ``rest_fetch(symbol)`` for any symbol whose stream data is older than
+    ``stale_after`` seconds, so readers keep getting prices while the stream is
+    down. ``rest_fetch`` returns a dict of Quote fields (bid/ask/...) or None.
+    """
+
+    def __init__(self, symbols, url=BITMART_FUTURES_WS_URL, rest_fetch=None, kline_steps=(),
+                 stale_after=5.0, poll_interval=2.0, reconnect_delay=1.0, ping_interval=15):
+        self.symbols = list(symbols)
+        self.url = url
+        self.rest_fetch = rest_fetch
+        self.kline_steps = list(kline_steps)
+        self.stale_after = stale_after
+        self.poll_interval = poll_interval
+        self.reconnect_delay = reconnect_delay
+        self.ping_interval = ping_interval
+        self.quotes = QuoteTable()
+        self.klines = {}               # (symbol, step) -> 最新一根 [ts, open, high, low, close, volume]
+        self.kline_listeners = []      # callback(symbol, step, bar)
+        self.connected = False
+        self.stream_updated_at = {}    # symbol -> 最後一次由串流更新的時間
+        self.stats = {"messages": 0, "reconnects": 0, "rest_polls": 0}
+        self._app = None
+        self._stop = threading.Event()
+        self._threads = []
+
+    # ---- 讀取 ----
+    def quote(self, symbol, max_age=None):
+        return self.quotes.get(symbol, self.stale_after if max_age is None else max_age)
+
+    def mid_price(self, symbol, max_age=None):
+        quote = self.quote(symbol, max_age)
+        return quote.mid if quote is not None else None
+
+    def stream_healthy(self, symbol):
+        updated = self.stream_updated_at.get(symbol)
+        return self.connected and updated is not None and time.time() - updated <= self.stale_after
+
+    # ---- 生命週期 ----
+    def start(self):
+        self._stop.clear()
+        # url 為 None 時不連串流，只以 REST 輪詢（如模擬交易所）
+        self._threads = [threading.Thread(target=self._run_stream, name="market-feed-ws", daemon=True)] if self.url else []
+        if self.rest_fetch is not None:
+            self._threads.append(threading.Thread(target=self._run_fallback, name="market-feed-rest", daemon=True))
+        for thread in self._threads:
+            thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._app is not None:
+            self._app.close()
+        for thread in self._threads:
+            thread.join(timeout=5)
+
+    def subscriptions(self):
+        args = []
+        for symbol in self.symbols:
+            args += [f"futures/ticker:{symbol}", f"futures/depth5:{symbol}"]
+            args += [f"futures/klineBin{KLINE_CHANNELS[step]}:{symbol}" for step in self.kline_steps]
+        return args
+
+    def _run_stream(self):
+        while not self._stop.is_set():
+            self._app = websocket.WebSocketApp(
+                self.url, on_open=self._on_open, on_message=self._on_message,
+                on_error=lambda app, error: logger.warning(f"行情串流錯誤: {error}"),
+                on_close=self._on_close)
+            self._app.run_forever(ping_interval=self.ping_interval, ping_timeout=self.ping_interval - 1)
+            self.connected = False
+            if not self._stop.wait(self.reconnect_delay):
+                self.stats["reconnects"] += 1
+                logger.info("行情串流中斷，重新連線...")
+
+    def _run_fallback(self):
+        # 啟動時先輪詢一次，只走 REST 時第一回合就有報價
+        while True:
+            for symbol in self.symbols:
+                if self.stream_healthy(symbol):
+                    continue
+                try:
+                    fields = self.rest_fetch(symbol)
+                except Exception as e:
+                    logger.warning(f"REST 行情備援失敗 {symbol}: {e}")
+                    continue
+                if fields:
+                    self.quotes.update(symbol, source="rest", **fields)
+                    self.stats["rest_polls"] += 1
+            if self._stop.wait(self.poll_interval):
+                return
+
+    # ---- 串流事件 ----
+    def _on_open(self, app):
+        self.connected = True
+        app.send(json.dumps({"action": "subscribe", "args": self.subscriptions()}))
+        logger.info(f"行情串流已連線: {self.url}")
+
+    def _on_close(self, app, status_code, message):
+        self.connected = False
+
+    def _on_message(self, app, message):
+        try:
+            self.handle_message(json.loads(message))
+        except (ValueError, KeyError, TypeError, IndexError) as e:
+            logger.warning(f"無法解析行情訊息: {e}")
+
+    def handle_message(self, msg):
+        group, data = msg.get("group"), msg.get("data")
+        if not group or data is None:
+            return
+        self.stats["messages"] += 1
+        channel, _, symbol = group.partition(":")
+        if channel == "futures/ticker":
+            self.quotes.update(symbol, last=_float(data.get("last_price")),
+                               bid=_float(data.get("bid_price")), ask=_float(data.get("ask_price")),
+                               bid_size=_float(data.get("bid_vol")), ask_size=_float(data.get("ask_vol")))
+        elif channel.startswith("futures/depth"):
+            best = data["depths"][0] if data.get("depths") else None
+            if best is None:
+                return
+            # way: 1 = 買盤, 2 = 賣盤
+            if data.get("way") == 1:
+                self.quotes.update(symbol, bid=_float(best["price"]), bid_size=_float(best["vol"]))
+            else:
+                self.quotes.update(symbol, ask=_float(best["price"]), ask_size=_float(best["vol"]))
+        elif channel.startswith("futures/klineBin"):
+            step = KLINE_STEPS[channel[len("futures/klineBin"):]]
+            for item in data.get("items") or [data]:
+                bar = [float(item["ts"]), float(item["o"]), float(item["h"]), float(item["l"]),
+                       float(item["c"]), float(item["v"])]
+                self.klines[(symbol, step)] = bar
+                self.quotes.update(symbol, last=bar[4])
+                for listener in self.kline_listeners:
+                    listener(symbol, step, bar)
+        else:
+            return
+        self.stream_updated_at[symbol] = time.time()
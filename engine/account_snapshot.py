@@ -0,0 +1,168 @@
+import time
+import asyncio
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from engine.confirmation import confirm_positions
+from exchanges.rate_limit import urgent
+
+logger = logging.getLogger(__name__)
+
+# 四個帳戶查詢同時送出
+_account_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="account-snapshot")
+
+
+def _timed(fn, *args):
+    start = time.perf_counter()
+    try:
+        value = fn(*args)
+    except Exception as e:
+        logger.error(f"{getattr(fn, '__qualname__', fn)} raised: {e}")
+        value = None
+    return value, (time.perf_counter() - start) * 1000
+
+
+class AccountSnapshot:
+    """Balances and positions of both venues, fetched concurrently once per round.
+
+    The margin check, the strategy decision and the close logic all read from
+    the same snapshot; only ``refresh_positions`` (after a close or an order)
+    goes back to the exchanges. Accepts the sync clients or the wrappers from
+    exchanges.async_clients (their ``.sync`` client is used).
+    """
+
+    def __init__(self, bitmart_client, topone_client, symbol):
+        self.bitmart_client = getattr(bitmart_client, "sync", bitmart_client)
+        self.topone_client = getattr(topone_client, "sync", topone_client)
+        self.symbol = symbol
+        self.balances = {"bitmart": None, "topone": None}
+        self.positions = {"bitmart": None, "topone": None}
+        # Bitmart 此交易對的持倉列表；查詢失敗時為 None（未知）
+        self.bitmart_positions = []
+        # TopOne 原始持倉列表，平倉時需要每一筆的 position_id
+        self.topone_open_positions = []
+        self.fetched_at = None
+        self.latency_ms = {}
+        self.confirm_ms = {}
+
+    def _fetch(self, calls):
+        futures = {name: _account_executor.submit(_timed, fn, *args) for name, (fn, args) in calls.items()}
+        results = {}
+        for name, future in futures.items():
+            results[name], self.latency_ms[name] = future.result()
+        self.fetched_at = time.time()
+        return results
+
+    def _position_calls(self):
+        return {
+            # get_position 查無持倉與查詢失敗都回傳 None，改用能區分兩者的 get_all_positions
+            "bitmart_positions": (self.bitmart_client.get_all_positions, ()),
+            "topone_positions": (self.topone_client.get_open_positions, (self.symbol,)),
+        }
+
+    def _apply_positions(self, results):
+        # 查詢失敗時保留 None（未知），不可當成「無持倉」
+        all_positions = results["bitmart_positions"]
+        self.bitmart_positions = None if all_positions is None else \
+            [p for p in all_positions if p.get('symbol') == self.symbol]
+        self.positions["bitmart"] = next(iter(self.bitmart_positions or ()), None)
+        self.topone_open_positions = results["topone_positions"]
+        self.positions["topone"] = None if self.topone_open_positions is None else \
+            self.topone_client.summarize_positions(self.topone_open_positions, self.symbol)
+
+    def refresh(self):
+        """Fetch both balances and both positions concurrently."""
+        calls = {
+            "bitmart_balance": (self.bitmart_client.get_balance, ()),
+            "topone_balance": (self.topone_client.get_balance, ()),
+            **self._position_calls(),
+        }
+        results = self._fetch(calls)
+        self.balances = {"bitmart": results["bitmart_balance"], "topone": results["topone_balance"]}
+        self._apply_positions(results)
+        logger.info(f"帳戶快照: 餘額={self.balances}, 查詢耗時(ms)={ {k: round(v, 1) for k, v in self.latency_ms.items()} }")
+        return self
+
+    @classmethod
+    def refresh_many(cls, bitmart_client, topone_client, symbols):
+        """One concurrent fetch of both balances and all positions, split into a
+        snapshot per symbol. Four requests per round however many symbols run.
+        Returns None when either position list could not be fetched, since an
+        unknown position must not be read as flat."""
+        probe = cls(bitmart_client, topone_client, None)
+        results = probe._fetch({
+            "bitmart_balance": (probe.bitmart_client.get_balance, ()),
+            "topone_balance": (probe.topone_client.get_balance, ()),
+            "bitmart_positions": (probe.bitmart_client.get_all_positions, ()),
+            "topone_positions": (probe.topone_client.get_open_positions, (None,)),
+        })
+        if results["bitmart_positions"] is None or results["topone_positions"] is None:
+            logger.error("無法取得完整持倉列表，本回合略過")
+            return None
+        balances = {"bitmart": results["bitmart_balance"], "topone": results["topone_balance"]}
+        snapshots = {}
+        for symbol in symbols:
+            snapshot = cls(bitmart_client, topone_client, symbol)
+            snapshot.balances = dict(balances)
+            snapshot.fetched_at, snapshot.latency_ms = probe.fetched_at, dict(probe.latency_ms)
+            snapshot._apply_positions({
+                "bitmart_positions": results["bitmart_positions"],
+                "topone_positions": [p for p in results["topone_positions"] if p.get('pair') == symbol],
+            })
+            snapshots[symbol] = snapshot
+        logger.info(f"帳戶快照 ({len(snapshots)} 個交易對): 餘額={balances}, 查詢耗時(ms)={ {k: round(v, 1) for k, v in probe.latency_ms.items()} }")
+        return snapshots
+
+    def refresh_positions(self):
+        """Re-read positions only, after a state-changing action."""
+        self._apply_positions(self._fetch(self._position_calls()))
+        return self.positions
+
+    def await_positions(self, expect_open, timeout=15.0):
+        """Poll until each venue in ``expect_open`` ({venue: bool}) is open/flat, then
+        update the snapshot from the last poll. Returns {venue: Confirmation}."""
+        clients = {"bitmart": self.bitmart_client, "topone": self.topone_client}
+        confirmations = confirm_positions(clients, self.symbol, expect_open, timeout)
+        if "bitmart" in confirmations and confirmations["bitmart"].value is not None:
+            self.bitmart_positions = confirmations["bitmart"].value
+            self.positions["bitmart"] = next(iter(self.bitmart_positions), None)
+        if "topone" in confirmations and confirmations["topone"].value is not None:
+            self.topone_open_positions = confirmations["topone"].value
+            self.positions["topone"] = self.topone_client.summarize_positions(self.topone_open_positions, self.symbol)
+        self.fetched_at = time.time()
+        self.confirm_ms = {venue: c.elapsed_ms for venue, c in confirmations.items()}
+        return confirmations
+
+    @property
+    def positions_known(self):
+        """False when either venue's position list could not be fetched, so the
+        snapshot cannot tell whether that venue is flat."""
+        return self.bitmart_positions is not None and self.topone_open_positions is not None
+
+    def has_position(self, venue):
+        return self.positions[venue] is not None
+
+    def close(self, venue):
+        """Close ``venue``'s position using the snapshot data, without re-fetching it first."""
+        with urgent():
+            if venue == "bitmart":
+                return self.bitmart_client.close_position(self.symbol, position=self.positions["bitmart"])
+            return self.topone_client.close_position(self.symbol, open_positions=self.topone_open_positions)
+
+    def close_all(self):
+        """Close every open position concurrently; returns {venue: response}."""
+        venues = [venue for venue in ("bitmart", "topone") if self.has_position(venue)]
+        futures = {venue: _account_executor.submit(_timed, self.close, venue) for venue in venues}
+        return {venue: future.result()[0] for venue, future in futures.items()}
+
+    async def refresh_async(self):
+        return await asyncio.get_running_loop().run_in_executor(None, self.refresh)
+
+    async def refresh_positions_async(self):
+        return await asyncio.get_running_loop().run_in_executor(None, self.refresh_positions)
+
+    async def close_all_async(self):
+        return await asyncio.get_running_loop().run_in_executor(None, self.close_all)
+
+    async def await_positions_async(self, expect_open, timeout=15.0):
+        return await asyncio.get_running_loop().run_in_executor(None, self.await_positions, expect_open, timeout)
@@ -0,0 +1,103 @@
+import time
+import asyncio
+import logging
+from dataclasses import dataclass
+from concurrent.futures import ThreadPoolExecutor
+
+from exchanges.rate_limit import urgent
+
+logger = logging.getLogger(__name__)
+
+# 兩個交易所各自輪詢，互不等待
+_confirm_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="confirm")
+
+
+@dataclass
+class Confirmation:
+    venue: str
+    confirmed: bool
+    elapsed_ms: float
+    polls: int
+    value: object = None
+
+
+def wait_until(fetch, predicate, timeout=15.0, initial_delay=0.05, max_delay=1.0, backoff=1.6, venue=""):
+    """Poll ``fetch()`` until ``predicate(value)`` holds or ``timeout`` seconds pass.
+
+    The first poll is immediate and the delay between polls grows by ``backoff``
+    up to ``max_delay``, so a fast exchange is confirmed within one round trip
+    and a slow one is not hammered. Returns a Confirmation with the last value.
+    """
+    start = time.perf_counter()
+    deadline = start + timeout
+    delay = initial_delay
+    polls = 0
+    while True:
+        polls += 1
+        try:
+            value = fetch()
+            reached = predicate(value)
+        except Exception as e:
+            logger.warning(f"{venue} confirmation poll failed: {e}")
+            value, reached = None, False
+        now = time.perf_counter()
+        if reached or now >= deadline:
+            confirmation = Confirmation(venue, reached, (now - start) * 1000, polls, value)
+            if not reached:
+                logger.warning(f"{venue} 狀態未在 {timeout:.1f} 秒內確認 (輪詢 {polls} 次)")
+            return confirmation
+        time.sleep(min(delay, deadline - now))
+        delay = min(delay * backoff, max_delay)
+
+
+def _urgent_wait(*args, **kwargs):
+    # 平倉/開倉後的持倉確認屬於交易流程，限流時排在行情請求之前
+    with urgent():
+        return wait_until(*args, **kwargs)
+
+
+def _bitmart_positions(client, symbol):
+    # get_position 查無持倉與查詢失敗都回傳 None；get_all_positions 失敗時才是 None，無持倉是 []
+    positions = client.get_all_positions()
+    return None if positions is None else [p for p in positions if p.get('symbol') == symbol]
+
+
+def _bitmart_position_check(client, symbol, expect_open):
+    # 查詢失敗（None）視為尚未確認，繼續輪詢
+    return (lambda: _bitmart_positions(client, symbol)), \
+        (lambda positions: positions is not None and bool(positions) == expect_open)
+
+
+def _topone_position_check(client, symbol, expect_open):
+    # get_open_positions 失敗時回傳 None，不可當成「已平倉」
+    return (lambda: client.get_open_positions(symbol)), \
+        (lambda positions: positions is not None and bool(positions) == expect_open)
+
+
+_POSITION_CHECKS = {"bitmart": _bitmart_position_check, "topone": _topone_position_check}
+
+
+def confirm_positions(clients, symbol, expect_open, timeout=15.0, **backoff):
+    """Wait, per exchange and concurrently, for the position to be open or flat.
+
+    ``clients`` and ``expect_open`` are keyed by venue ("bitmart", "topone").
+    Returns {venue: Confirmation}; each venue reports its own confirmation time.
+    The Confirmation value is the venue's position list for ``symbol`` (None when
+    the last poll failed).
+    """
+    futures = {}
+    for venue, want_open in expect_open.items():
+        fetch, predicate = _POSITION_CHECKS[venue](clients[venue], symbol, want_open)
+        # 客戶端可限制確認時間：紙上帳戶同步成交，第一次查詢就是最終狀態，不在牆上時鐘空等
+        venue_timeout = min(timeout, getattr(clients[venue], "confirm_timeout", timeout))
+        futures[venue] = _confirm_executor.submit(_urgent_wait, fetch, predicate, venue_timeout, venue=venue,
+                                                  **backoff)
+    confirmations = {venue: future.result() for venue, future in futures.items()}
+    logger.info("持倉確認: " + ", ".join(
+        f"{venue}={'OK' if c.confirmed else 'TIMEOUT'} {c.elapsed_ms:.0f}ms/{c.polls}次" for venue, c in confirmations.items()))
+    return confirmations
+
+
+async def confirm_positions_async(clients, symbol, expect_open, timeout=15.0, **backoff):
+    return await asyncio.get_running_loop().run_in_executor(
+        None, lambda: confirm_positions(clients, symbol, expect_open, timeout, **backoff))
@@ -0,0 +1,94 @@
+import time
+import asyncio
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from exchanges.rate_limit import urgent
+
+logger = logging.getLogger(__name__)
+
+# 共用執行緒池，兩條腿同時送出，不必每回合重新建立執行緒
+_leg_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="hedge-leg")
+
+
+def _submit_leg(client, symbol, side, margin, leverage, tp_price, sl_price):
+    start = time.perf_counter()
+    try:
+        # 下單路徑上的報價/槓桿查詢也優先於行情類請求
+        with urgent():
+            response = client.place_order(symbol, side, margin, leverage, tp_price=tp_price, sl_price=sl_price)
+    except Exception as e:
+        logger.error(f"{type(client).__name__} place_order raised: {e}")
+        response = None
+    return response, start, time.perf_counter()
+
+
+async def _submit_leg_async(client, symbol, side, margin, leverage, tp_price, sl_price):
+    # urgent() 是執行緒區域的設定，必須在實際送出請求的執行緒中進入，
+    # 因此直接在下單執行緒池上呼叫同步客戶端，而不是 await 非同步包裝
+    return await asyncio.get_running_loop().run_in_executor(
+        _leg_executor, _submit_leg, getattr(client, "sync", client), symbol, side, margin, leverage, tp_price, sl_price)
+
+
+def open_hedge(bitmart_client, topone_client, symbol, bitmart_side, margin, leverage,
+               bitmart_tp, bitmart_sl, topone_tp, topone_sl, unwind_on_failure=True):
+    """Submit the Bitmart and TopOne legs concurrently.
+
+    Returns both order responses, each leg's submit-to-ack time, the skew between
+    the two acks (how long the hedge was one-legged) and which leg was unwound,
+    if any.
+    """
+    topone_side = 'short' if bitmart_side == 'long' else 'long'
+
+    bitmart_future = _leg_executor.submit(_submit_leg, bitmart_client, symbol, bitmart_side, margin, leverage, bitmart_tp, bitmart_sl)
+    topone_future = _leg_executor.submit(_submit_leg, topone_client, symbol, topone_side, margin, leverage, topone_tp, topone_sl)
+
+    result = _hedge_result(bitmart_future.result(), topone_future.result(), unwind_on_failure)
+    if result["unwound"] == "bitmart":
+        bitmart_client.close_position(symbol)
+    elif result["unwound"] == "topone":
+        topone_client.close_position(symbol)
+    return result
+
+
+async def open_hedge_async(bitmart_client, topone_client, symbol, bitmart_side, margin, leverage,
+                           bitmart_tp, bitmart_sl, topone_tp, topone_sl, unwind_on_failure=True):
+    """Awaitable open_hedge for the clients in exchanges.async_clients."""
+    topone_side = 'short' if bitmart_side == 'long' else 'long'
+
+    bitmart_leg, topone_leg = await asyncio.gather(
+        _submit_leg_async(bitmart_client, symbol, bitmart_side, margin, leverage, bitmart_tp, bitmart_sl),
+        _submit_leg_async(topone_client, symbol, topone_side, margin, leverage, topone_tp, topone_sl),
+    )
+
+    result = _hedge_result(bitmart_leg, topone_leg, unwind_on_failure)
+    if result["unwound"] == "bitmart":
+        await bitmart_client.close_position(symbol)
+    elif result["unwound"] == "topone":
+        await topone_client.close_position(symbol)
+    return result
+
+
+def _hedge_result(bitmart_leg, topone_leg, unwind_on_failure):
+    bitmart_order, bm_start, bm_end = bitmart_leg
+    topone_order, to_start, to_end = topone_leg
+
+    result = {
+        "bitmart_order": bitmart_order,
+        "topone_order": topone_order,
+        "bitmart_ack_ms": (bm_end - bm_start) * 1000,
+        "topone_ack_ms": (to_end - to_start) * 1000,
+        "skew_ms": abs(bm_end - to_end) * 1000,
+        "unwound": None,
+    }
+    logger.info(f"對沖下單耗時 Bitmart={result['bitmart_ack_ms']:.1f}ms, TopOne={result['topone_ack_ms']:.1f}ms, 兩腿時間差={result['skew_ms']:.1f}ms")
+
+    # 只有一邊成功時，由呼叫端平掉存活的那一腿
+    if unwind_on_failure and bitmart_order and not topone_order:
+        logger.warning("Bitmart opened, but TopOne failed. Attempting to close Bitmart position.")
+        result["unwound"] = "bitmart"
+    elif unwind_on_failure and topone_order and not bitmart_order:
+        logger.warning("TopOne opened, but Bitmart failed. Attempting to close TopOne position.")
+        result["unwound"] = "topone"
+
+    return result
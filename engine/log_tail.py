@@ -0,0 +1,88 @@
+import os
+import re
+import logging
+from collections import deque
+
+# backend_service 的日誌格式: '%(asctime)s - %(levelname)s - %(name)s - %(message)s'
+_LEVEL_RE = re.compile(r"^\S+ \S+ - (DEBUG|INFO|WARNING|ERROR|CRITICAL) - ")
+
+
+class LogTail:
+    """Incremental reader of a (rotating) log file keeping the last ``max_lines`` entries.
+
+    ``poll()`` reads only the bytes appended since the previous poll; the file
+    is opened per poll so a RotatingFileHandler can rename it on any platform.
+    A rotation (new inode, or the file shrank) is detected and the unread end
+    of the rotated ``<path>.1`` is read before starting the new file from 0.
+    A partial last line is held back until its newline arrives. Continuation
+    lines (tracebacks) inherit the level of the entry they belong to.
+    """
+
+    def __init__(self, path, max_lines=1000, initial_bytes=256 * 1024, encoding="utf-8"):
+        self.path = path
+        self.encoding = encoding
+        self.initial_bytes = initial_bytes
+        self.entries = deque(maxlen=max_lines)
+        self._offset = None
+        self._inode = None
+        self._partial = b""
+        self._level = logging.INFO
+
+    def _read_from(self, path, offset):
+        with open(path, "rb") as f:
+            f.seek(offset)
+            data = f.read()
+        return data, offset + len(data)
+
+    def _ingest(self, data):
+        data = self._partial + data
+        lines = data.split(b"\n")
+        self._partial = lines.pop()
+        for raw in lines:
+            line = raw.decode(self.encoding, errors="replace").rstrip("\r")
+            match = _LEVEL_RE.match(line)
+            if match:
+                self._level = logging.getLevelName(match.group(1))
+            self.entries.append((self._level, line))
+        return len(lines)
+
+    def poll(self):
+        """Read what was appended since the last call; returns the number of new lines."""
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return 0
+        inode = stat.st_ino or None
+        new_lines = 0
+        if self._offset is None:
+            # 第一次只讀檔尾一段，長時間執行的大檔不必整份讀入
+            self._offset = max(0, stat.st_size - self.initial_bytes)
+            if self._offset:
+                with open(self.path, "rb") as f:
+                    f.seek(self._offset)
+                    f.readline()  # 從下一個完整行開始
+                    self._offset = f.tell()
+        elif (inode is not None and inode != self._inode) or stat.st_size < self._offset:
+            rotated = f"{self.path}.1"
+            try:
+                if inode is not None and os.stat(rotated).st_ino == self._inode:
+                    data, _ = self._read_from(rotated, self._offset)
+                    new_lines += self._ingest(data)
+            except FileNotFoundError:
+                pass
+            if self._partial:
+                self._ingest(b"\n")
+                new_lines += 1
+            self._offset = 0
+        self._inode = inode
+        if stat.st_size > self._offset:
+            data, self._offset = self._read_from(self.path, self._offset)
+            new_lines += self._ingest(data)
+        return new_lines
+
+    def lines(self, min_level=logging.NOTSET, keyword=None, limit=None):
+        """Buffered lines at or above ``min_level`` containing ``keyword`` (case-insensitive)."""
+        keyword = keyword.lower() if keyword else None
+        selected = [line for level, line in self.entries
+                    if level >= min_level and (keyword is None or keyword in line.lower())]
+        return selected[-limit:] if limit else selected
@@ -0,0 +1,199 @@
+import os
+import json
+import time
+import bisect
+import inspect
+import logging
+import functools
+import threading
+import contextvars
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+# 直方圖桶界 (ms)：0.01ms 起每格 ×1.2 至約 5 分鐘，百分位誤差在 20% 以內
+BUCKET_BOUNDS = [0.01 * 1.2 ** i for i in range(95)]
+
+
+class LatencyHistogram:
+    """Fixed log-spaced latency buckets with error counts by type; O(log n) observe."""
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKET_BOUNDS) + 1)
+        self.count = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+        self.errors = {}
+        self._lock = threading.Lock()
+
+    def observe(self, ms, error=None):
+        index = bisect.bisect_left(BUCKET_BOUNDS, ms)
+        with self._lock:
+            self.counts[index] += 1
+            self.count += 1
+            self.total_ms += ms
+            self.max_ms = max(self.max_ms, ms)
+            if error is not None:
+                self.errors[error] = self.errors.get(error, 0) + 1
+
+    def percentile(self, q):
+        # 在所屬桶內依排名線性內插
+        target = q * self.count
+        cumulative = 0
+        for index, count in enumerate(self.counts):
+            if count and cumulative + count >= target:
+                lower = BUCKET_BOUNDS[index - 1] if index > 0 else 0.0
+                upper = BUCKET_BOUNDS[index] if index < len(BUCKET_BOUNDS) else self.max_ms
+                return min(lower + (upper - lower) * (target - cumulative) / count, self.max_ms)
+            cumulative += count
+        return 0.0
+
+    def summary(self):
+        with self._lock:
+            return {
+                "count": self.count,
+                "errors": dict(self.errors),
+                "mean_ms": self.total_ms / self.count if self.count else 0.0,
+                "p50_ms": self.percentile(0.50),
+                "p95_ms": self.percentile(0.95),
+                "p99_ms": self.percentile(0.99),
+                "max_ms": self.max_ms,
+            }
+
+
+class MetricsRegistry:
+    """Named latency histograms, e.g. ``bitmart.get_position``, ``topone.http./fapi/v1/close``,
+    ``stage.kline_fetch``. ``groups`` also feed an aggregate such as the per-exchange ``bitmart``."""
+
+    def __init__(self):
+        self.started_at = time.time()
+        self._histograms = {}
+        self._lock = threading.Lock()
+
+    def histogram(self, name):
+        histogram = self._histograms.get(name)
+        if histogram is None:
+            with self._lock:
+                histogram = self._histograms.setdefault(name, LatencyHistogram())
+        return histogram
+
+    def observe(self, name, ms, error=None, groups=()):
+        self.histogram(name).observe(ms, error)
+        for group in groups:
+            self.histogram(group).observe(ms, error)
+
+    @contextmanager
+    def timer(self, name, groups=()):
+        start = time.perf_counter()
+        error = None
+        try:
+            yield
+        except Exception as e:
+            error = type(e).__name__
+            raise
+        finally:
+            self.observe(name, (time.perf_counter() - start) * 1000, error, groups)
+
+    def snapshot(self):
+        with self._lock:
+            names = sorted(self._histograms)
+        return {"generated_at": time.time(), "started_at": self.started_at,
+                "histograms": {name: self._histograms[name].summary() for name in names}}
+
+
+# 同一行程內共用
+metrics = MetricsRegistry()
+
+# 目前策略實例的各階段耗時；contextvar 讓執行緒與 asyncio task 各自獨立
+_stage_collector = contextvars.ContextVar("stage_collector", default=None)
+
+
+@contextmanager
+def collect_stages():
+    """Collect the ``stage`` timings of the code run inside the block into the yielded dict."""
+    stages = {}
+    token = _stage_collector.set(stages)
+    try:
+        yield stages
+    finally:
+        _stage_collector.reset(token)
+
+
+@contextmanager
+def stage(name):
+    """Time one strategy stage into ``stage.<name>`` and the current collect_stages dict."""
+    start = time.perf_counter()
+    try:
+        with metrics.timer(f"stage.{name}"):
+            yield
+    finally:
+        stages = _stage_collector.get()
+        if stages is not None:
+            stages[name] = stages.get(name, 0.0) + (time.perf_counter() - start) * 1000
+
+
+def _timed_method(method, name):
+    if inspect.iscoroutinefunction(method):
+        @functools.wraps(method)
+        async def timed_async(*args, **kwargs):
+            with metrics.timer(name):
+                return await method(*args, **kwargs)
+        return timed_async
+
+    @functools.wraps(method)
+    def timed(*args, **kwargs):
+        with metrics.timer(name):
+            return method(*args, **kwargs)
+    return timed
+
+
+def instrument_client(client, exchange):
+    """Time every public method of an exchange client into ``<exchange>.<method>``.
+
+    The per-exchange ``<exchange>`` aggregate is fed by the wire-level calls
+    (GovernedAPI / HttpTransport), so local helpers do not dilute it.
+    Idempotent; returns the client.
+    """
+    if vars(client).get("_instrumented"):
+        return client
+    for name, _ in inspect.getmembers(type(client), inspect.isfunction):
+        if not name.startswith("_"):
+            setattr(client, name, _timed_method(getattr(client, name), f"{exchange}.{name}"))
+    client._instrumented = True
+    return client
+
+
+class MetricsExporter:
+    """Writes ``metrics.snapshot()`` as JSON to ``path`` every ``interval`` seconds
+    (write-then-rename, so readers never see a partial file)."""
+
+    def __init__(self, path, interval=10.0, registry=None):
+        self.path = path
+        self.interval = interval
+        self.registry = registry or metrics
+        self._stop = threading.Event()
+        self._thread = None
+
+    def export(self):
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self.registry.snapshot(), f, ensure_ascii=False)
+        os.replace(tmp_path, self.path)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.export()
+            except Exception as e:
+                logger.error(f"匯出延遲統計失敗: {e}")
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="metrics-exporter", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        self.export()
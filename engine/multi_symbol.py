@@ -0,0 +1,143 @@
+import time
+import logging
+import importlib
+from dataclasses import dataclass, field
+from concurrent.futures import ThreadPoolExecutor
+
+from engine.account_snapshot import AccountSnapshot
+from engine.metrics import collect_stages, stage
+
+logger = logging.getLogger(__name__)
+
+
+def load_strategy(strategy_name):
+    """``strategies.<name>.run_<name>``, the same lookup backend_service uses."""
+    module = importlib.import_module(f"strategies.{strategy_name}")
+    return getattr(module, f"run_{strategy_name}")
+
+
+def has_margin_for(required_margin, balances):
+    if required_margin is None:
+        return True
+    return all(balance is not None and balance >= required_margin for balance in balances.values())
+
+
+def build_instances(strategy_config):
+    """StrategyInstances from a backend config dict.
+
+    Uses ``instances`` ({"symbol", "strategy_name"?, "kwargs"?} each, inheriting
+    the top-level strategy_name and kwargs) or, without it, the single
+    top-level ``kwargs["symbol"]``.
+    """
+    strategy_name = strategy_config.get("strategy_name")
+    kwargs = dict(strategy_config.get("kwargs", {}))
+    entries = strategy_config.get("instances") or [{"symbol": kwargs.get("symbol")}]
+    return [StrategyInstance(entry["symbol"], entry.get("strategy_name", strategy_name),
+                             {**kwargs, **entry.get("kwargs", {})})
+            for entry in entries]
+
+
+@dataclass
+class StrategyInstance:
+    """One symbol/strategy pair hosted by MultiSymbolRunner, with its own parameters."""
+    symbol: str
+    strategy_name: str
+    kwargs: dict = field(default_factory=dict)
+    rounds: int = 0
+    failures: int = 0              # 連續失敗次數
+    skip_rounds: int = 0           # 失敗後暫停的回合數（指數退避）
+    last_status: str = None
+    last_error: str = None
+    last_duration_ms: float = None
+    last_stage_ms: dict = field(default_factory=dict)   # 策略內各階段耗時 (engine.metrics.stage)
+
+    @property
+    def key(self):
+        return f"{self.strategy_name}:{self.symbol}"
+
+
+class MultiSymbolRunner:
+    """Host many symbol/strategy instances in one process.
+
+    All instances share the two exchange clients, so they share the HTTP
+    connection pools, the kline cache, bar aggregators, indicator engines and
+    the market feed attached to them. Each round does a single account fetch
+    (AccountSnapshot.refresh_many) and then runs the instances on a thread
+    pool, so one instance's REST round trips overlap with another's. An
+    instance that raises is isolated: the error is recorded and the instance
+    sits out 1, 2, 4, ... rounds (up to ``max_backoff_rounds``) while the
+    others carry on.
+    """
+
+    def __init__(self, bitmart_client, topone_client, instances, max_workers=16, max_backoff_rounds=16):
+        self.bitmart_client = bitmart_client
+        self.topone_client = topone_client
+        self.instances = list(instances)
+        self.max_backoff_rounds = max_backoff_rounds
+        self._strategies = {}
+        for instance in self.instances:
+            if instance.strategy_name not in self._strategies:
+                self._strategies[instance.strategy_name] = load_strategy(instance.strategy_name)
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="symbol")
+        self.round_count = 0
+        self.last_snapshots = {}
+
+    @property
+    def symbols(self):
+        return sorted({instance.symbol for instance in self.instances})
+
+    def _run_instance(self, instance, snapshot, bar_close_at=None):
+        start = time.perf_counter()
+        with collect_stages() as stages:
+            result = self._call_strategy(instance, snapshot, bar_close_at)
+        instance.rounds += 1
+        instance.last_duration_ms = (time.perf_counter() - start) * 1000
+        instance.last_stage_ms = stages
+        return result
+
+    def _call_strategy(self, instance, snapshot, bar_close_at=None):
+        try:
+            if not has_margin_for(instance.kwargs.get('margin'), snapshot.balances):
+                result = {"status": "insufficient_margin", "message": "保證金不足，本回合略過"}
+            else:
+                run = self._strategies[instance.strategy_name]
+                result = run(self.bitmart_client, self.topone_client,
+                             **{**instance.kwargs, "symbol": instance.symbol, "account_snapshot": snapshot,
+                                "bar_close_at": bar_close_at})
+            instance.failures, instance.last_error = 0, None
+            instance.last_status = result.get("status")
+        except Exception as e:
+            instance.failures += 1
+            instance.skip_rounds = min(2 ** (instance.failures - 1), self.max_backoff_rounds)
+            instance.last_status, instance.last_error = "error", repr(e)
+            logger.error(f"[{instance.key}] 執行失敗 (連續 {instance.failures} 次)，暫停 {instance.skip_rounds} 回合: {e}",
+                         exc_info=True)
+            result = {"status": "error", "message": repr(e)}
+        return result
+
+    def run_round(self, bar_close_at=None):
+        """Run every active instance once; returns {instance key: result}. ``bar_close_at``
+        (engine.scheduler.Tick.bar_close_at) is passed on to the strategies."""
+        self.round_count += 1
+        with stage("account_snapshot"):
+            snapshots = AccountSnapshot.refresh_many(self.bitmart_client, self.topone_client, self.symbols)
+        if snapshots is None:
+            return {}
+        self.last_snapshots = snapshots
+        futures = {}
+        for instance in self.instances:
+            if instance.skip_rounds > 0:
+                instance.skip_rounds -= 1
+                continue
+            futures[instance.key] = self._pool.submit(self._run_instance, instance, snapshots[instance.symbol],
+                                                      bar_close_at)
+        return {key: future.result() for key, future in futures.items()}
+
+    def status(self):
+        return [{"key": i.key, "rounds": i.rounds, "status": i.last_status, "failures": i.failures,
+                 "skip_rounds": i.skip_rounds, "error": i.last_error, "duration_ms": i.last_duration_ms,
+                 "stage_ms": i.last_stage_ms}
+                for i in self.instances]
+
+    def close(self):
+        self._pool.shutdown(wait=True)
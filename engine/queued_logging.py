@@ -0,0 +1,55 @@
+import time
+import queue
+import atexit
+import logging
+import threading
+import logging.handlers
+
+# 呼叫端（交易執行緒）花在 logging 內的累計時間，由 TimedQueueHandler 統計
+_stats = {"records": 0, "seconds": 0.0}
+_stats_lock = threading.Lock()
+
+
+class TimedQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler that accounts for the time callers spend inside logging.
+
+    ``emit`` only merges the message (and traceback) into the record and puts
+    it on the queue; file I/O happens on the QueueListener thread.
+    """
+
+    def emit(self, record):
+        start = time.perf_counter()
+        super().emit(record)
+        elapsed = time.perf_counter() - start
+        with _stats_lock:
+            _stats["records"] += 1
+            _stats["seconds"] += elapsed
+
+
+def install_queue_logging(*handlers, level=logging.INFO):
+    """Route the root logger through a queue to ``handlers`` on a background thread.
+
+    Replaces the root handlers; returns the started QueueListener, which is
+    flushed and stopped at interpreter exit.
+    """
+    log_queue = queue.SimpleQueue()
+    root = logging.getLogger()
+    for handler in root.handlers[:]:
+        root.removeHandler(handler)
+    root.addHandler(TimedQueueHandler(log_queue))
+    root.setLevel(level)
+    listener = logging.handlers.QueueListener(log_queue, *handlers, respect_handler_level=True)
+    listener.start()
+    atexit.register(listener.stop)
+    return listener
+
+
+def logging_time():
+    """(records, ms) spent in logging calls since start; diff two readings for a round."""
+    with _stats_lock:
+        return _stats["records"], _stats["seconds"] * 1000
+
+
+def logging_time_since(mark):
+    records, ms = logging_time()
+    return records - mark[0], ms - mark[1]
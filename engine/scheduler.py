@@ -0,0 +1,131 @@
+import time
+import asyncio
+import logging
+from collections import deque
+from dataclasses import dataclass
+
+logger = logging.getLogger(__name__)
+
+BAR_CLOSE = "bar_close"
+INTRA_BAR = "intra_bar"
+INTERVAL = "interval"  # 未設定K線週期時的固定間隔輪詢，格點不是K線收盤
+
+
+@dataclass
+class Tick:
+    kind: str            # BAR_CLOSE、INTRA_BAR 或 INTERVAL
+    boundary: float      # 對應的時間格點 (epoch 秒)；BAR_CLOSE 時為K線收盤時間
+    scheduled_at: float  # 預定喚醒時間 = boundary + settle
+    woke_at: float
+    missed: int = 0      # 上一回合執行過久而跳過的格點數
+
+    @property
+    def bar_close_at(self):
+        """The bar boundary of a BAR_CLOSE tick, else None. Strategies pass it to
+        evaluate the bar that just closed rather than the one that just opened."""
+        return self.boundary if self.kind == BAR_CLOSE else None
+
+    @property
+    def lateness_ms(self):
+        """How late the wake-up was relative to the bar boundary itself."""
+        return (self.woke_at - self.boundary) * 1000
+
+
+class BarScheduler:
+    """Wake right after each bar close, on absolute UTC-epoch boundaries.
+
+    Targets are computed from the clock every time instead of sleeping a fixed
+    interval after the round, so round duration never accumulates as drift.
+    ``settle_seconds`` gives the exchange a moment to publish the closed bar.
+    ``intra_bar_seconds`` adds checks at that cadence between bar closes.
+    A round that overruns one or more boundaries skips them (counted in
+    ``Tick.missed``) rather than firing a burst of late evaluations.
+    ``bar_kind`` labels the main boundaries; a plain polling cadence uses
+    INTERVAL so its ticks carry no ``bar_close_at``.
+    """
+
+    def __init__(self, bar_seconds, settle_seconds=1.0, intra_bar_seconds=None, history=500,
+                 clock=time.time, sleep=time.sleep, bar_kind=BAR_CLOSE):
+        if intra_bar_seconds is not None and intra_bar_seconds <= 0:
+            raise ValueError("intra_bar_seconds must be positive")
+        self.bar_seconds = bar_seconds
+        self.settle_seconds = settle_seconds
+        self.intra_bar_seconds = intra_bar_seconds
+        self.clock = clock
+        self.sleep = sleep
+        self.bar_kind = bar_kind
+        self.lateness_ms = {bar_kind: deque(maxlen=history), INTRA_BAR: deque(maxlen=history)}
+        self.round_ms = deque(maxlen=history)
+        self._last_boundary = None
+
+    def _next_boundary(self, after):
+        """The first (boundary, kind) whose wake-up time is later than ``after``."""
+        base = after - self.settle_seconds
+        bar = (base // self.bar_seconds + 1) * self.bar_seconds
+        if self.intra_bar_seconds is None:
+            return bar, self.bar_kind
+        intra = (base // self.intra_bar_seconds + 1) * self.intra_bar_seconds
+        if intra < bar:
+            return intra, INTRA_BAR
+        return bar, self.bar_kind
+
+    def peek(self):
+        boundary, kind = self._next_boundary(self.clock())
+        return boundary + self.settle_seconds, kind
+
+    def _tick(self, boundary, kind):
+        woke_at = self.clock()
+        step = self.intra_bar_seconds or self.bar_seconds
+        missed = 0
+        if self._last_boundary is not None:
+            missed = max(0, int(round((boundary - self._last_boundary) / step)) - 1)
+        self._last_boundary = boundary
+        tick = Tick(kind, boundary, boundary + self.settle_seconds, woke_at, missed)
+        self.lateness_ms[kind].append(tick.lateness_ms)
+        if missed:
+            logger.warning(f"上一回合執行過久，跳過 {missed} 個排程點")
+        return tick
+
+    def wait_next(self, cancel=None):
+        """Block until the next boundary. With a ``cancel`` threading.Event the wait
+        ends early and returns None once the event is set."""
+        boundary, kind = self._next_boundary(self.clock())
+        target = boundary + self.settle_seconds
+        # 以絕對時間為目標分段睡眠，被提早喚醒也會補足
+        while (remaining := target - self.clock()) > 0:
+            if cancel is None:
+                self.sleep(remaining)
+            elif cancel.wait(remaining):
+                return None
+        return self._tick(boundary, kind)
+
+    async def wait_next_async(self):
+        boundary, kind = self._next_boundary(self.clock())
+        target = boundary + self.settle_seconds
+        while (remaining := target - self.clock()) > 0:
+            await asyncio.sleep(remaining)
+        return self._tick(boundary, kind)
+
+    def record_round(self, tick):
+        """Record how long the evaluation started at ``tick`` took; returns milliseconds."""
+        elapsed_ms = (self.clock() - tick.woke_at) * 1000
+        self.round_ms.append(elapsed_ms)
+        return elapsed_ms
+
+    def stats(self):
+        def summary(values):
+            if not values:
+                return None
+            ordered = sorted(values)
+            return {"count": len(ordered), "p50": ordered[len(ordered) // 2],
+                    "p95": ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))], "max": ordered[-1]}
+        return {"lateness_ms": {kind: summary(values) for kind, values in self.lateness_ms.items()},
+                "round_ms": summary(self.round_ms)}
+
+
+def make_scheduler(interval_seconds, bar_minutes=None, intra_bar_seconds=None, settle_seconds=1.0):
+    """Bar-close schedule when ``bar_minutes`` is set, otherwise a drift-free fixed
+    cadence of ``interval_seconds`` aligned to epoch multiples."""
+    if bar_minutes:
+        return BarScheduler(bar_minutes * 60, settle_seconds, intra_bar_seconds)
+    return BarScheduler(interval_seconds, settle_seconds=0.0, bar_kind=INTERVAL)
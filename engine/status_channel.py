@@ -0,0 +1,117 @@
+import os
+import json
+import mmap
+import time
+import struct
+import logging
+import tempfile
+
+logger = logging.getLogger(__name__)
+
+# 記錄格式: 標頭 (magic, 序號, 內容長度) + UTF-8 JSON。
+# 序號為 seqlock：寫入中為奇數，寫完為偶數；讀取端前後序號一致才採用
+MAGIC = b"STS1"
+HEADER = struct.Struct("<4sQI")
+SEQ_OFFSET = 4
+DEFAULT_SIZE = 1 << 20
+
+
+def default_status_path():
+    # Linux 上放 /dev/shm（純記憶體），其他平台放暫存目錄，由作業系統頁快取共享
+    directory = "/dev/shm" if os.path.isdir("/dev/shm") else tempfile.gettempdir()
+    return os.path.join(directory, "strategy_status.bin")
+
+
+class StatusPublisher:
+    """Single writer of a fixed-size memory-mapped status record.
+
+    ``publish(record)`` overwrites the record in place; no file is appended to
+    and readers never block the writer. A record larger than the mapping is
+    replaced by a short error record.
+    """
+
+    def __init__(self, path=None, size=DEFAULT_SIZE):
+        self.path = path or default_status_path()
+        self.size = size
+        with open(self.path, "a+b") as f:
+            f.truncate(size)
+        self._file = open(self.path, "r+b")
+        self._map = mmap.mmap(self._file.fileno(), size)
+        # 以時間起算序號，重啟後讀取端不會誤用舊快取
+        self.seq = time.time_ns() // 2 * 2
+        self._write_header(0)
+        self.publish_ms = None
+
+    def _write_header(self, length):
+        self._map[:HEADER.size] = HEADER.pack(MAGIC, self.seq, length)
+
+    def _set_seq(self, seq):
+        self.seq = seq
+        self._map[SEQ_OFFSET:SEQ_OFFSET + 8] = struct.pack("<Q", seq)
+
+    def publish(self, record):
+        start = time.perf_counter()
+        payload = json.dumps(record, default=str, ensure_ascii=False).encode("utf-8")
+        if HEADER.size + len(payload) > self.size:
+            logger.warning(f"狀態記錄 {len(payload)} bytes 超過通道大小 {self.size}，改發布摘要")
+            payload = json.dumps({"state": record.get("state"), "round": record.get("round"),
+                                  "published_at": record.get("published_at"),
+                                  "error": f"status record too large ({len(payload)} bytes)"}).encode("utf-8")
+        self._set_seq(self.seq + 1)
+        self._map[HEADER.size:HEADER.size + len(payload)] = payload
+        self._map[SEQ_OFFSET + 8:HEADER.size] = struct.pack("<I", len(payload))
+        self._set_seq(self.seq + 1)
+        self.publish_ms = (time.perf_counter() - start) * 1000
+
+    def close(self):
+        self._map.close()
+        self._file.close()
+
+
+class StatusReader:
+    """Reader side of StatusPublisher, for the dashboard.
+
+    ``read()`` checks the 8-byte sequence number first and returns the cached
+    record when nothing was published since the last call, so polling costs
+    well under a microsecond; a new record is copied and decoded once.
+    Returns None until a publisher has created the file and published.
+    """
+
+    def __init__(self, path=None, retries=100):
+        self.path = path or default_status_path()
+        self.retries = retries
+        self._map = None
+        self._seq = None
+        self.record = None
+
+    def _open(self):
+        if self._map is None:
+            try:
+                with open(self.path, "rb") as f:
+                    self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            except (OSError, ValueError):
+                return False
+        return True
+
+    def read(self):
+        if not self._open():
+            return None
+        for _ in range(self.retries):
+            magic, seq, length = HEADER.unpack_from(self._map, 0)
+            if magic != MAGIC or length == 0:
+                return None
+            if seq == self._seq:
+                return self.record
+            if seq % 2:
+                continue
+            payload = self._map[HEADER.size:HEADER.size + length]
+            if struct.unpack_from("<Q", self._map, SEQ_OFFSET)[0] != seq:
+                continue
+            self._seq, self.record = seq, json.loads(payload)
+            return self.record
+        return self.record
+
+    def close(self):
+        if self._map is not None:
+            self._map.close()
+            self._map = None
@@ -0,0 +1,249 @@
+import os
+import time
+import logging
+import threading
+
+from engine.scheduler import make_scheduler
+from engine.multi_symbol import MultiSymbolRunner, build_instances
+from engine.queued_logging import logging_time, logging_time_since
+
+logger = logging.getLogger(__name__)
+
+IDLE, STARTING, RUNNING, PAUSED, STOPPING = "idle", "starting", "running", "paused", "stopping"
+
+
+class StrategyWorker:
+    """Runs a strategy config (the backend_service JSON) on a thread of a long-lived process.
+
+    ``client_factory()`` is called once and its (bitmart, topone) clients are
+    reused by every run, so a start costs no interpreter start, imports or new
+    connection pools. ``prepare(bitmart, topone, symbols)`` runs on each start
+    (market feed, contract specs); ``on_round(worker, results)`` after each round.
+    With a ``publisher`` (engine.status_channel.StatusPublisher) the
+    ``status_record`` is published after every round and every state change.
+
+    ``stop`` never interrupts a round: it cancels the wait for the next tick
+    and, when a round is in flight, returns once that round has finished.
+    ``pause`` skips rounds while keeping the schedule; ``update_params`` is
+    applied at the start of the next round.
+    """
+
+    def __init__(self, client_factory, prepare=None, on_round=None, publisher=None):
+        self.client_factory = client_factory
+        self.prepare = prepare
+        self.on_round = on_round
+        self.publisher = publisher
+        self.state = IDLE
+        self.strategy_config = None
+        self.runner = None
+        self.scheduler = None
+        self.started_at = None
+        self.last_round_at = None
+        self.last_round_ms = None
+        self.last_logging = (0, 0.0)
+        self.last_results = {}
+        self.last_error = None
+        self._clients = None
+        self._thread = None
+        self._stop = threading.Event()
+        self._resume = threading.Event()
+        self._pending_params = {}
+        self._lock = threading.Lock()
+        self._publish_lock = threading.Lock()
+        self._tick = None
+
+    @property
+    def clients(self):
+        if self._clients is None:
+            self._clients = self.client_factory()
+        return self._clients
+
+    def start(self, strategy_config):
+        """Start a run; returns immediately, the first round runs on the worker thread."""
+        with self._lock:
+            if self.state != IDLE:
+                raise RuntimeError(f"策略已在執行中 (狀態: {self.state})")
+            instances = build_instances(strategy_config)
+            if any(not i.symbol or not i.strategy_name for i in instances):
+                raise ValueError("策略設定缺少 strategy_name 或 symbol")
+            # 先佔住啟動狀態；prepare 會連網，在鎖外執行，期間 status/stop 不被阻塞
+            self.state = STARTING
+            self._stop.clear()
+            self._pending_params = {}
+        try:
+            bitmart_client, topone_client = self.clients
+            symbols = sorted({i.symbol for i in instances})
+            if self.prepare:
+                self.prepare(bitmart_client, topone_client, symbols)
+            runner = MultiSymbolRunner(bitmart_client, topone_client, instances,
+                                       max_workers=strategy_config.get("max_workers", 16))
+            scheduler = make_scheduler(strategy_config["interval_seconds"], **(strategy_config.get("schedule") or {}))
+        except BaseException:
+            with self._lock:
+                self.state = IDLE
+            raise
+        with self._lock:
+            cancelled = self._stop.is_set()
+            if cancelled:
+                # 準備期間收到 stop，不啟動
+                self.state = IDLE
+            else:
+                self.runner, self.scheduler = runner, scheduler
+                self.strategy_config = strategy_config
+                self.started_at, self.last_round_at, self.last_round_ms = time.time(), None, None
+                self.last_results, self.last_error, self._tick = {}, None, None
+                self._resume.set()
+                self.state = RUNNING
+                self._thread = threading.Thread(target=self._loop, args=(strategy_config.get("max_rounds", -1),),
+                                                name="strategy-worker", daemon=True)
+                self._thread.start()
+        if cancelled:
+            runner.close()
+            logger.info(f"策略 {strategy_config.get('strategy_name')} 在啟動準備期間被停止")
+            return
+        self.publish()
+        logger.info(f"策略 {strategy_config.get('strategy_name')} 已啟動: {len(instances)} 個實例, 交易對 {symbols}")
+
+    def stop(self, wait=True, timeout=None):
+        """Stop after the round in flight, if any. Returns True once the worker is idle."""
+        with self._lock:
+            thread = self._thread
+            if self.state == STARTING:
+                # start 仍在準備中：完成準備後看到 _stop 就不會啟動任何回合
+                self._stop.set()
+                return True
+            if thread is None:
+                return True
+            if self.state != IDLE:
+                self.state = STOPPING
+            self._stop.set()
+            self._resume.set()
+        self.publish()
+        if wait:
+            thread.join(timeout)
+        return not thread.is_alive()
+
+    def pause(self):
+        with self._lock:
+            if self.state == RUNNING:
+                self._resume.clear()
+                self.state = PAUSED
+        self.publish()
+
+    def resume(self):
+        with self._lock:
+            if self.state == PAUSED:
+                self._resume.set()
+                self.state = RUNNING
+        self.publish()
+
+    def update_params(self, kwargs):
+        """Merge ``kwargs`` into every instance's parameters from the next round on."""
+        if "symbol" in kwargs:
+            raise ValueError("更換交易對需停止後重新啟動")
+        with self._lock:
+            if self.state == IDLE:
+                raise RuntimeError("策略未在執行")
+            self._pending_params.update(kwargs)
+
+    def _apply_pending_params(self):
+        with self._lock:
+            params, self._pending_params = self._pending_params, {}
+        if params:
+            for instance in self.runner.instances:
+                instance.kwargs = {**instance.kwargs, **params}
+            logger.info(f"策略參數已更新: {params}")
+
+    def _loop(self, max_rounds):
+        tick = None  # 第一回合啟動後立即執行
+        try:
+            while not self._stop.is_set():
+                if self._resume.is_set():
+                    self._apply_pending_params()
+                    start, log_mark = time.perf_counter(), logging_time()
+                    logger.info(f"--- 第 {self.runner.round_count + 1} 回合 ---")
+                    results = self.runner.run_round(bar_close_at=tick.bar_close_at if tick else None)
+                    self.last_round_ms = (time.perf_counter() - start) * 1000
+                    self.last_round_at, self.last_results = time.time(), results
+                    for key, result in results.items():
+                        logger.info(f"[{key}] {result.get('status')}: {result.get('message')}")
+                    self.last_logging = logging_time_since(log_mark)
+                    if tick is not None:
+                        self.scheduler.record_round(tick)
+                    self._tick = tick
+                    if self.on_round:
+                        self.on_round(self, results)
+                    self.publish()
+                    if max_rounds != -1 and self.runner.round_count >= max_rounds:
+                        logger.info(f"已達到最大回合數 ({max_rounds})。停止策略。")
+                        break
+                else:
+                    logger.info("策略已暫停，略過本回合")
+                tick = self.scheduler.wait_next(cancel=self._stop)
+        except Exception as e:
+            self.last_error = repr(e)
+            logger.error(f"策略執行緒異常結束: {e}", exc_info=True)
+        finally:
+            self.runner.close()
+            with self._lock:
+                self.state, self._thread = IDLE, None
+            self.publish()
+            logger.info("策略已停止。")
+
+    def status(self):
+        with self._lock:
+            state, runner, scheduler, config = self.state, self.runner, self.scheduler, self.strategy_config
+        status = {"state": state, "config": config, "started_at": self.started_at,
+                  "last_round_at": self.last_round_at, "last_round_ms": self.last_round_ms,
+                  "last_results": self.last_results, "error": self.last_error,
+                  "round_count": 0, "next_wake_at": None, "instances": []}
+        if runner is not None:
+            status.update(round_count=runner.round_count, instances=runner.status())
+        if state in (RUNNING, PAUSED):
+            status["next_wake_at"] = scheduler.peek()[0]
+        return status
+
+    def status_record(self):
+        """Structured per-round status for the status channel: round, stage timings,
+        last decision per instance, positions, balances and errors."""
+        runner = self.runner
+        snapshots = runner.last_snapshots if runner is not None else {}
+        any_snapshot = next(iter(snapshots.values()), None)
+        instances = runner.status() if runner is not None else []
+        record = {
+            "state": self.state,
+            "pid": os.getpid(),
+            "published_at": time.time(),
+            "strategy_name": (self.strategy_config or {}).get("strategy_name"),
+            "max_rounds": (self.strategy_config or {}).get("max_rounds"),
+            "started_at": self.started_at,
+            "round": runner.round_count if runner is not None else 0,
+            "round_at": self.last_round_at,
+            "next_wake_at": self.scheduler.peek()[0] if self.state in (RUNNING, PAUSED) else None,
+            "stage_ms": {
+                "round": self.last_round_ms,
+                "tick_lateness": self._tick.lateness_ms if self._tick is not None else None,
+                "account_fetch": any_snapshot.latency_ms if any_snapshot is not None else {},
+                "strategies": {i["key"]: i["duration_ms"] for i in instances},
+                "breakdown": {i["key"]: i["stage_ms"] for i in instances},
+                "logging": self.last_logging[1],
+            },
+            "log_records": self.last_logging[0],
+            "decisions": self.last_results,
+            "positions": {symbol: snapshot.positions for symbol, snapshot in snapshots.items()},
+            "balances": any_snapshot.balances if any_snapshot is not None else {},
+            "errors": {i["key"]: i["error"] for i in instances if i["error"]},
+            "worker_error": self.last_error,
+        }
+        if self.publisher is not None and self.publisher.publish_ms is not None:
+            record["stage_ms"]["publish"] = self.publisher.publish_ms
+        return record
+
+    def publish(self):
+        if self.publisher is None:
+            return
+        with self._publish_lock:
+            try:
+                self.publisher.publish(self.status_record())
+            except Exception as e:
+                logger.error(f"發布狀態記錄失敗: {e}")
@@ -0,0 +1,121 @@
+import json
+import logging
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+
+from engine.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_HOST = "127.0.0.1"
+
+
+class _ControlHandler(BaseHTTPRequestHandler):
+    # worker 由 serve_worker 掛在 server 上
+    routes = {
+        "/start": lambda worker, body: worker.start(body),
+        "/stop": lambda worker, body: {"stopped": worker.stop(wait=body.get("wait", True), timeout=body.get("timeout"))},
+        "/pause": lambda worker, body: worker.pause(),
+        "/resume": lambda worker, body: worker.resume(),
+        "/params": lambda worker, body: worker.update_params(body),
+    }
+
+    def _reply(self, code, payload):
+        data = json.dumps(payload, default=str).encode("utf-8")
+        self.send_response(code)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        if self.path == "/status":
+            self._reply(200, self.server.worker.status())
+        elif self.path == "/metrics":
+            self._reply(200, metrics.snapshot())
+        else:
+            self._reply(404, {"error": f"unknown path {self.path}"})
+
+    def do_POST(self):
+        route = self.routes.get(self.path)
+        if route is None:
+            self._reply(404, {"error": f"unknown path {self.path}"})
+            return
+        try:
+            length = int(self.headers.get("Content-Length") or 0)
+            body = json.loads(self.rfile.read(length) or b"{}")
+            result = route(self.server.worker, body)
+        except (ValueError, KeyError) as e:
+            self._reply(400, {"error": str(e)})
+        except RuntimeError as e:
+            self._reply(409, {"error": str(e)})
+        except Exception as e:
+            logger.error(f"控制指令 {self.path} 失敗: {e}", exc_info=True)
+            self._reply(500, {"error": repr(e)})
+        else:
+            self._reply(200, {"ok": True, **(result or {}), "status": self.server.worker.status()})
+
+    def log_message(self, format, *args):
+        logger.debug("control api: " + format % args)
+
+
+def serve_worker(worker, host=DEFAULT_HOST, port=8765):
+    """Serve the control API for ``worker`` on a daemon thread; returns the server.
+
+    POST /start (strategy config JSON), /stop ({"wait", "timeout"}), /pause,
+    /resume, /params (kwargs to merge); GET /status, /metrics. Bound to localhost only.
+    """
+    server = ThreadingHTTPServer((host, port), _ControlHandler)
+    server.daemon_threads = True
+    server.worker = worker
+    threading.Thread(target=server.serve_forever, name="worker-control", daemon=True).start()
+    logger.info(f"策略控制 API 已啟動: http://{host}:{server.server_address[1]}")
+    return server
+
+
+class WorkerControlClient:
+    """Thin client for the control API; kept free of strategy imports so app.py stays light."""
+
+    def __init__(self, base_url, timeout=5.0):
+        self.base_url = base_url.rstrip("/")
+        self.timeout = timeout
+        self.session = requests.Session()
+
+    def _call(self, method, path, body=None, timeout=None):
+        response = self.session.request(method, self.base_url + path, json=body, timeout=timeout or self.timeout)
+        payload = response.json()
+        if response.status_code != 200:
+            raise RuntimeError(payload.get("error", response.text))
+        return payload
+
+    def is_alive(self):
+        try:
+            self.status()
+            return True
+        except (requests.RequestException, ValueError):
+            return False
+
+    def status(self):
+        return self._call("GET", "/status")
+
+    def metrics(self):
+        return self._call("GET", "/metrics")
+
+    def start(self, strategy_config):
+        return self._call("POST", "/start", strategy_config)
+
+    def stop(self, wait=True, timeout=None):
+        # 等待進行中的回合結束，HTTP 逾時需比回合長
+        return self._call("POST", "/stop", {"wait": wait, "timeout": timeout},
+                          timeout=None if timeout is None else timeout + self.timeout)
+
+    def pause(self):
+        return self._call("POST", "/pause")
+
+    def resume(self):
+        return self._call("POST", "/resume")
+
+    def update_params(self, kwargs):
+        return self._call("POST", "/params", kwargs)
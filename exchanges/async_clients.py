@@ -0,0 +1,68 @@
+import asyncio
+import logging
+import functools
+from concurrent.futures import ThreadPoolExecutor
+
+from exchanges.bitmart_client import BitmartClient
+from exchanges.topone_client import TopOneClient
+
+# Bitmart SDK 與 TopOne 的 HTTP 呼叫都是阻塞式，放到共用執行緒池執行，
+# 讓 asyncio.gather 可以同時等待多個請求
+_io_executor = ThreadPoolExecutor(max_workers=16, thread_name_prefix="exchange-io")
+
+
+class AsyncExchangeClient:
+    """Awaitable facade over a synchronous exchange client.
+
+    Exposes the same method surface as BitmartClient / TopOneClient; the
+    wrapped client stays reachable as ``.sync`` for code that is not async yet.
+    """
+
+    exchange = None
+
+    def __init__(self, client, executor: ThreadPoolExecutor = None):
+        self.sync = client
+        self.executor = executor or _io_executor
+        self.logger = logging.getLogger(__name__)
+
+    async def _call(self, method_name, *args, **kwargs):
+        method = getattr(self.sync, method_name, None)
+        if method is None:
+            self.logger.error(f"{type(self.sync).__name__} does not support {method_name}.")
+            return None
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, functools.partial(method, *args, **kwargs))
+
+    async def get_balance(self):
+        return await self._call("get_balance")
+
+    async def get_position(self, symbol: str):
+        return await self._call("get_position", symbol)
+
+    async def get_kline_data(self, symbol: str, step: int, start_time: int, end_time: int):
+        return await self._call("get_kline_data", symbol, step, start_time, end_time)
+
+    async def get_current_price(self, symbol: str):
+        return await self._call("get_current_price", symbol)
+
+    async def place_order(self, symbol: str, side: str, margin: float, leverage: int, tp_price: float, sl_price: float):
+        return await self._call("place_order", symbol, side, margin, leverage, tp_price=tp_price, sl_price=sl_price)
+
+    async def close_position(self, symbol: str):
+        return await self._call("close_position", symbol)
+
+
+class AsyncBitmartClient(AsyncExchangeClient):
+    exchange = "bitmart"
+
+    def __init__(self, api_key: str = None, secret_key: str = None, memo: str = None,
+                 client: BitmartClient = None, executor: ThreadPoolExecutor = None):
+        super().__init__(client or BitmartClient(api_key=api_key, secret_key=secret_key, memo=memo), executor)
+
+
+class AsyncTopOneClient(AsyncExchangeClient):
+    exchange = "topone"
+
+    def __init__(self, api_key: str = None, secret_key: str = None,
+                 client: TopOneClient = None, executor: ThreadPoolExecutor = None, **client_kwargs):
+        super().__init__(client or TopOneClient(api_key=api_key, secret_key=secret_key, **client_kwargs), executor)
@@ -1,15 +1,46 @@
 import logging
 from bitmart.api_contract import APIContract
+from bitmart.lib.cloud_consts import API_V2_URL
 from bitmart.lib.cloud_exceptions import APIException
 from bitmart.lib.cloud_utils import config_logging
 
+from exchanges.symbol_registry import ContractSpec, SymbolRegistry, precision_to_decimals, symbol_registry
+from exchanges.rate_limit import GovernedAPI, RateLimitGovernor, bitmart_governor
+
 class BitmartClient:
-    def __init__(self, api_key: str, secret_key: str, memo: str):
+    def __init__(self, api_key: str, secret_key: str, memo: str, registry: SymbolRegistry = None, market_feed=None,
+                 governor: RateLimitGovernor = None, base_url: str = API_V2_URL):
         self.logger = logging.getLogger(__name__)
-        self.futuresAPI = APIContract(api_key=api_key,
-                                      secret_key=secret_key,
-                                      memo=memo,
-                                      logger=self.logger)
+        # 所有 SDK 呼叫先經過限流器 (見 exchanges.rate_limit)
+        self.governor = governor or bitmart_governor
+        self.futuresAPI = GovernedAPI(APIContract(api_key=api_key,
+                                                  secret_key=secret_key,
+                                                  memo=memo,
+                                                  url=base_url,
+                                                  logger=self.logger), self.governor)
+        self.registry = registry or symbol_registry
+        self.registry.register_loader("bitmart", self.fetch_contract_specs)
+        # 有串流行情時 get_current_price 直接讀記憶體中的報價 (見 data.market_feed)
+        self.market_feed = market_feed
+
+    def fetch_contract_specs(self, symbol: str = None):
+        # symbol 為 None 時一次取回所有合約
+        details_data = self.futuresAPI.get_details(symbol)[0]['data']
+        specs = {}
+        for details in details_data['symbols']:
+            specs[details['symbol']] = ContractSpec(
+                exchange="bitmart",
+                symbol=details['symbol'],
+                contract_size=float(details['contract_size']),
+                price_precision=precision_to_decimals(details['price_precision']),
+                qty_precision=precision_to_decimals(details.get('vol_precision', '1')),
+                min_size=float(details.get('min_volume', 0)),
+                max_leverage=int(float(details['max_leverage'])) if details.get('max_leverage') else None,
+            )
+        return specs
+
+    def get_contract_spec(self, symbol: str):
+        return self.registry.get("bitmart", symbol)
 
     def get_balance(self):
         try:
@@ -25,16 +56,28 @@ class BitmartClient:
             return None
 
     def get_current_price(self, symbol: str):
+        if self.market_feed is not None:
+            price = self.market_feed.mid_price(symbol)
+            if price is not None:
+                return price
+        top = self.get_top_of_book(symbol)
+        return (top['bid'] + top['ask']) / 2 if top else None
+
+    def get_top_of_book(self, symbol: str):
+        """Best bid/ask over REST; also the market feed's fallback when the stream is down."""
         try:
             depth_data = self.futuresAPI.get_depth(symbol)[0]['data']
             if depth_data and depth_data.get('bids') and depth_data.get('asks'):
-                best_bid = float(depth_data['bids'][0][0])
-                best_ask = float(depth_data['asks'][0][0])
-                return (best_bid + best_ask) / 2
+                return {
+                    'bid': float(depth_data['bids'][0][0]),
+                    'ask': float(depth_data['asks'][0][0]),
+                    'bid_size': float(depth_data['bids'][0][1]),
+                    'ask_size': float(depth_data['asks'][0][1]),
+                }
             else:
                 self.logger.error(f"Could not get bids/asks from depth data.")
                 return None
-        except (APIException, IndexError, KeyError) as error:
+        except (APIException, IndexError, KeyError, ValueError) as error:
             self.logger.error(f"Failed to get depth: {error}")
             return None
 
@@ -63,21 +106,13 @@ class BitmartClient:
         if not current_price:
             return None
 
-        # 2. Get contract details
-        try:
-            details_data = self.futuresAPI.get_details(symbol)[0]['data']
-            symbol_details = details_data['symbols'][0]
-            contract_size = float(symbol_details['contract_size'])
-            
-            precision_str = symbol_details['price_precision']
-            if '.' in precision_str:
-                price_precision = len(precision_str.split('.')[1])
-            else:
-                price_precision = 0
-
-        except (APIException, IndexError, KeyError, ValueError) as e:
-            self.logger.error(f"Could not get contract details: {e}")
+        # 2. Get contract details (cached in the symbol registry)
+        spec = self.get_contract_spec(symbol)
+        if spec is None:
+            self.logger.error(f"Could not get contract details for {symbol}.")
             return None
+        contract_size = spec.contract_size
+        price_precision = spec.price_precision
             
         # 3. Calculate size and round TP/SL
         size = int((margin * leverage) / (current_price * contract_size))
@@ -132,8 +167,18 @@ class BitmartClient:
             self.logger.error(f"Failed to get position: {e}")
             return None
 
-    def close_position(self, symbol: str):
-        position = self.get_position(symbol)
+    def get_all_positions(self):
+        """Every position on the account in one call ([] when flat, None on error)."""
+        try:
+            return self.futuresAPI.get_position()[0]['data']
+        except (APIException, IndexError, KeyError) as e:
+            self.logger.error(f"Failed to get positions: {e}")
+            return None
+
+    def close_position(self, symbol: str, position: dict = None):
+        # position 可由 AccountSnapshot 傳入，省去再查一次持倉
+        if position is None:
+            position = self.get_position(symbol)
         if not position:
             self.logger.info(f"No open position found for {symbol}.")
             return None
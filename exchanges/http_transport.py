@@ -0,0 +1,128 @@
+import time
+import random
+import logging
+import requests
+from requests.adapters import HTTPAdapter
+
+from engine.metrics import metrics
+
+# (connect timeout, read timeout)，單位秒
+DEFAULT_TIMEOUT = (3.05, 10)
+
+# 下單/平倉等寫入端點讀取可以稍慢，但不重試
+DEFAULT_ENDPOINT_TIMEOUTS = {
+    "/api/v1/balance": (3.05, 5),
+    "/fapi/v1/position": (3.05, 5),
+    "/fapi/v1/create-order": (3.05, 15),
+    "/fapi/v1/close": (3.05, 15),
+}
+
+RETRYABLE_STATUS = {429, 500, 502, 503, 504}
+
+
+def _retry_after(response, default=1.0):
+    try:
+        return float(response.headers.get("Retry-After", default))
+    except ValueError:
+        return default
+
+
+class HttpTransport:
+    """Pooled keep-alive HTTP session shared by every call of one exchange client.
+
+    Only idempotent GETs are retried; POSTs (create-order / close) are sent once
+    so a timed-out order is never submitted twice. Signed calls pass
+    ``sign(method, path) -> headers``, which is called again before every
+    attempt so a retry never carries a stale signed timestamp.
+    """
+
+    def __init__(self, base_url: str, endpoint_timeouts: dict = None, default_timeout=DEFAULT_TIMEOUT,
+                 max_retries: int = 2, backoff_base: float = 0.2, backoff_max: float = 2.0,
+                 retry_budget_seconds: float = 5.0, pool_maxsize: int = 10, governor=None):
+        self.base_url = base_url.rstrip("/")
+        self.endpoint_timeouts = dict(DEFAULT_ENDPOINT_TIMEOUTS)
+        if endpoint_timeouts:
+            self.endpoint_timeouts.update(endpoint_timeouts)
+        self.default_timeout = default_timeout
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.retry_budget_seconds = retry_budget_seconds
+        # exchanges.rate_limit.RateLimitGovernor；每次送出（含重試）前先取得 token
+        self.governor = governor
+        # 每次送出的延遲記為 <name>.http.<path> (見 engine.metrics)
+        self.metrics_name = governor.name if governor is not None else "http"
+        self.logger = logging.getLogger(__name__)
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_maxsize, max_retries=0)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+    def timeout_for(self, path: str):
+        return self.endpoint_timeouts.get(path, self.default_timeout)
+
+    def _backoff(self, attempt: int):
+        # Full jitter: 均勻分布在 [0, min(max, base * 2^attempt)]
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+
+    def request(self, method: str, path: str, sign=None, **kwargs):
+        method = method.upper()
+        kwargs.setdefault("timeout", self.timeout_for(path))
+        url = self.base_url + path
+        retries = self.max_retries if method == "GET" else 0
+        deadline = time.monotonic() + self.retry_budget_seconds
+
+        attempt = 0
+        while True:
+            response = None
+            if self.governor is not None:
+                self.governor.acquire(path)
+            if sign is not None:
+                # 取得 token 後才簽名，等待限流或退避的時間不會讓時間戳過期
+                kwargs["headers"] = sign(method, path)
+            start = time.perf_counter()
+            try:
+                response = self.session.request(method, url, **kwargs)
+                metrics.observe(f"{self.metrics_name}.http.{path}", (time.perf_counter() - start) * 1000,
+                                f"HTTP {response.status_code}" if response.status_code >= 400 else None,
+                                groups=(self.metrics_name,))
+                if response.status_code == 429 and self.governor is not None:
+                    self.governor.penalize(path, _retry_after(response))
+                if response.status_code not in RETRYABLE_STATUS or attempt >= retries:
+                    return response
+                reason = f"HTTP {response.status_code}"
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+                metrics.observe(f"{self.metrics_name}.http.{path}", (time.perf_counter() - start) * 1000, type(e).__name__,
+                                groups=(self.metrics_name,))
+                if attempt >= retries:
+                    raise
+                reason = str(e)
+
+            delay = self._backoff(attempt)
+            if time.monotonic() + delay > deadline:
+                self.logger.warning(f"Retry budget exhausted for {method} {path} after {attempt + 1} attempts ({reason}).")
+                if response is not None:
+                    return response
+                raise requests.exceptions.RetryError(f"Retry budget exhausted for {method} {path}: {reason}")
+            attempt += 1
+            self.logger.info(f"Retrying {method} {path} in {delay:.2f}s (attempt {attempt}/{retries}): {reason}")
+            time.sleep(delay)
+
+    def get(self, path: str, sign=None, **kwargs):
+        return self.request("GET", path, sign=sign, **kwargs)
+
+    def post(self, path: str, sign=None, **kwargs):
+        return self.request("POST", path, sign=sign, **kwargs)
+
+    def warm_up(self, path: str = "/"):
+        """Open the TCP+TLS connection ahead of the first signed call."""
+        try:
+            self.session.head(self.base_url + path, timeout=self.default_timeout)
+            return True
+        except requests.exceptions.RequestException as e:
+            self.logger.warning(f"Connection warm-up to {self.base_url} failed: {e}")
+            return False
+
+    def close(self):
+        self.session.close()
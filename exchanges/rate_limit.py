@@ -0,0 +1,219 @@
+import time
+import heapq
+import logging
+import itertools
+import threading
+from collections import deque
+from contextlib import contextmanager
+
+from bitmart.lib.cloud_exceptions import APIException
+
+from engine.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+# 端點類別與預設優先序（數字小者先放行）
+TRADING, ACCOUNT, MARKET = "trading", "account", "market"
+CLASS_PRIORITY = {TRADING: 0, ACCOUNT: 1, MARKET: 2}
+
+# (每秒補充的 token 數, 桶容量)。依 Bitmart 文件「每 2 秒 N 次」換算，帳戶類取其中最嚴的 position
+BITMART_LIMITS = {MARKET: (6.0, 12), ACCOUNT: (3.0, 6), TRADING: (12.0, 24)}
+BITMART_ENDPOINT_CLASSES = {
+    "get_details": MARKET,
+    "get_depth": MARKET,
+    "get_kline": MARKET,
+    "get_trade_fee_rate": ACCOUNT,
+    "get_assets_detail": ACCOUNT,
+    "get_position": ACCOUNT,
+    "post_submit_order": TRADING,
+    "post_submit_leverage": TRADING,
+}
+
+# TopOne 未公布限額，採保守設定
+TOPONE_LIMITS = {ACCOUNT: (2.0, 4), TRADING: (5.0, 10)}
+TOPONE_ENDPOINT_CLASSES = {
+    "/api/v1/balance": ACCOUNT,
+    "/fapi/v1/position": ACCOUNT,
+    "/fapi/v1/create-order": TRADING,
+    "/fapi/v1/close": TRADING,
+}
+
+_priority_override = threading.local()
+
+
+@contextmanager
+def urgent():
+    """Calls made in this block (this thread) jump the queue like trading calls,
+    e.g. the position reads that belong to a close."""
+    previous = getattr(_priority_override, "value", None)
+    _priority_override.value = CLASS_PRIORITY[TRADING]
+    try:
+        yield
+    finally:
+        _priority_override.value = previous
+
+
+class TokenBucket:
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = float(capacity)
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+
+    def refill(self, now):
+        # 被限流期間 updated 設在解除時間，期間不補充
+        self.tokens = min(self.capacity, self.tokens + max(0.0, now - self.updated) * self.rate)
+        self.updated = max(self.updated, now)
+
+    def wait_time(self, now):
+        self.refill(now)
+        if now < self.blocked_until:
+            return self.blocked_until - now
+        return 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+
+
+class RateLimitGovernor:
+    """Token buckets per endpoint class for one exchange, shared by every client.
+
+    ``acquire(endpoint)`` blocks until the endpoint's class bucket has a token;
+    callers are queued, never failed. Within a bucket the waiter with the best
+    priority (trading < account < market, or ``urgent()``) is served first.
+    ``penalize`` empties a bucket for Retry-After seconds after an HTTP 429.
+    Endpoints without a class pass straight through.
+    """
+
+    def __init__(self, name: str, limits: dict, endpoint_classes: dict, history: int = 1000):
+        self.name = name
+        self.endpoint_classes = dict(endpoint_classes)
+        self.buckets = {cls: TokenBucket(rate, capacity) for cls, (rate, capacity) in limits.items()}
+        self._waiters = {cls: [] for cls in self.buckets}
+        self._wait_ms = {cls: deque(maxlen=history) for cls in self.buckets}
+        self.counters = {cls: {"acquired": 0, "queued": 0, "throttled": 0} for cls in self.buckets}
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+
+    def classify(self, endpoint: str):
+        cls = self.endpoint_classes.get(endpoint)
+        return cls if cls in self.buckets else None
+
+    def acquire(self, endpoint: str, priority: int = None):
+        """Take one token for ``endpoint``; returns the seconds spent queued."""
+        cls = self.classify(endpoint)
+        if cls is None:
+            return 0.0
+        if priority is None:
+            priority = getattr(_priority_override, "value", None)
+        if priority is None:
+            priority = CLASS_PRIORITY[cls]
+        bucket, waiters = self.buckets[cls], self._waiters[cls]
+        ticket = (priority, next(self._seq))
+        start = time.monotonic()
+        with self._cond:
+            heapq.heappush(waiters, ticket)
+            try:
+                while True:
+                    wait = bucket.wait_time(time.monotonic())
+                    is_head = waiters[0] == ticket
+                    if is_head and wait <= 0:
+                        bucket.tokens -= 1
+                        break
+                    # 隊首者定時醒來等 token 補充，其餘等隊首放行後通知
+                    self._cond.wait(timeout=wait if is_head else None)
+            finally:
+                waiters.remove(ticket)
+                heapq.heapify(waiters)
+                self._cond.notify_all()
+            waited = time.monotonic() - start
+            self.counters[cls]["acquired"] += 1
+            if waited > 0.001:
+                self.counters[cls]["queued"] += 1
+            self._wait_ms[cls].append(waited * 1000)
+        return waited
+
+    def penalize(self, endpoint: str, retry_after: float = 1.0):
+        cls = self.classify(endpoint)
+        if cls is None:
+            return
+        with self._cond:
+            bucket = self.buckets[cls]
+            bucket.tokens = 0.0
+            bucket.blocked_until = max(bucket.blocked_until, time.monotonic() + retry_after)
+            bucket.updated = bucket.blocked_until
+            self.counters[cls]["throttled"] += 1
+            self._cond.notify_all()
+        logger.warning(f"{self.name} {cls} 端點被限流 ({endpoint})，暫停 {retry_after:.1f} 秒")
+
+    def metrics(self):
+        """Current level and queue per bucket, plus wait-time percentiles in ms."""
+        now = time.monotonic()
+        result = {}
+        with self._cond:
+            for cls, bucket in self.buckets.items():
+                bucket.refill(now)
+                waits = sorted(self._wait_ms[cls])
+                result[cls] = {
+                    "level": round(bucket.tokens, 2),
+                    "capacity": bucket.capacity,
+                    "waiting": len(self._waiters[cls]),
+                    "blocked_for": round(max(0.0, bucket.blocked_until - now), 3),
+                    "wait_p50_ms": waits[len(waits) // 2] if waits else 0.0,
+                    "wait_p95_ms": waits[min(len(waits) - 1, int(len(waits) * 0.95))] if waits else 0.0,
+                    "wait_max_ms": waits[-1] if waits else 0.0,
+                    **self.counters[cls],
+                }
+        return result
+
+
+class GovernedAPI:
+    """Wraps a Bitmart SDK API object so every classified method goes through the governor.
+
+    The wire time of each call (queueing excluded) is recorded as
+    ``<governor>.api.<method>``, with errors by type / HTTP status.
+    """
+
+    def __init__(self, api, governor: RateLimitGovernor):
+        self._api = api
+        self._governor = governor
+
+    def __getattr__(self, name):
+        attr = getattr(self._api, name)
+        if not callable(attr) or self._governor.classify(name) is None:
+            return attr
+
+        def governed(*args, **kwargs):
+            self._governor.acquire(name)
+            start, error = time.perf_counter(), None
+            try:
+                return attr(*args, **kwargs)
+            except APIException as e:
+                error = f"HTTP {e.status_code}"
+                if e.status_code == 429:
+                    self._governor.penalize(name)
+                raise
+            except Exception as e:
+                error = type(e).__name__
+                raise
+            finally:
+                metrics.observe(f"{self._governor.name}.api.{name}", (time.perf_counter() - start) * 1000, error,
+                                groups=(self._governor.name,))
+        return governed
+
+
+# 每個交易所一個共用的 governor：限額以帳戶/IP 計，同一行程內所有客戶端共用
+bitmart_governor = RateLimitGovernor("bitmart", BITMART_LIMITS, BITMART_ENDPOINT_CLASSES)
+topone_governor = RateLimitGovernor("topone", TOPONE_LIMITS, TOPONE_ENDPOINT_CLASSES)
+
+
+def rate_limit_metrics():
+    return {governor.name: governor.metrics() for governor in (bitmart_governor, topone_governor)}
+
+
+def format_rate_limits():
+    """One log line: level/capacity, queue and throttle counts per bucket."""
+    parts = []
+    for name, buckets in rate_limit_metrics().items():
+        for cls, m in buckets.items():
+            parts.append(f"{name}.{cls}={m['level']:.1f}/{m['capacity']} 排隊{m['queued']} 限流{m['throttled']} "
+                         f"p95等待{m['wait_p95_ms']:.0f}ms")
+    return ", ".join(parts)
@@ -0,0 +1,92 @@
+import time
+import logging
+import threading
+from dataclasses import dataclass, field
+
+
+def precision_to_decimals(precision) -> int:
+    """'0.0001' -> 4, '1' -> 0, 3 -> 3 (交易所有時直接給小數位數)"""
+    if isinstance(precision, int):
+        return precision
+    precision = str(precision)
+    if '.' in precision:
+        return len(precision.split('.')[1])
+    return 0
+
+
+@dataclass
+class ContractSpec:
+    exchange: str
+    symbol: str
+    contract_size: float = 1.0
+    price_precision: int = 8
+    qty_precision: int = 0
+    min_size: float = 0.0
+    max_leverage: int = None
+    loaded_at: float = field(default_factory=time.time)
+
+
+class SymbolRegistry:
+    """Contract specs per (exchange, symbol), cached with a TTL.
+
+    Each exchange client registers a loader ``loader(symbol=None) -> {symbol: ContractSpec}``;
+    ``symbol=None`` means "every symbol" and is used for bulk loading at startup.
+    """
+
+    def __init__(self, ttl_seconds: float = 6 * 3600):
+        self.ttl_seconds = ttl_seconds
+        self.logger = logging.getLogger(__name__)
+        self._specs = {}
+        self._loaders = {}
+        self._lock = threading.Lock()
+
+    def register_loader(self, exchange: str, loader):
+        self._loaders[exchange] = loader
+
+    def put(self, spec: ContractSpec):
+        with self._lock:
+            self._specs[(spec.exchange, spec.symbol)] = spec
+
+    def _is_fresh(self, spec: ContractSpec):
+        return time.time() - spec.loaded_at < self.ttl_seconds
+
+    def _load(self, exchange: str, symbol: str = None):
+        loader = self._loaders.get(exchange)
+        if loader is None:
+            self.logger.error(f"No contract spec loader registered for {exchange}.")
+            return {}
+        try:
+            specs = loader(symbol) or {}
+        except Exception as e:
+            self.logger.error(f"Failed to load contract specs from {exchange}: {e}")
+            return {}
+        for spec in specs.values():
+            self.put(spec)
+        return specs
+
+    def get(self, exchange: str, symbol: str):
+        spec = self._specs.get((exchange, symbol))
+        if spec is not None and self._is_fresh(spec):
+            return spec
+        loaded = self._load(exchange, symbol).get(symbol)
+        if loaded is None and spec is not None:
+            # 重新載入失敗時沿用過期規格，合約規格幾乎不會變
+            self.logger.warning(f"Using stale contract spec for {exchange} {symbol}.")
+            return spec
+        return loaded
+
+    def load_all(self, exchange: str, symbols=None):
+        """Bulk-load specs at startup. Returns the number of specs cached."""
+        if symbols is None:
+            return len(self._load(exchange))
+        return sum(1 for symbol in symbols if self._load(exchange, symbol).get(symbol) is not None)
+
+    def invalidate(self, exchange: str = None, symbol: str = None):
+        with self._lock:
+            for key in list(self._specs):
+                if (exchange is None or key[0] == exchange) and (symbol is None or key[1] == symbol):
+                    del self._specs[key]
+
+
+# 兩個交易所客戶端與策略共用的預設註冊表
+symbol_registry = SymbolRegistry()
@@ -1,16 +1,51 @@
 import time
 import hashlib
+import threading
 import requests
 import logging
 import json 
 
+from exchanges.http_transport import HttpTransport
+from exchanges.symbol_registry import ContractSpec, SymbolRegistry, symbol_registry
+from exchanges.rate_limit import RateLimitGovernor, topone_governor
+
 class TopOneClient:
-    def __init__(self, api_key: str, secret_key: str, memo: str = None):
+    def __init__(self, api_key: str, secret_key: str, memo: str = None,
+                 base_url: str = "https://openapi.top.one", transport: HttpTransport = None, warm_up: bool = True,
+                 registry: SymbolRegistry = None, contract_specs: dict = None, market_feed=None,
+                 governor: RateLimitGovernor = None):
         self.api_key = api_key
         self.secret_key = secret_key
         self.memo = memo
-        self.base_url = "https://openapi.top.one"
+        self.base_url = base_url
         self.logger = logging.getLogger(__name__)
+        # 共用 keep-alive 連線池，避免每次呼叫都重新 TCP+TLS 握手
+        self.transport = transport or HttpTransport(base_url, governor=governor or topone_governor)
+        if warm_up:
+            # 預熱在背景執行，建構子不因 HEAD 請求而阻塞
+            threading.Thread(target=self.transport.warm_up, name="topone-warm-up", daemon=True).start()
+        # TopOne 沒有公開的合約規格端點，規格由設定檔提供 (見 config.TOPONE_CONTRACT_SPECS)
+        self.contract_specs = contract_specs or {}
+        self.registry = registry or symbol_registry
+        self.registry.register_loader("topone", self.fetch_contract_specs)
+        # TopOne 沒有行情端點，價格來自共用的串流報價表 (見 data.market_feed)
+        self.market_feed = market_feed
+
+    def fetch_contract_specs(self, symbol: str = None):
+        symbols = [symbol] if symbol else list(self.contract_specs)
+        return {
+            s: ContractSpec(exchange="topone", symbol=s, **self.contract_specs[s])
+            for s in symbols if s in self.contract_specs
+        }
+
+    def get_contract_spec(self, symbol: str):
+        return self.registry.get("topone", symbol)
+
+    def get_current_price(self, symbol: str):
+        if self.market_feed is None:
+            self.logger.error("No market feed attached; TopOne has no market-data endpoint.")
+            return None
+        return self.market_feed.mid_price(symbol)
 
     def _get_signed_headers(self, method, path):
         timestamp = str(int(time.time() * 1000))
@@ -28,12 +63,9 @@ class TopOneClient:
 
     def get_balance(self):
         path = "/api/v1/balance"
-        method = "GET"
-        
-        headers = self._get_signed_headers(method, path)
 
         try:
-            response = requests.get(self.base_url + path, headers=headers)
+            response = self.transport.get(path, sign=self._get_signed_headers)
             response.raise_for_status()
             data = response.json()
 
@@ -59,9 +91,6 @@ class TopOneClient:
 
     def place_order(self, symbol: str, side: str, margin: float, leverage: int, tp_price: float, sl_price: float):
         path = "/fapi/v1/create-order"
-        method = "POST"
-
-        headers = self._get_signed_headers(method, path)
 
         if side.lower() == 'long':
             api_side = "buy"
@@ -85,7 +114,7 @@ class TopOneClient:
         }
 
         try:
-            response = requests.post(self.base_url + path, headers=headers, data=json.dumps(payload))
+            response = self.transport.post(path, sign=self._get_signed_headers, data=json.dumps(payload))
             response.raise_for_status()
             data = response.json()
 
@@ -105,16 +134,13 @@ class TopOneClient:
 
     def get_open_positions(self, symbol: str = None):
         path = "/fapi/v1/position"
-        method = "GET"
-        
-        headers = self._get_signed_headers(method, path)
         params = {"status": 1} # Filter for open positions
 
         if symbol:
             params["pair"] = symbol
 
         try:
-            response = requests.get(self.base_url + path, headers=headers, params=params)
+            response = self.transport.get(path, sign=self._get_signed_headers, params=params)
             response.raise_for_status()
             data = response.json()
 
@@ -134,27 +160,32 @@ class TopOneClient:
     def get_position(self, symbol: str):
         """Get position for specific symbol (compatible with BitmartClient.get_position)"""
         try:
-            positions = self.get_open_positions(symbol)
-            if positions and len(positions) > 0:
-                position = positions[0]
-                #self.logger.info(f"Raw position data from get_open_positions for {symbol}: {position}")
-                return {
-                    'symbol': position.get('pair', symbol),
-                    'size': position.get('quantity', '0'),
-                    'side': position.get('side', None),  # TopOne uses 'side' field
-                    'position_id': position.get('position_id'),
-                    'entry_price': position.get('open_price', '0'),
-                    'unrealized_pnl': position.get('unrealized_pnl', '0')
-                }
-            else:
-                self.logger.info(f"No open position found for {symbol}.")
-                return None
+            return self.summarize_positions(self.get_open_positions(symbol), symbol)
         except Exception as e:
             self.logger.error(f"Failed to get position for {symbol}: {e}")
             return None
 
-    def close_position(self, symbol: str):
-        open_positions = self.get_open_positions(symbol)
+    def summarize_positions(self, positions, symbol: str):
+        """Map the raw get_open_positions list to the get_position dict (first position only)."""
+        if positions and len(positions) > 0:
+            position = positions[0]
+            #self.logger.info(f"Raw position data from get_open_positions for {symbol}: {position}")
+            return {
+                'symbol': position.get('pair', symbol),
+                'size': position.get('quantity', '0'),
+                'side': position.get('side', None),  # TopOne uses 'side' field
+                'position_id': position.get('position_id'),
+                'entry_price': position.get('open_price', '0'),
+                'unrealized_pnl': position.get('unrealized_pnl', '0')
+            }
+        else:
+            self.logger.info(f"No open position found for {symbol}.")
+            return None
+
+    def close_position(self, symbol: str, open_positions: list = None):
+        # open_positions 可由 AccountSnapshot 傳入，省去再查一次持倉
+        if open_positions is None:
+            open_positions = self.get_open_positions(symbol)
         if not open_positions:
             self.logger.info(f"No open positions found for {symbol}.")
             return None
@@ -165,20 +196,19 @@ class TopOneClient:
             quantity = position['quantity'] 
 
             path = "/fapi/v1/close"
-            method = "POST"
-            headers = self._get_signed_headers(method, path)
             payload = {
                 "position_id": position_id,
                 "quantity": quantity 
             }
 
             try:
-                response = requests.post(self.base_url + path, headers=headers, data=json.dumps(payload))
+                response = self.transport.post(path, sign=self._get_signed_headers, data=json.dumps(payload))
                 response.raise_for_status()
                 data = response.json()
 
                 if data.get("status") and data.get("status").get("error") is None:
-                    self.logger.info(f"Position {position_id} closed successfully: {data}")
+                    self.logger.info(f"Position {position_id} closed successfully")
+                    self.logger.debug("Close response for position %s: %s", position_id, data)
                     results.append({"position_id": position_id, "status": "success", "response": data})
                 else:
                     message = data.get("status", {}).get("messages", "Unknown error")
@@ -0,0 +1,90 @@
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+CCI_CONSTANT = 0.015
+# 與原本 cci() 相同，避免除以零
+EPSILON = 1e-9
+
+
+def typical_price(high, low, close):
+    return (np.asarray(high, dtype=float) + np.asarray(low, dtype=float) + np.asarray(close, dtype=float)) / 3
+
+
+def cci_batch(high, low, close, period=20, chunk_size=1 << 18):
+    """CCI over whole arrays using sliding windows, no per-bar Python call.
+
+    Matches ``(tp - ma) / (0.015 * md + 1e-9)`` with pandas rolling semantics:
+    the first ``period - 1`` values and any window containing NaN are NaN.
+    Windows are processed in chunks so memory stays bounded on long histories.
+    """
+    tp = typical_price(high, low, close)
+    n = len(tp)
+    out = np.full(n, np.nan)
+    if period < 1 or n < period:
+        return out
+
+    windows = sliding_window_view(tp, period)
+    for lo in range(0, len(windows), chunk_size):
+        w = windows[lo:lo + chunk_size]
+        ma = w.mean(axis=1)
+        md = np.abs(w - ma[:, None]).mean(axis=1)
+        end = lo + len(w) + period - 1
+        out[lo + period - 1:end] = (tp[lo + period - 1:end] - ma) / (CCI_CONSTANT * md + EPSILON)
+    return out
+
+
+class StreamingCCI:
+    """CCI updated one bar at a time.
+
+    Keeps only the last ``period`` typical prices in a ring, so each update is
+    one ``period``-wide NumPy pass no matter how much history has been seen.
+    The mean is taken from the ring itself rather than a running sum, so
+    floating-point error does not accumulate over long runs.
+    """
+
+    def __init__(self, period=20):
+        self.period = period
+        self._window = np.full(period, np.nan)
+        self._pos = 0
+        self._count = 0
+        self.value = np.nan
+
+    def _evaluate(self, tp, window, count):
+        if count < self.period:
+            return np.nan
+        mean = window.mean()
+        md = np.abs(window - mean).mean()
+        return (tp - mean) / (CCI_CONSTANT * md + EPSILON)
+
+    def peek(self, high, low, close):
+        """CCI as if this bar were appended, without changing state (forming bar)."""
+        tp = (high + low + close) / 3
+        window = self._window.copy()
+        window[self._pos] = tp
+        return self._evaluate(tp, window, min(self._count + 1, self.period))
+
+    def update(self, high, low, close):
+        """Append a closed bar and return the latest CCI."""
+        tp = (high + low + close) / 3
+        self._window[self._pos] = tp
+        self._pos = (self._pos + 1) % self.period
+        self._count = min(self._count + 1, self.period)
+        self.value = self._evaluate(tp, self._window, self._count)
+        return self.value
+
+    def seed(self, high, low, close):
+        """Warm the state from history arrays (oldest first)."""
+        for h, l, c in zip(high, low, close):
+            self.update(h, l, c)
+        return self.value
+
+    def to_dict(self):
+        return {"period": self.period, "window": self._window.tolist(), "pos": self._pos,
+                "count": self._count, "value": float(self.value)}
+
+    @classmethod
+    def from_dict(cls, state):
+        stream = cls(state["period"])
+        stream._window = np.asarray(state["window"], dtype=float)
+        stream._pos, stream._count, stream.value = state["pos"], state["count"], state["value"]
+        return stream
@@ -0,0 +1,301 @@
+import math
+from abc import ABC, abstractmethod
+from collections import deque
+
+from indicators.cci import StreamingCCI
+
+# bar 格式與 data.kline_cache / data.bar_aggregator 相同: [timestamp, open, high, low, close, volume]
+TS, OPEN, HIGH, LOW, CLOSE, VOLUME = range(6)
+NAN = float('nan')
+
+
+class _EMA:
+    """pandas ``ewm(alpha=..., adjust=False, min_periods=...)`` one value at a time."""
+
+    def __init__(self, alpha, min_periods):
+        self.alpha = alpha
+        self.min_periods = min_periods
+        self.value = NAN
+        self.count = 0
+
+    def peek(self, x):
+        value = x if self.count == 0 else (1 - self.alpha) * self.value + self.alpha * x
+        return value, self.count + 1
+
+    def update(self, x):
+        self.value, self.count = self.peek(x)
+        return self.value
+
+    def output(self, value, count):
+        return value if count >= self.min_periods else NAN
+
+    def to_dict(self):
+        return {"alpha": self.alpha, "min_periods": self.min_periods, "value": self.value, "count": self.count}
+
+    @classmethod
+    def from_dict(cls, state):
+        ema = cls(state["alpha"], state["min_periods"])
+        ema.value, ema.count = state["value"], state["count"]
+        return ema
+
+
+class IncrementalIndicator(ABC):
+    """Base class: ``commit(bar)`` folds a closed bar into the state, ``peek(bar)``
+    evaluates a forming bar without touching it. Both return the indicator value."""
+
+    @abstractmethod
+    def peek(self, bar):
+        ...
+
+    @abstractmethod
+    def commit(self, bar):
+        ...
+
+    @abstractmethod
+    def to_dict(self):
+        ...
+
+    @classmethod
+    @abstractmethod
+    def from_dict(cls, state):
+        ...
+
+
+class CCI(IncrementalIndicator):
+    def __init__(self, period=20):
+        self._stream = StreamingCCI(period)
+
+    def peek(self, bar):
+        return self._stream.peek(bar[HIGH], bar[LOW], bar[CLOSE])
+
+    def commit(self, bar):
+        return self._stream.update(bar[HIGH], bar[LOW], bar[CLOSE])
+
+    def to_dict(self):
+        return self._stream.to_dict()
+
+    @classmethod
+    def from_dict(cls, state):
+        indicator = cls(state["period"])
+        indicator._stream = StreamingCCI.from_dict(state)
+        return indicator
+
+
+class RSI(IncrementalIndicator):
+    """Matches ``ta.momentum.rsi(close, window, fillna=False)``."""
+
+    def __init__(self, window=14):
+        self.window = window
+        self.prev_close = None
+        self._up = _EMA(1 / window, window)
+        self._down = _EMA(1 / window, window)
+
+    def _moves(self, close):
+        # ta 把第一根的 NaN 差值當成 0 計入 EWM
+        diff = 0.0 if self.prev_close is None else close - self.prev_close
+        return (diff if diff > 0 else 0.0), (-diff if diff < 0 else 0.0)
+
+    @staticmethod
+    def _rsi(up, down):
+        if math.isnan(up) or math.isnan(down):
+            return NAN
+        if down == 0:
+            return 100.0
+        return 100 - 100 / (1 + up / down)
+
+    def peek(self, bar):
+        up, down = self._moves(bar[CLOSE])
+        up_value, up_count = self._up.peek(up)
+        down_value, down_count = self._down.peek(down)
+        return self._rsi(self._up.output(up_value, up_count), self._down.output(down_value, down_count))
+
+    def commit(self, bar):
+        up, down = self._moves(bar[CLOSE])
+        self._up.update(up)
+        self._down.update(down)
+        self.prev_close = bar[CLOSE]
+        return self._rsi(self._up.output(self._up.value, self._up.count),
+                         self._down.output(self._down.value, self._down.count))
+
+    def to_dict(self):
+        return {"window": self.window, "prev_close": self.prev_close,
+                "up": self._up.to_dict(), "down": self._down.to_dict()}
+
+    @classmethod
+    def from_dict(cls, state):
+        indicator = cls(state["window"])
+        indicator.prev_close = state["prev_close"]
+        indicator._up, indicator._down = _EMA.from_dict(state["up"]), _EMA.from_dict(state["down"])
+        return indicator
+
+
+class MACD(IncrementalIndicator):
+    """Matches ``ta.trend.macd / macd_signal / macd_diff`` with fillna=False.
+
+    The value is a dict with ``macd``, ``signal`` and ``diff``.
+    """
+
+    def __init__(self, window_fast=12, window_slow=26, window_sign=9):
+        self.window_fast, self.window_slow, self.window_sign = window_fast, window_slow, window_sign
+        self._fast = _EMA(2 / (window_fast + 1), window_fast)
+        self._slow = _EMA(2 / (window_slow + 1), window_slow)
+        # signal 線從第一個有效的 MACD 值開始累積，與 pandas 對前導 NaN 的處理一致
+        self._signal = _EMA(2 / (window_sign + 1), window_sign)
+
+    def _evaluate(self, fast, slow, signal_ema):
+        macd = fast - slow
+        if math.isnan(macd):
+            return {"macd": NAN, "signal": NAN, "diff": NAN}, None
+        signal_value, signal_count = signal_ema.peek(macd)
+        signal = signal_ema.output(signal_value, signal_count)
+        return {"macd": macd, "signal": signal, "diff": macd - signal}, macd
+
+    def peek(self, bar):
+        fast_value, fast_count = self._fast.peek(bar[CLOSE])
+        slow_value, slow_count = self._slow.peek(bar[CLOSE])
+        value, _ = self._evaluate(self._fast.output(fast_value, fast_count),
+                                  self._slow.output(slow_value, slow_count), self._signal)
+        return value
+
+    def commit(self, bar):
+        self._fast.update(bar[CLOSE])
+        self._slow.update(bar[CLOSE])
+        value, macd = self._evaluate(self._fast.output(self._fast.value, self._fast.count),
+                                     self._slow.output(self._slow.value, self._slow.count), self._signal)
+        if macd is not None:
+            self._signal.update(macd)
+        return value
+
+    def to_dict(self):
+        return {"window_fast": self.window_fast, "window_slow": self.window_slow, "window_sign": self.window_sign,
+                "fast": self._fast.to_dict(), "slow": self._slow.to_dict(), "signal": self._signal.to_dict()}
+
+    @classmethod
+    def from_dict(cls, state):
+        indicator = cls(state["window_fast"], state["window_slow"], state["window_sign"])
+        indicator._fast = _EMA.from_dict(state["fast"])
+        indicator._slow = _EMA.from_dict(state["slow"])
+        indicator._signal = _EMA.from_dict(state["signal"])
+        return indicator
+
+
+class RollingExtreme(IncrementalIndicator):
+    """Rolling max or min of one bar field over ``period`` bars (monotonic deque)."""
+
+    def __init__(self, period, field=CLOSE, mode="max"):
+        self.period = period
+        self.field = field
+        self.mode = mode
+        self._deque = deque()  # (bar index, value)，值單調
+        self._index = 0
+
+    def _dominates(self, a, b):
+        return a >= b if self.mode == "max" else a <= b
+
+    def peek(self, bar):
+        if self._index + 1 < self.period:
+            return NAN
+        value = bar[self.field]
+        oldest = self._index - self.period + 1
+        for i, v in self._deque:
+            if i >= oldest:
+                return value if self._dominates(value, v) else v
+        return value
+
+    def commit(self, bar):
+        value = bar[self.field]
+        while self._deque and self._dominates(value, self._deque[-1][1]):
+            self._deque.pop()
+        self._deque.append((self._index, value))
+        while self._deque[0][0] <= self._index - self.period:
+            self._deque.popleft()
+        self._index += 1
+        return self._deque[0][1] if self._index >= self.period else NAN
+
+    def to_dict(self):
+        return {"period": self.period, "field": self.field, "mode": self.mode,
+                "deque": [list(item) for item in self._deque], "index": self._index}
+
+    @classmethod
+    def from_dict(cls, state):
+        indicator = cls(state["period"], state["field"], state["mode"])
+        indicator._deque = deque(tuple(item) for item in state["deque"])
+        indicator._index = state["index"]
+        return indicator
+
+
+INDICATOR_TYPES = {cls.__name__: cls for cls in (CCI, RSI, MACD, RollingExtreme)}
+
+
+class IndicatorEngine:
+    """A set of named incremental indicators fed with the same bar stream.
+
+    ``update(bar)`` follows the same forming-bar rule as BarAggregator: a bar
+    with the forming bar's timestamp revises it, a newer bar commits the
+    forming one first. Pass ``closed=True`` for bars known to be final.
+    Per-update cost depends on the indicator windows, never on history length.
+    """
+
+    def __init__(self, **indicators):
+        self.indicators = dict(indicators)
+        self.forming = None
+        self.values = {name: NAN for name in self.indicators}
+        self.committed = dict(self.values)
+        self.last_ts = None
+
+    def _commit(self, bar):
+        self.committed = {name: ind.commit(bar) for name, ind in self.indicators.items()}
+        self.last_ts = bar[TS]
+
+    def update(self, bar, closed=False):
+        bar = [float(x) for x in bar[:6]]
+        if self.last_ts is not None and bar[TS] <= self.last_ts:
+            return self.values
+        if self.forming is not None and bar[TS] > self.forming[TS]:
+            self._commit(self.forming)
+            self.forming = None
+        if closed:
+            self._commit(bar)
+            self.forming = None
+            self.values = dict(self.committed)
+        else:
+            self.forming = bar
+            self.values = {name: ind.peek(bar) for name, ind in self.indicators.items()}
+        return self.values
+
+    def ingest(self, rows, last_closed=False):
+        """Feed bars oldest first; rows already committed are skipped. The last row
+        is treated as forming unless ``last_closed``."""
+        rows = list(rows)
+        for i, row in enumerate(rows):
+            self.update(row, closed=last_closed or i < len(rows) - 1)
+        return self.values
+
+    def to_dict(self):
+        return {
+            "indicators": {name: {"type": type(ind).__name__, "state": ind.to_dict()}
+                           for name, ind in self.indicators.items()},
+            "forming": self.forming,
+            "last_ts": self.last_ts,
+            "committed": self.committed,
+        }
+
+    @classmethod
+    def from_dict(cls, state):
+        engine = cls(**{name: INDICATOR_TYPES[spec["type"]].from_dict(spec["state"])
+                        for name, spec in state["indicators"].items()})
+        engine.last_ts = state["last_ts"]
+        engine.committed = state["committed"]
+        engine.values = dict(engine.committed)
+        if state["forming"] is not None:
+            engine.forming = state["forming"]
+            engine.values = {name: ind.peek(engine.forming) for name, ind in engine.indicators.items()}
+        return engine
+
+
+def get_indicator_engine(client, key, factory):
+    """The IndicatorEngine stored on a client under ``key`` (built with ``factory()`` on first use)."""
+    engines = vars(client).setdefault("indicator_engines", {})
+    if key not in engines:
+        engines.setdefault(key, factory())
+    return engines[key]
@@ -0,0 +1,478 @@
+import json
+import time
+import random
+import logging
+import argparse
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit, parse_qsl
+
+import config
+from data.kline_store import KlineStore
+from exchanges.rate_limit import (BITMART_LIMITS, BITMART_ENDPOINT_CLASSES, TOPONE_LIMITS, TOPONE_ENDPOINT_CLASSES,
+                                  TokenBucket)
+from sim.matching import ReplayMarket, SimAccount, SimError
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_HOST = "127.0.0.1"
+
+# 未指定時的 Bitmart 合約規格（details 端點回傳的字串格式）
+DEFAULT_SPEC = {"contract_size": "0.01", "price_precision": "0.01", "vol_precision": "1", "min_volume": "1",
+                "max_leverage": "100"}
+
+# 伺服器端限流容許的提前量（秒）：客戶端限流器放行到請求抵達伺服器之間有傳輸時間，
+# 與客戶端同額的桶不應因此誤判
+RATE_LIMIT_TOLERANCE = 0.05
+
+# 模擬器對所有被拒絕的 Bitmart 請求使用同一個業務錯誤碼
+BITMART_REJECT_CODE = 40000
+
+# submit-order 的 side: 1 開多、2 平空、3 平多、4 開空
+BITMART_OPEN_SIDES = {1: "long", 4: "short"}
+BITMART_CLOSE_SIDES = {3: "long", 2: "short"}
+
+
+class SimExchange:
+    """Bitmart and TopOne accounts on one ReplayMarket, plus the fault injection the server applies.
+
+    ``latency_ms`` + uniform(0, ``jitter_ms``) is slept before every exchange
+    request; ``error_rate`` of them get HTTP 503; with ``rate_limits`` each
+    endpoint class has a token bucket (the clients' own limits by default, or
+    ``{"bitmart": {"market": (rate, capacity)}, ...}`` overrides) and an empty
+    bucket answers 429 with Retry-After.
+    """
+
+    def __init__(self, market, balances=None, fee_rates=None, specs=None, latency_ms=0.0, jitter_ms=0.0,
+                 error_rate=0.0, rate_limits=True, seed=None):
+        self.market = market
+        balances = balances or {}
+        fee_rates = fee_rates or {}
+        self.accounts = {venue: SimAccount(market, venue, balances.get(venue, 1000.0), fee_rates.get(venue, 0.0006))
+                         for venue in ("bitmart", "topone")}
+        self.specs = {symbol: dict(DEFAULT_SPEC, **(specs or {}).get(symbol, {})) for symbol in market.symbols}
+        self.random = random.Random(seed)
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.buckets = {}
+        self.set_rate_limits(rate_limits)
+        self.stats = {"requests": 0, "rate_limited": 0, "injected_errors": 0, "rejected": 0}
+        self._stats_lock = threading.Lock()
+
+    # ---------- 設定 ----------
+    def set_rate_limits(self, rate_limits):
+        if not rate_limits:
+            self.buckets = {}
+            return
+        overrides = rate_limits if isinstance(rate_limits, dict) else {}
+        limits = {"bitmart": dict(BITMART_LIMITS, **overrides.get("bitmart", {})),
+                  "topone": dict(TOPONE_LIMITS, **overrides.get("topone", {}))}
+        self.buckets = {(venue, cls): TokenBucket(*limit) for venue, table in limits.items()
+                        for cls, limit in table.items()}
+
+    def configure(self, body):
+        """Apply POST /sim/config: latency_ms, jitter_ms, error_rate, rate_limits (bool or overrides)."""
+        for key in ("latency_ms", "jitter_ms", "error_rate"):
+            if key in body:
+                setattr(self, key, float(body[key]))
+        if "rate_limits" in body:
+            self.set_rate_limits(body["rate_limits"])
+        return self.settings()
+
+    def settings(self):
+        return {"latency_ms": self.latency_ms, "jitter_ms": self.jitter_ms, "error_rate": self.error_rate,
+                "rate_limits": {f"{venue}.{cls}": [b.rate, b.capacity] for (venue, cls), b in self.buckets.items()}}
+
+    def _count(self, key):
+        with self._stats_lock:
+            self.stats[key] += 1
+
+    # ---------- 注入 ----------
+    def delay(self):
+        seconds = (self.latency_ms + self.random.uniform(0, self.jitter_ms)) / 1000
+        if seconds > 0:
+            time.sleep(seconds)
+
+    def admit(self, venue, endpoint_class):
+        """(status, headers) to answer instead of serving, or None to serve the request."""
+        self._count("requests")
+        bucket = self.buckets.get((venue, endpoint_class))
+        headers = {}
+        if bucket is not None:
+            with self._stats_lock:
+                now = time.monotonic()
+                wait = bucket.wait_time(now)
+                if wait <= RATE_LIMIT_TOLERANCE:
+                    wait = 0.0
+                    bucket.tokens -= 1
+            headers = {"X-BM-RateLimit-Remaining": str(max(int(bucket.tokens), 0)),
+                       "X-BM-RateLimit-Limit": str(int(bucket.capacity)),
+                       "X-BM-RateLimit-Reset": str(max(1, round(bucket.capacity / bucket.rate))),
+                       "X-BM-RateLimit-Mode": "IP"}
+            if wait > 0:
+                self._count("rate_limited")
+                return 429, dict(headers, **{"Retry-After": f"{wait:.3f}"})
+        if self.error_rate and self.random.random() < self.error_rate:
+            self._count("injected_errors")
+            return 503, headers
+        return None, headers
+
+    # ---------- Bitmart ----------
+    def _bitmart_position(self, position):
+        spec = self.specs[position.symbol]
+        price = self.market.price(position.symbol)
+        return {
+            "symbol": position.symbol,
+            "leverage": str(position.leverage),
+            "timestamp": self.market.now() * 1000,
+            "open_timestamp": position.opened_at * 1000,
+            "margin_type": "Isolated",
+            "position_type": 1 if position.side == "long" else 2,
+            "current_amount": str(round(position.qty / float(spec["contract_size"]))),
+            "open_avg_price": f"{position.entry_price:.8g}",
+            "mark_price": f"{price:.8g}",
+            "liquidation_price": f"{position.liquidation_price(self.accounts['bitmart'].maintenance_margin_rate):.8g}",
+            "position_value": f"{position.qty * price:.8f}",
+            "initial_margin": f"{position.margin:.8f}",
+            "unrealized_value": f"{position.unrealized_pnl(price):.8f}",
+            "realized_value": f"{position.realized_pnl:.8f}",
+            "preset_take_profit_price": "" if position.tp_price is None else str(position.tp_price),
+            "preset_stop_loss_price": "" if position.sl_price is None else str(position.sl_price),
+        }
+
+    def bitmart_details(self, params, body):
+        symbols = [params["symbol"]] if params.get("symbol") else self.market.symbols
+        return {"symbols": [dict(self.specs[s], symbol=s) for s in symbols if s in self.specs]}
+
+    def bitmart_depth(self, params, body):
+        symbol = self._symbol(params["symbol"])
+        quote = self.market.quote(symbol)
+        return {"symbol": symbol, "timestamp": self.market.now() * 1000,
+                "bids": [[f"{quote['bid']:.8g}", "100000"]], "asks": [[f"{quote['ask']:.8g}", "100000"]]}
+
+    def bitmart_kline(self, params, body):
+        rows = self.market.klines(self._symbol(params["symbol"]), int(params.get("step", 1)),
+                                  int(params["start_time"]), int(params["end_time"]))
+        return [{"timestamp": int(r[0]), "open_price": f"{r[1]:.8g}", "high_price": f"{r[2]:.8g}",
+                 "low_price": f"{r[3]:.8g}", "close_price": f"{r[4]:.8g}", "volume": f"{r[5]:.8g}"} for r in rows]
+
+    def bitmart_assets(self, params, body):
+        account = self.accounts["bitmart"]
+        return [{"currency": "USDT", "available_balance": f"{account.available():.8f}",
+                 "position_deposit": f"{account.used_margin():.8f}", "equity": f"{account.equity():.8f}",
+                 "frozen_balance": "0", "unrealized": f"{account.equity() - account.wallet:.8f}"}]
+
+    def bitmart_fee(self, params, body):
+        rate = str(self.accounts["bitmart"].fee_rate)
+        return {"symbol": params.get("symbol"), "taker_fee_rate": rate, "maker_fee_rate": rate}
+
+    def bitmart_positions(self, params, body):
+        return [self._bitmart_position(p) for p in self.accounts["bitmart"].open_positions(params.get("symbol"))]
+
+    def bitmart_leverage(self, params, body):
+        symbol = self._symbol(body["symbol"])
+        self.accounts["bitmart"].set_leverage(symbol, int(float(body["leverage"])))
+        return {"symbol": symbol, "leverage": str(body["leverage"]), "open_type": body.get("open_type", "isolated")}
+
+    def bitmart_submit(self, params, body):
+        symbol = self._symbol(body["symbol"])
+        account = self.accounts["bitmart"]
+        side = int(body["side"])
+        if body.get("type", "limit") != "market":
+            raise SimError("only market orders are simulated")
+        size = int(body["size"])
+        qty = size * float(self.specs[symbol]["contract_size"])
+        if side in BITMART_OPEN_SIDES:
+            if size < int(float(self.specs[symbol]["min_volume"])):
+                raise SimError(f"size {size} below min_volume")
+            leverage = int(float(body.get("leverage") or account.leverage.get(symbol, 1)))
+            position = account.open(symbol, BITMART_OPEN_SIDES[side], qty, leverage,
+                                    _optional_float(body.get("preset_take_profit_price")),
+                                    _optional_float(body.get("preset_stop_loss_price")))
+        elif side in BITMART_CLOSE_SIDES:
+            position = account.positions.get((symbol, BITMART_CLOSE_SIDES[side]))
+            if position is None:
+                raise SimError(f"no {BITMART_CLOSE_SIDES[side]} position to close in {symbol}")
+            account.close(symbol, position.side, qty)
+        else:
+            raise SimError(f"invalid side {side}")
+        return {"order_id": len(account.fills), "price": f"{account.fills[-1].price:.8g}"}
+
+    # ---------- TopOne ----------
+    def topone_balance(self, params, body):
+        account = self.accounts["topone"]
+        return {"trading": [{"code": "USDT", "available": f"{account.available():.8f}",
+                             "frozen": f"{account.used_margin():.8f}", "equity": f"{account.equity():.8f}"}]}
+
+    def topone_create_order(self, params, body):
+        symbol = self._symbol(body["pair"])
+        side = body.get("position_side") or {"buy": "long", "sell": "short"}.get(body.get("side"))
+        leverage = int(body["leverage"])
+        price = self.market.price(symbol)
+        qty = float(body["margin"]) * leverage / price
+        position = self.accounts["topone"].open(symbol, side, qty, leverage,
+                                                _optional_float(body.get("take_profit_price")),
+                                                _optional_float(body.get("stop_loss_price")))
+        return {"position_id": position.position_id, "order_id": len(self.accounts["topone"].fills)}
+
+    def topone_positions(self, params, body):
+        if str(params.get("status", 1)) != "1":
+            return {"list": []}
+        account = self.accounts["topone"]
+        return {"list": [{"position_id": p.position_id, "pair": p.symbol, "side": p.side,
+                          "quantity": repr(p.qty), "open_price": f"{p.entry_price:.8g}",
+                          "leverage": p.leverage, "margin": f"{p.margin:.8f}",
+                          "unrealized_pnl": f"{p.unrealized_pnl(self.market.price(p.symbol)):.8f}",
+                          "take_profit_price": p.tp_price, "stop_loss_price": p.sl_price}
+                         for p in account.open_positions(params.get("pair"))]}
+
+    def topone_close(self, params, body):
+        account = self.accounts["topone"]
+        position = account.position_by_id(body["position_id"])
+        if position is None:
+            raise SimError(f"position {body['position_id']} not found")
+        quantity = body.get("quantity")
+        qty = position.qty if quantity in (None, "") else float(quantity)
+        if qty <= 0:
+            raise SimError(f"invalid close quantity {quantity}")
+        fill = account.close(position.symbol, position.side, qty)
+        return {"position_id": position.position_id, "price": f"{fill.price:.8g}", "pnl": f"{fill.pnl:.8f}"}
+
+    def handle(self, method, path, params, body):
+        """Serve one exchange request without any injection: (HTTP status, payload in the venue's format).
+
+        Business rejections are HTTP 400 with a non-1000 code on Bitmart and
+        HTTP 200 with ``status.error`` set on TopOne, as the real venues do.
+        """
+        venue, _, handler = ROUTES[(method, path)]
+        try:
+            with self.market.lock:
+                data = handler(self, params, body)
+        except (SimError, ValueError, KeyError) as e:
+            self._count("rejected")
+            message = f"missing field {e}" if isinstance(e, KeyError) else str(e)
+            if venue == "bitmart":
+                return 400, {"code": BITMART_REJECT_CODE, "message": message, "data": {}, "trace": "sim"}
+            return 200, topone_reply(None, message)
+        return 200, bitmart_reply(data) if venue == "bitmart" else topone_reply(data)
+
+    def _symbol(self, symbol):
+        if symbol not in self.specs:
+            raise SimError(f"unknown symbol {symbol}")
+        return symbol
+
+    # ---------- 控制 ----------
+    def step(self, body):
+        """POST /sim/step: {"ticks": n} | {"bars": n} | {"to": ts}."""
+        if "to" in body:
+            self.market.advance_to(int(body["to"]))
+        elif "bars" in body:
+            self.market.step_bars(int(body["bars"]))
+        else:
+            self.market.step_ticks(int(body.get("ticks", 1)))
+        return self.state()
+
+    def state(self):
+        with self.market.lock:
+            return {
+                "now": self.market.now(), "bar": self.market.bar, "tick": self.market.tick,
+                "finished": self.market.finished(),
+                "prices": {s: self.market.price(s) for s in self.market.symbols},
+                "accounts": {venue: {"wallet": a.wallet, "available": a.available(), "equity": a.equity(),
+                                     "positions": len(a.positions), "fills": len(a.fills),
+                                     "triggered": sum(f.action in ("tp", "sl", "liquidation") for f in a.fills)}
+                             for venue, a in self.accounts.items()},
+                "stats": dict(self.stats),
+            }
+
+
+def _optional_float(value):
+    return float(value) if value not in (None, "", "None") else None
+
+
+def bitmart_reply(data):
+    return {"code": 1000, "message": "Ok", "data": data, "trace": "sim"}
+
+
+def topone_reply(data, error=None):
+    if error is not None:
+        return {"status": {"error": {"code": 1, "message": error}, "messages": error}, "data": None}
+    return {"status": {"error": None, "messages": "success"}, "data": data}
+
+
+# (method, path) -> (交易所, 限流類別, SimExchange 方法)；HTTP 伺服器與 sim.paper_broker 共用
+ROUTES = {("GET", path): ("bitmart", BITMART_ENDPOINT_CLASSES[name], handler)
+          for path, name, handler in (
+              ("/contract/public/details", "get_details", SimExchange.bitmart_details),
+              ("/contract/public/depth", "get_depth", SimExchange.bitmart_depth),
+              ("/contract/public/kline", "get_kline", SimExchange.bitmart_kline),
+              ("/contract/private/assets-detail", "get_assets_detail", SimExchange.bitmart_assets),
+              ("/contract/private/trade-fee-rate", "get_trade_fee_rate", SimExchange.bitmart_fee),
+              ("/contract/private/position", "get_position", SimExchange.bitmart_positions))}
+ROUTES.update({
+    ("POST", "/contract/private/submit-order"): ("bitmart", BITMART_ENDPOINT_CLASSES["post_submit_order"],
+                                                 SimExchange.bitmart_submit),
+    ("POST", "/contract/private/submit-leverage"): ("bitmart", BITMART_ENDPOINT_CLASSES["post_submit_leverage"],
+                                                    SimExchange.bitmart_leverage),
+    ("GET", "/api/v1/balance"): ("topone", TOPONE_ENDPOINT_CLASSES["/api/v1/balance"], SimExchange.topone_balance),
+    ("GET", "/fapi/v1/position"): ("topone", TOPONE_ENDPOINT_CLASSES["/fapi/v1/position"],
+                                   SimExchange.topone_positions),
+    ("POST", "/fapi/v1/create-order"): ("topone", TOPONE_ENDPOINT_CLASSES["/fapi/v1/create-order"],
+                                        SimExchange.topone_create_order),
+    ("POST", "/fapi/v1/close"): ("topone", TOPONE_ENDPOINT_CLASSES["/fapi/v1/close"], SimExchange.topone_close),
+})
+
+
+class _SimHandler(BaseHTTPRequestHandler):
+    routes = ROUTES
+    control_routes = {
+        ("POST", "/sim/step"): lambda exchange, body: exchange.step(body),
+        ("POST", "/sim/config"): lambda exchange, body: exchange.configure(body),
+        ("GET", "/sim/state"): lambda exchange, body: exchange.state(),
+        ("GET", "/sim/config"): lambda exchange, body: exchange.settings(),
+    }
+    # keep-alive 連線（客戶端都用連線池）；標頭與內容分開寫出，關掉 Nagle 以免延遲 ACK 多等 40ms
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+
+    def _reply(self, code, payload, headers=None):
+        data = json.dumps(payload, default=str).encode("utf-8")
+        self.send_response(code)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _body(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        return json.loads(self.rfile.read(length) or b"{}")
+
+    def do_HEAD(self):
+        # 客戶端的連線預熱 (HttpTransport.warm_up)
+        self.send_response(200)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def do_GET(self):
+        self._dispatch("GET")
+
+    def do_POST(self):
+        self._dispatch("POST")
+
+    def _dispatch(self, method):
+        exchange = self.server.exchange
+        url = urlsplit(self.path)
+        params = dict(parse_qsl(url.query))
+        try:
+            body = self._body() if method == "POST" else {}
+        except ValueError as e:
+            self._reply(400, {"error": f"invalid JSON body: {e}"})
+            return
+
+        control = self.control_routes.get((method, url.path))
+        if control is not None:
+            try:
+                self._reply(200, control(exchange, body))
+            except (ValueError, KeyError) as e:
+                self._reply(400, {"error": str(e)})
+            return
+
+        route = self.routes.get((method, url.path))
+        if route is None:
+            self._reply(404, {"error": f"unknown path {method} {url.path}"})
+            return
+        venue, endpoint_class, _ = route
+        exchange.delay()
+        status, headers = exchange.admit(venue, endpoint_class)
+        if status is not None:
+            self._reply(status, {"error": "rate limited" if status == 429 else "injected failure"}, headers)
+            return
+        try:
+            status, payload = exchange.handle(method, url.path, params, body)
+        except Exception as e:
+            logger.error(f"模擬交易所 {method} {url.path} 失敗: {e}", exc_info=True)
+            self._reply(500, {"error": repr(e)})
+            return
+        self._reply(status, payload, headers)
+
+    def log_message(self, format, *args):
+        logger.debug("sim exchange: " + format % args)
+
+
+def serve_exchange(exchange, host=DEFAULT_HOST, port=None):
+    """Serve ``exchange`` (a SimExchange) on a daemon thread; returns the server.
+
+    Point BitmartClient(base_url=...) and TopOneClient(base_url=...) at
+    ``http://host:port`` (see config.SIM_SERVER_URL). Besides the exchange
+    endpoints: POST /sim/step ({"ticks"|"bars"|"to"}), POST /sim/config,
+    GET /sim/config, GET /sim/state.
+    """
+    server = ThreadingHTTPServer((host, config.SIM_SERVER_PORT if port is None else port), _SimHandler)
+    server.daemon_threads = True
+    server.exchange = exchange
+    threading.Thread(target=server.serve_forever, name="sim-exchange", daemon=True).start()
+    logger.info(f"模擬交易所已啟動: http://{host}:{server.server_address[1]}")
+    return server
+
+
+def run_clock(market, stop, tick_seconds=None):
+    """Advance ``market`` until ``stop`` is set: one tick every ``tick_seconds``, or with the wall clock when None."""
+    while not stop.is_set() and not market.finished():
+        if tick_seconds is None:
+            market.advance_to(time.time())
+            stop.wait(1.0)
+        else:
+            market.step_ticks()
+            stop.wait(tick_seconds)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="以本機K線庫回放的 Bitmart/TopOne 模擬交易所")
+    parser.add_argument("--root", default=config.KLINE_STORE_DIR)
+    parser.add_argument("--exchange", default="bitmart", help="K線來源交易所")
+    parser.add_argument("--symbols", default=config.SYMBOL, help="以逗號分隔")
+    parser.add_argument("--interval", type=int, default=15)
+    parser.add_argument("--start", type=int, help="回放起點時間戳（秒），預設為已存K線的開頭")
+    parser.add_argument("--history-bars", type=int, default=500,
+                        help="起點前先放出的歷史K線數，策略啟動時即可算指標")
+    parser.add_argument("--realtime", action="store_true",
+                        help="時間戳平移到現在並隨牆上時鐘推進（直接跑實盤策略迴圈用）")
+    parser.add_argument("--tick-seconds", type=float, help="每隔幾秒推進一個價格點；未指定且非 realtime 時只能由 /sim/step 推進")
+    parser.add_argument("--host", default=DEFAULT_HOST)
+    parser.add_argument("--port", type=int, default=config.SIM_SERVER_PORT)
+    parser.add_argument("--balance", type=float, default=1000.0)
+    parser.add_argument("--latency-ms", type=float, default=0.0)
+    parser.add_argument("--jitter-ms", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--no-rate-limits", action="store_true")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(name)s - %(message)s')
+
+    try:
+        market = ReplayMarket.from_store(KlineStore(args.root), args.exchange, args.symbols.split(","), args.interval,
+                                         start=args.start, history_bars=args.history_bars, realtime=args.realtime)
+    except ValueError as e:
+        raise SystemExit(f"{e}; run python -m data.kline_store backfill first")
+    exchange = SimExchange(market, balances={"bitmart": args.balance, "topone": args.balance},
+                           latency_ms=args.latency_ms, jitter_ms=args.jitter_ms, error_rate=args.error_rate,
+                           rate_limits=not args.no_rate_limits)
+    server = serve_exchange(exchange, args.host, args.port)
+    stop = threading.Event()
+    if args.realtime or args.tick_seconds:
+        threading.Thread(target=run_clock, args=(market, stop, None if args.realtime else args.tick_seconds),
+                         name="sim-clock", daemon=True).start()
+    try:
+        while True:
+            time.sleep(60)
+            logger.info(f"模擬交易所狀態: {json.dumps(exchange.state(), default=str)}")
+    except KeyboardInterrupt:
+        stop.set()
+        server.shutdown()
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
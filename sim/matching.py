@@ -0,0 +1,364 @@
+import time
+import itertools
+import threading
+from dataclasses import dataclass
+
+import numpy as np
+
+# 每根K線回放為 開 -> 較近的極值 -> 另一極值 -> 收 四個價格點
+TICKS_PER_BAR = 4
+# Bitmart 單次K線回應的最多筆數
+KLINE_LIMIT = 500
+# 平倉數量的絕對容差：交易所回報的數量最多四捨五入到 8 位小數
+QTY_TOLERANCE = 1e-8
+
+
+class SimError(Exception):
+    """Order rejected by the simulated exchange (the venue's business error, not an HTTP failure)."""
+
+
+class ReplayFinished(Exception):
+    """The replay clock was asked to move past the end of the data."""
+
+
+class ReplayMarket:
+    """Prices replayed from stored klines, shared by every simulated venue.
+
+    ``bars_by_symbol`` maps a symbol to (n, 6) [ts, O, H, L, C, V] base bars.
+    All symbols are laid on one timeline (missing bars become flat bars at the
+    previous close). Each bar is walked as open, the extreme nearer the open,
+    the other extreme, close; tick k of bar i happens at ts + k * step / 3, so
+    after the close tick the bar reads as complete. Listeners (accounts) see
+    every tick and trigger TP/SL on the straight path between ticks.
+    ``rebase_to`` shifts all timestamps so the first bar starts at that
+    (aligned) time, e.g. now, for clients that ask for klines by wall time.
+    """
+
+    def __init__(self, bars_by_symbol, base_interval=15, spread_bps=2.0, rebase_to=None, start_bar=0):
+        self.base_interval = base_interval
+        self.step = base_interval * 60
+        self.spread = spread_bps / 10_000
+        self.lock = threading.RLock()
+        self.listeners = []
+
+        arrays = {s: np.asarray(b, dtype=float).reshape(-1, 6) for s, b in bars_by_symbol.items()}
+        first = min(int(a[0, 0]) for a in arrays.values())
+        last = max(int(a[-1, 0]) for a in arrays.values())
+        self.timeline = np.arange(first, last + self.step, self.step, dtype=np.int64)
+        if rebase_to is not None:
+            self.timeline += int(rebase_to) - int(rebase_to) % self.step - first
+        self.bars = {symbol: self._dense(a, first) for symbol, a in arrays.items()}
+        self.paths = {symbol: self._paths(bars) for symbol, bars in self.bars.items()}
+        self.bar = start_bar
+        self.tick = 0
+
+    def _dense(self, bars, first):
+        dense = np.full((len(self.timeline), 6), np.nan)
+        dense[:, 0] = self.timeline
+        index = ((bars[:, 0] - first) // self.step).astype(np.int64)
+        dense[index, 1:] = bars[:, 1:]
+        # 缺少的K線以前一根收盤價補成平盤、量為 0
+        missing = np.isnan(dense[:, 4])
+        if missing.any():
+            close = dense[:, 4].copy()
+            valid = np.flatnonzero(~missing)
+            filled = close[valid[np.maximum(np.searchsorted(valid, np.arange(len(close)), side="right") - 1, 0)]]
+            dense[missing, 1:5] = filled[missing, None]
+            dense[missing, 5] = 0.0
+        return dense
+
+    @classmethod
+    def from_store(cls, store, exchange, symbols, interval=15, start=None, end=None, history_bars=0, realtime=False,
+                   **kwargs):
+        """Replay of data.kline_store bars from ``start`` (default: the first stored bar)
+        to ``end``, with ``history_bars`` earlier bars already visible. ``realtime``
+        shifts the timeline so the replay starts at the current wall-clock bar."""
+        step = interval * 60
+        bars = {}
+        for symbol in symbols:
+            series = store.series(exchange, symbol, interval)
+            lo = series.first_ts() if start is None else start - history_bars * step
+            bars[symbol] = series.view(lo, end).to_bars() if len(series) else np.empty((0, 6))
+            if len(bars[symbol]) == 0:
+                raise ValueError(f"no stored klines for {exchange}/{symbol}/{interval}m in the requested range")
+        first = min(int(b[0, 0]) for b in bars.values())
+        count = (max(int(b[-1, 0]) for b in bars.values()) - first) // step + 1
+        begin = first + history_bars * step if start is None else start - start % step
+        start_bar = int(min(max((begin - first) // step, 0), count - 1))
+        if realtime:
+            kwargs["rebase_to"] = time.time() - start_bar * step
+        return cls(bars, interval, start_bar=start_bar, **kwargs)
+
+    @staticmethod
+    def _paths(bars):
+        o, h, l, c = bars[:, 1], bars[:, 2], bars[:, 3], bars[:, 4]
+        low_first = (o - l) <= (h - o)
+        return np.column_stack((o, np.where(low_first, l, h), np.where(low_first, h, l), c))
+
+    @property
+    def symbols(self):
+        return list(self.bars)
+
+    # ---------- 時鐘 ----------
+    def now(self):
+        """Simulated time (seconds) of the current tick."""
+        return int(self.timeline[self.bar]) + self.tick * self.step // (TICKS_PER_BAR - 1)
+
+    def finished(self):
+        return self.bar >= len(self.timeline) - 1 and self.tick >= TICKS_PER_BAR - 1
+
+    def step_ticks(self, ticks=1):
+        """Advance ``ticks`` price points, notifying listeners; returns False at the end of the data."""
+        with self.lock:
+            for _ in range(ticks):
+                if self.finished():
+                    return False
+                if self.tick == TICKS_PER_BAR - 1:
+                    self.bar, self.tick = self.bar + 1, 0
+                else:
+                    self.tick += 1
+                for symbol in self.bars:
+                    price = self.paths[symbol][self.bar, self.tick]
+                    for listener in self.listeners:
+                        listener(symbol, price, self.tick == 0)
+            return True
+
+    def step_bars(self, bars=1):
+        """Advance to the close tick ``bars`` bars ahead."""
+        with self.lock:
+            target = self.bar + bars - (self.tick < TICKS_PER_BAR - 1)
+            return self.step_ticks((target - self.bar) * TICKS_PER_BAR + TICKS_PER_BAR - 1 - self.tick)
+
+    def advance_to(self, ts):
+        """Step until the simulated clock reaches ``ts`` (wall-clock driven replay)."""
+        with self.lock:
+            while self.now() < ts and self.step_ticks():
+                pass
+
+    def sleep(self, seconds):
+        """time.sleep on the replay clock, for engine.scheduler.BarScheduler(sleep=...)."""
+        target = self.now() + seconds
+        self.advance_to(target)
+        if self.now() < target:
+            raise ReplayFinished(f"replay data ends at {self.now()}")
+
+    # ---------- 行情 ----------
+    def price(self, symbol):
+        return float(self.paths[symbol][self.bar, self.tick])
+
+    def quote(self, symbol):
+        price = self.price(symbol)
+        return {"bid": price * (1 - self.spread / 2), "ask": price * (1 + self.spread / 2)}
+
+    def klines(self, symbol, interval, start, end, limit=KLINE_LIMIT):
+        """Bars of ``interval`` minutes with start <= ts <= end known at the current tick
+        (the current one partially formed), newest ``limit``; aggregated from the base bars."""
+        if interval % self.base_interval:
+            raise SimError(f"{interval}m klines are not available from {self.base_interval}m replay data")
+        step = interval * 60
+        ratio = interval // self.base_interval
+        t0 = int(self.timeline[0])
+        # 只複製需要的基礎K線：第一個起點 >= start 的K線到起點 <= end 的那根（含其全部基礎K線）
+        first = -(-int(start) // step) * step
+        last_end = int(end) // step * step + step
+        with self.lock:
+            hi = min(self.bar, (last_end - t0) // self.step - 1)
+            lo = max(0, (first - t0) // self.step)
+            if hi + 1 - limit * ratio > lo:
+                # 被筆數上限截斷時從完整的一根開始
+                lo = hi + 1 - limit * ratio
+                lo += (ratio - (t0 + lo * self.step) % step // self.step) % ratio
+            if hi < lo:
+                return np.empty((0, 6))
+            bars = self.bars[symbol][lo:hi + 1].copy()
+            if hi == self.bar:
+                path = self.paths[symbol][self.bar, :self.tick + 1]
+                bars[-1, 2], bars[-1, 3], bars[-1, 4] = path.max(), path.min(), path[-1]
+                bars[-1, 5] *= (self.tick + 1) / TICKS_PER_BAR
+        if ratio > 1:
+            bars = aggregate_bars(bars, step)
+        return bars[-limit:]
+
+
+def aggregate_bars(bars, step):
+    """Base bars -> ``step``-second bars aligned to epoch multiples (partial buckets included)."""
+    if len(bars) == 0:
+        return bars
+    bucket = bars[:, 0] - bars[:, 0] % step
+    starts = np.flatnonzero(np.r_[True, bucket[1:] != bucket[:-1]])
+    ends = np.r_[starts[1:], len(bars)] - 1
+    out = np.empty((len(starts), 6))
+    out[:, 0] = bucket[starts]
+    out[:, 1] = bars[starts, 1]
+    out[:, 2] = np.maximum.reduceat(bars[:, 2], starts)
+    out[:, 3] = np.minimum.reduceat(bars[:, 3], starts)
+    out[:, 4] = bars[ends, 4]
+    out[:, 5] = np.add.reduceat(bars[:, 5], starts)
+    return out
+
+
+@dataclass
+class SimPosition:
+    position_id: int
+    symbol: str
+    side: str                   # 'long' / 'short'
+    qty: float                  # 幣數量
+    entry_price: float
+    leverage: int
+    margin: float
+    tp_price: float = None
+    sl_price: float = None
+    opened_at: int = 0
+    realized_pnl: float = 0.0
+
+    @property
+    def sign(self):
+        return 1 if self.side == "long" else -1
+
+    def liquidation_price(self, maintenance_margin_rate):
+        return self.entry_price * (1 - self.sign * (1 / self.leverage - maintenance_margin_rate))
+
+    def unrealized_pnl(self, price):
+        return self.sign * self.qty * (price - self.entry_price)
+
+
+@dataclass
+class SimFill:
+    position_id: int
+    symbol: str
+    side: str
+    action: str                 # open / close / tp / sl / liquidation
+    qty: float
+    price: float
+    fee: float
+    pnl: float
+    ts: int
+
+
+class SimAccount:
+    """One venue's isolated-margin USDT account on a ReplayMarket.
+
+    Positions are kept per (symbol, side): opening the same side again adds
+    to it at the average price. Market orders fill at the ask (buy) / bid
+    (sell); preset TP/SL are checked on every market tick and fill at the
+    trigger price, or at the open when the bar gaps through it. A position
+    whose loss reaches its maintenance margin is liquidated and loses the
+    margin. Fees are charged on notional at open and close.
+    """
+
+    _ids = itertools.count(1)
+
+    def __init__(self, market, name, balance=1000.0, fee_rate=0.0006, maintenance_margin_rate=0.005,
+                 max_leverage=125):
+        self.market = market
+        self.name = name
+        self.wallet = float(balance)
+        self.fee_rate = fee_rate
+        self.maintenance_margin_rate = maintenance_margin_rate
+        self.max_leverage = max_leverage
+        self.leverage = {}
+        self.positions = {}
+        self.fills = []
+        market.listeners.append(self.on_tick)
+
+    # ---------- 帳戶 ----------
+    def used_margin(self):
+        return sum(p.margin for p in self.positions.values())
+
+    def available(self):
+        return self.wallet - self.used_margin()
+
+    def equity(self):
+        return self.wallet + sum(p.unrealized_pnl(self.market.price(p.symbol)) for p in self.positions.values())
+
+    def open_positions(self, symbol=None):
+        with self.market.lock:
+            return [p for p in self.positions.values() if symbol is None or p.symbol == symbol]
+
+    def position_by_id(self, position_id):
+        return next((p for p in self.positions.values() if p.position_id == int(position_id)), None)
+
+    # ---------- 下單 ----------
+    def open(self, symbol, side, qty, leverage, tp_price=None, sl_price=None):
+        if side not in ("long", "short"):
+            raise SimError(f"invalid side {side!r}")
+        if symbol not in self.market.bars:
+            raise SimError(f"unknown symbol {symbol}")
+        if not 1 <= leverage <= self.max_leverage:
+            raise SimError(f"leverage {leverage} outside 1..{self.max_leverage}")
+        if qty <= 0:
+            raise SimError("order size must be positive")
+        with self.market.lock:
+            quote = self.market.quote(symbol)
+            price = quote["ask"] if side == "long" else quote["bid"]
+            # 預設止盈止損必須在成交價正確的一側
+            sign = 1 if side == "long" else -1
+            if tp_price is not None and sign * (tp_price - price) <= 0:
+                raise SimError(f"take profit {tp_price} is on the wrong side of {price:.8g}")
+            if sl_price is not None and sign * (sl_price - price) >= 0:
+                raise SimError(f"stop loss {sl_price} is on the wrong side of {price:.8g}")
+            margin = qty * price / leverage
+            fee = qty * price * self.fee_rate
+            if margin + fee > self.available():
+                raise SimError(f"insufficient balance: need {margin + fee:.4f}, available {self.available():.4f}")
+            self.wallet -= fee
+            position = self.positions.get((symbol, side))
+            if position is None:
+                position = SimPosition(next(self._ids), symbol, side, qty, price, leverage, margin, tp_price, sl_price,
+                                       self.market.now())
+                self.positions[(symbol, side)] = position
+            else:
+                position.entry_price = (position.entry_price * position.qty + price * qty) / (position.qty + qty)
+                position.qty += qty
+                position.margin += margin
+                position.tp_price = tp_price if tp_price is not None else position.tp_price
+                position.sl_price = sl_price if sl_price is not None else position.sl_price
+            self.fills.append(SimFill(position.position_id, symbol, side, "open", qty, price, fee, 0.0, self.market.now()))
+            return position
+
+    def close(self, symbol, side, qty=None, price=None, action="close"):
+        """Close ``qty`` (default all) of the (symbol, side) position at market or ``price``; returns the fill."""
+        with self.market.lock:
+            position = self.positions.get((symbol, side))
+            if position is None:
+                raise SimError(f"no {side} position in {symbol}")
+            # 數量字串化後的尾差（不超過 QTY_TOLERANCE）視為全部平倉，不留下無法再平的殘量
+            qty = position.qty if qty is None or float(qty) >= position.qty - QTY_TOLERANCE else float(qty)
+            if price is None:
+                quote = self.market.quote(symbol)
+                price = quote["bid"] if side == "long" else quote["ask"]
+            share = qty / position.qty
+            margin = position.margin * share
+            # 逐倉：最多損失該部分保證金
+            pnl = max(position.sign * qty * (price - position.entry_price), -margin)
+            fee = qty * price * self.fee_rate
+            self.wallet += pnl - fee
+            position.qty -= qty
+            position.margin -= margin
+            position.realized_pnl += pnl
+            if position.qty <= 1e-12:
+                del self.positions[(symbol, side)]
+            fill = SimFill(position.position_id, symbol, side, action, qty, price, fee, pnl, self.market.now())
+            self.fills.append(fill)
+            return fill
+
+    def set_leverage(self, symbol, leverage):
+        if not 1 <= leverage <= self.max_leverage:
+            raise SimError(f"leverage {leverage} outside 1..{self.max_leverage}")
+        self.leverage[symbol] = leverage
+
+    # ---------- 觸發 ----------
+    def on_tick(self, symbol, price, bar_open):
+        for position in [p for p in self.positions.values() if p.symbol == symbol]:
+            sign = position.sign
+            # 止損/強平在不利方向、止盈在有利方向；同時碰到止損與強平時取先碰到的（離前一價格較近者）
+            hits = [(level, action) for level, action in
+                    ((position.sl_price, "sl"), (position.liquidation_price(self.maintenance_margin_rate), "liquidation"))
+                    if level is not None and sign * (price - level) <= 0]
+            if position.tp_price is not None and sign * (price - position.tp_price) >= 0:
+                hits.append((position.tp_price, "tp"))
+            if not hits:
+                continue
+            level, action = max(hits, key=lambda h: sign * h[0]) if hits[-1][1] != "tp" else hits[-1]
+            # 跳空開盤越過觸發價時以開盤價成交
+            self.close(symbol, position.side, price=price if bar_open else level, action=action)
@@ -0,0 +1,173 @@
+import json
+import logging
+
+import requests
+from bitmart.lib.cloud_exceptions import APIException
+
+import config
+from data.kline_store import KlineStore
+from engine.scheduler import BarScheduler
+from exchanges.bitmart_client import BitmartClient
+from exchanges.topone_client import TopOneClient
+from sim.matching import ReplayMarket
+from sim.exchange_server import SimExchange
+
+logger = logging.getLogger(__name__)
+
+
+class _PaperResponse:
+    """The parts of requests.Response the clients read."""
+
+    def __init__(self, status_code, payload, path):
+        self.status_code = status_code
+        self.payload = payload
+        self.path = path
+        self.headers = {}
+
+    @property
+    def text(self):
+        return json.dumps(self.payload, default=str)
+
+    def json(self):
+        return self.payload
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise requests.exceptions.HTTPError(f"{self.status_code} Error for paper {self.path}", response=self)
+
+
+class PaperContractAPI:
+    """In-memory stand-in for bitmart's APIContract: the SDK methods BitmartClient calls,
+    served by a SimExchange. Same (json, ratelimit_headers) tuples and APIException on rejection."""
+
+    def __init__(self, exchange):
+        self.exchange = exchange
+
+    def _call(self, method, path, params=None, body=None):
+        status, payload = self.exchange.handle(method, path, params or {}, body or {})
+        if status != 200:
+            raise APIException(_PaperResponse(status, payload, path))
+        return payload, {}
+
+    def get_details(self, contract_symbol: str = None):
+        return self._call("GET", "/contract/public/details", {"symbol": contract_symbol} if contract_symbol else {})
+
+    def get_depth(self, contract_symbol):
+        return self._call("GET", "/contract/public/depth", {"symbol": contract_symbol})
+
+    def get_kline(self, contract_symbol: str, step: int, start_time: int, end_time: int):
+        return self._call("GET", "/contract/public/kline",
+                          {"symbol": contract_symbol, "step": step, "start_time": start_time, "end_time": end_time})
+
+    def get_assets_detail(self):
+        return self._call("GET", "/contract/private/assets-detail")
+
+    def get_trade_fee_rate(self, contract_symbol: str):
+        return self._call("GET", "/contract/private/trade-fee-rate", {"symbol": contract_symbol})
+
+    def get_position(self, contract_symbol: str = None, account: str = None):
+        return self._call("GET", "/contract/private/position", {"symbol": contract_symbol} if contract_symbol else {})
+
+    def post_submit_order(self, contract_symbol: str, type: str = None, side: int = None, leverage: str = None,
+                          open_type: str = None, size: int = None, preset_take_profit_price: str = None,
+                          preset_stop_loss_price: str = None, **kwargs):
+        return self._call("POST", "/contract/private/submit-order", body={
+            "symbol": contract_symbol, "type": type, "side": side, "leverage": leverage, "open_type": open_type,
+            "size": size, "preset_take_profit_price": preset_take_profit_price,
+            "preset_stop_loss_price": preset_stop_loss_price})
+
+    def post_submit_leverage(self, contract_symbol: str, open_type: str, leverage: str = None):
+        return self._call("POST", "/contract/private/submit-leverage",
+                          body={"symbol": contract_symbol, "leverage": leverage, "open_type": open_type})
+
+
+class PaperTransport:
+    """In-memory stand-in for HttpTransport: TopOneClient's requests go to a SimExchange."""
+
+    def __init__(self, exchange):
+        self.exchange = exchange
+
+    def request(self, method, path, params=None, data=None, **kwargs):
+        body = json.loads(data) if data else {}
+        status, payload = self.exchange.handle(method.upper(), path, dict(params or {}), body)
+        return _PaperResponse(status, payload, path)
+
+    def get(self, path, **kwargs):
+        return self.request("GET", path, **kwargs)
+
+    def post(self, path, **kwargs):
+        return self.request("POST", path, **kwargs)
+
+    def warm_up(self, path="/"):
+        return True
+
+    def close(self):
+        pass
+
+
+class PaperBitmartClient(BitmartClient):
+    """BitmartClient on a paper account: every method and return shape is the real
+    client's, only the SDK is replaced by PaperContractAPI (no HTTP, no rate limiting).
+    ``clock`` is the replay clock, so the kline cache asks for replay-time windows."""
+
+    # 成交與持倉同步更新，確認不需等待（見 engine.confirmation.confirm_positions）
+    confirm_timeout = 0.0
+
+    def __init__(self, exchange, registry=None, market_feed=None):
+        super().__init__("paper", "paper", "paper", registry=registry, market_feed=market_feed)
+        self.exchange = exchange
+        self.futuresAPI = PaperContractAPI(exchange)
+        self.clock = exchange.market.now
+
+
+class PaperTopOneClient(TopOneClient):
+    """TopOneClient on a paper account through PaperTransport. TopOne has no market data,
+    so prices and klines come straight from the replay (or the attached market feed)."""
+
+    # 成交與持倉同步更新，確認不需等待（見 engine.confirmation.confirm_positions）
+    confirm_timeout = 0.0
+
+    def __init__(self, exchange, registry=None, contract_specs=None, market_feed=None):
+        super().__init__("paper", "paper", transport=PaperTransport(exchange), warm_up=False, registry=registry,
+                         contract_specs=contract_specs, market_feed=market_feed)
+        self.exchange = exchange
+        self.clock = exchange.market.now
+
+    def get_current_price(self, symbol: str):
+        if self.market_feed is not None:
+            return super().get_current_price(symbol)
+        return self.exchange.market.price(symbol)
+
+    def get_kline_data(self, symbol: str, step: int, start_time: int, end_time: int):
+        status, payload = self.exchange.handle("GET", "/contract/public/kline", {
+            "symbol": symbol, "step": step, "start_time": start_time, "end_time": end_time})
+        if status != 200:
+            self.logger.error(f"Failed to get kline data for {symbol}: {payload.get('message')}")
+            return None
+        return payload["data"]
+
+
+def create_paper_clients(symbols, exchange="bitmart", interval=15, start=None, end=None,
+                         history_bars=config.PAPER_HISTORY_BARS, balance=config.PAPER_BALANCE,
+                         fee_rate=config.PAPER_FEE_RATE, root=config.KLINE_STORE_DIR, market=None):
+    """Paper Bitmart/TopOne clients sharing one replay of the local kline store.
+
+    ``exchange``/``interval`` pick the stored series, ``start``/``end`` the replayed
+    range and ``history_bars`` the bars already visible at the start. Pass
+    ``market`` to replay given bars instead. The SimExchange (``.exchange``, with
+    ``.market`` and ``.accounts``) is reachable from either client.
+    """
+    if market is None:
+        market = ReplayMarket.from_store(KlineStore(root), exchange, symbols, interval, start=start, end=end,
+                                         history_bars=history_bars)
+    sim = SimExchange(market, balances={"bitmart": balance, "topone": balance},
+                      fee_rates={"bitmart": fee_rate, "topone": fee_rate}, rate_limits=False)
+    logger.info(f"紙上交易: {symbols} {interval}m 回放 {market.now()} 起 {len(market.timeline) - market.bar} 根K線，"
+                f"各帳戶 {balance} USDT")
+    return PaperBitmartClient(sim), PaperTopOneClient(sim, contract_specs=config.TOPONE_CONTRACT_SPECS)
+
+
+def replay_scheduler(market, history=500):
+    """BarScheduler on the replay clock: each wait advances the replay to the next bar close
+    instead of sleeping. Raises sim.matching.ReplayFinished at the end of the data."""
+    return BarScheduler(market.step, settle_seconds=0.0, history=history, clock=market.now, sleep=market.sleep)
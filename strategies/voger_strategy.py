@@ -4,6 +4,14 @@ import numpy as np
 import time
 import config
 import random
+import asyncio
+
+from engine.hedge_execution import open_hedge, open_hedge_async
+from engine.account_snapshot import AccountSnapshot
+from engine.metrics import stage
+from data.kline_cache import get_kline_cache
+from data.bar_aggregator import get_bar_aggregator
+from indicators.cci import cci_batch
 
 logger = logging.getLogger(__name__)
 
@@ -13,10 +21,8 @@ _debug_signal_sequence = ['none', 'long', 'none', 'none', 'short', 'none', 'none
 
 # ---------- CCI 指標 ----------
 def cci(df, period=20):
-    tp = (df['High'] + df['Low'] + df['Close']) / 3
-    ma = tp.rolling(period).mean()
-    md = tp.rolling(period).apply(lambda x: np.mean(np.abs(x - np.mean(x))), raw=True)
-    return (tp - ma) / (0.015 * md + 1e-9)
+    # 以滑動視窗一次算完平均絕對偏差，不再每根K線呼叫一次 Python lambda
+    return pd.Series(cci_batch(df['High'], df['Low'], df['Close'], period), index=df.index)
 
 # ---------- 產生交易訊號 ----------
 def signal_generation(df, cci_len=20, lookback_bars=5, pullback_len=5, pullback_pct=0.01, debug_mode=False):
@@ -50,35 +56,94 @@ def signal_generation(df, cci_len=20, lookback_bars=5, pullback_len=5, pullback_
         logger.info(f"DEBUG MODE: Generated signal: {signal_choice}")
         return df
 
-    bull_trigger = bear_trigger = None
-    bull_count = bear_count = 0
-
-    for i in range(len(df)):
-        if df['BullCross'].iloc[i]:
-            bull_trigger, bull_count = df['Close'].iloc[i] * (1 - pullback_pct), 0
-        if bull_trigger:
-            bull_count += 1
-            if df['Low'].iloc[i] <= bull_trigger or bull_count >= pullback_len:
-                df.at[i, 'LongSignal'], bull_trigger = True, None
-
-        if df['BearCross'].iloc[i]:
-            bear_trigger, bear_count = df['Close'].iloc[i] * (1 + pullback_pct), 0
-        if bear_trigger:
-            bear_count += 1
-            if df['High'].iloc[i] >= bear_trigger or bear_count >= pullback_len:
-                df.at[i, 'ShortSignal'], bear_trigger = True, None
+    close = df['Close'].to_numpy(dtype=float)
+    df['LongSignal'] = pullback_signals(df['BullCross'].to_numpy(dtype=bool), close, df['Low'].to_numpy(dtype=float),
+                                        pullback_len, pullback_pct, bullish=True)
+    df['ShortSignal'] = pullback_signals(df['BearCross'].to_numpy(dtype=bool), close, df['High'].to_numpy(dtype=float),
+                                         pullback_len, pullback_pct, bullish=False)
 
     return df
 
+# ---------- 回調觸發狀態機（陣列版） ----------
+def pullback_signals(cross, close, extreme, pullback_len=5, pullback_pct=0.01, bullish=True, chunk_size=65536):
+    """Array form of the pullback trigger state machine.
+
+    A cross at bar i arms a trigger at close[i] * (1 -/+ pullback_pct). The
+    signal fires on the first bar j >= i whose low (bull) / high (bear) reaches
+    the trigger, or on the pullback_len-th bar counting i itself, whichever comes
+    first. A newer cross re-arms the trigger, so a cross only fires if j lies
+    before the next cross. Only the next pullback_len bars after each cross are
+    inspected, so cost scales with crosses * pullback_len rather than the
+    number of bars.
+    """
+    n = len(close)
+    signal = np.zeros(n, dtype=bool)
+    idx = np.flatnonzero(cross)
+    if len(idx) == 0:
+        return signal
+
+    window = max(int(np.ceil(pullback_len)), 1)
+    trigger = close[idx] * ((1 - pullback_pct) if bullish else (1 + pullback_pct))
+    next_cross = np.append(idx[1:], n)
+    # 觸發價可生效的最後一根（含）：倒數期滿或下一次交叉之前
+    last_bar = np.minimum(idx + window - 1, next_cross - 1)
+    offsets = np.arange(window)
+
+    for lo in range(0, len(idx), chunk_size):
+        hi = lo + chunk_size
+        bars = idx[lo:hi, None] + offsets
+        valid = bars <= last_bar[lo:hi, None]
+        prices = extreme[np.minimum(bars, n - 1)]
+        with np.errstate(invalid='ignore'):
+            hit = prices <= trigger[lo:hi, None] if bullish else prices >= trigger[lo:hi, None]
+        hit &= valid
+        # 第 pullback_len 根一定觸發（若在下一次交叉前）
+        hit[:, -1] |= valid[:, -1]
+        # 觸發價為 0 時原本的 `if bull_trigger:` 視為未啟動
+        fires = hit.any(axis=1) & (trigger[lo:hi] != 0)
+        signal[idx[lo:hi][fires] + hit[fires].argmax(axis=1)] = True
+
+    return signal
+
 # ---------- 多時間框架趨勢 ----------
 def mtf_trend(df, cci_len=20):
     return '多頭' if cci(df, cci_len).iloc[-1] >= 0 else '空頭'
 
 # ---------- 抽取共用函式 ----------
-def load_kline_df(client, symbol, interval, bars):
-    end = int(time.time())
+def load_kline_df(client, symbol, interval, bars, use_cache=True):
+    # 預設走增量快取：只抓最後一根已收K線之後的資料
+    if use_cache:
+        return get_kline_cache(client).get(client, symbol, interval, bars)
+    end = int(getattr(getattr(client, "sync", client), "clock", time.time)())  # 紙上交易為回放時間
     start = end - bars * interval * 60
-    data = client.get_kline_data(symbol, interval, start, end)
+    return kline_rows_to_df(client.get_kline_data(symbol, interval, start, end))
+
+async def load_kline_df_async(client, symbol, interval, bars, use_cache=True):
+    if use_cache:
+        return await get_kline_cache(client).get_async(client, symbol, interval, bars)
+    end = int(getattr(getattr(client, "sync", client), "clock", time.time)())  # 紙上交易為回放時間
+    start = end - bars * interval * 60
+    return kline_rows_to_df(await client.get_kline_data(symbol, interval, start, end))
+
+def closed_bars(df, bar_close_at):
+    # 收盤排程的回合：去掉剛在 bar_close_at 開出的K線（只有約 1 秒資料），評估剛收盤的那根
+    if bar_close_at is None or df is None:
+        return df
+    return df[df['timestamp'] < pd.Timestamp(bar_close_at, unit='s')]
+
+def load_trend_df(client, symbol, df_15m, bars=60):
+    # 4小時K線由15分K線聚合；只有第一次向交易所取一次4小時歷史當作起始資料
+    aggregator = get_bar_aggregator(client, symbol, 15, [240])
+    seed_df = None if aggregator.is_seeded(240) else load_kline_df(client, symbol, 240, bars, use_cache=False)
+    return aggregate_trend_df(aggregator, df_15m, seed_df, bars)
+
+def aggregate_trend_df(aggregator, df_15m, seed_df=None, bars=60):
+    if seed_df is not None and not seed_df.empty:
+        aggregator.seed_df(240, seed_df)
+    aggregator.ingest_df(df_15m)
+    return aggregator.frame(240, bars)
+
+def kline_rows_to_df(data):
     if not data: return None
     if isinstance(data[0], dict):
         data = [[k['timestamp'], k['open_price'], k['high_price'], k['low_price'], k['close_price'], k['volume']] for k in data]
@@ -94,7 +159,7 @@ def prepare_order_params(side, price, tp_pct, sl_pct):
         return price * (1 - tp_pct/100), price * (1 + sl_pct/100)
 
 def get_position_summary(position):
-    logger.debug(f"get_position_summary received position: {position}")
+    logger.debug("get_position_summary received position: %s", position)
     if position is None:
         return "無持倉"
     
@@ -114,6 +179,30 @@ def get_position_summary(position):
 
     return "未知持倉"
 
+def decide_direction(long_signal, short_signal, overall_trend):
+    if config.DEBUG_MODE:
+        if long_signal:
+            return 'long'
+        elif short_signal:
+            return 'short'
+    else: # Original logic
+        if long_signal and overall_trend != '空頭':
+            return 'long'
+        elif short_signal and overall_trend != '多頭':
+            return 'short'
+    return None
+
+def is_desired_hedge(desired, positions):
+    bitmart_pos_summary = get_position_summary(positions["bitmart"])
+    topone_pos_summary = get_position_summary(positions["topone"])
+    if desired == 'long' and bitmart_pos_summary == '多頭' and topone_pos_summary == '空頭':
+        logger.info("Existing positions already form a desired LONG hedge. Skipping closing.")
+        return True
+    elif desired == 'short' and bitmart_pos_summary == '空頭' and topone_pos_summary == '多頭':
+        logger.info("Existing positions already form a desired SHORT hedge. Skipping closing.")
+        return True
+    return False
+
 # ---------- 策略主流程 ----------
 def run_voger_strategy(bitmart_client, topone_client, **kwargs):
     symbol = kwargs['symbol']
@@ -124,72 +213,60 @@ def run_voger_strategy(bitmart_client, topone_client, **kwargs):
     results = {"strategy": "Voger", "status": "pending", "message": ""}
 
     # --- 15分K線 ---
-    df_15m = load_kline_df(bitmart_client, symbol, 15, 200)
+    with stage("kline_fetch"):
+        df_15m = closed_bars(load_kline_df(bitmart_client, symbol, 15, 200), kwargs.get('bar_close_at'))
     if df_15m is None or df_15m.empty:
         return {**results, "status": "failed", "message": f"{symbol} 無法取得15分K線"}
 
-    df_15m = signal_generation(df_15m, lookback_bars=lookback_bars, pullback_pct=pullback_pct, debug_mode=config.DEBUG_MODE)
-    latest = df_15m.iloc[-1]
-    long_signal, short_signal = latest['LongSignal'], latest['ShortSignal']
+    with stage("indicators"):
+        df_15m = signal_generation(df_15m, lookback_bars=lookback_bars, pullback_pct=pullback_pct, debug_mode=config.DEBUG_MODE)
+        latest = df_15m.iloc[-1]
+        long_signal, short_signal = latest['LongSignal'], latest['ShortSignal']
 
-    # --- 4小時趨勢 ---
-    df_4h = load_kline_df(bitmart_client, symbol, 240, 60)
-    overall_trend = mtf_trend(df_4h) if df_4h is not None and not df_4h.empty else '無資料'
+    # --- 4小時趨勢（由15分K線在本地聚合）---
+    with stage("trend"):
+        df_4h = load_trend_df(bitmart_client, symbol, df_15m)
+        overall_trend = mtf_trend(df_4h) if df_4h is not None and not df_4h.empty else '無資料'
     logger.info(f"4小時整體趨勢：{overall_trend}")
 
-    # --- 取得持倉 ---
-    positions = {
-        "bitmart": bitmart_client.get_position(symbol),
-        "topone": topone_client.get_position(symbol)
-    }
+    # --- 取得持倉（優先使用本回合的帳戶快照）---
+    snapshot = kwargs.get('account_snapshot')
+    if snapshot is None:
+        snapshot = AccountSnapshot(bitmart_client, topone_client, symbol)
+        with stage("position_fetch"):
+            snapshot.refresh_positions()
+    if not snapshot.positions_known:
+        # 持倉未知時不能當成無持倉開倉，否則可能重複對沖
+        logger.warning("持倉查詢失敗，本回合略過")
+        return {**results, "status": "skipped", "message": "持倉未知，本回合略過"}
+    positions = dict(snapshot.positions)
     logger.info(f"持倉狀況: Bitmart={get_position_summary(positions['bitmart'])}, TopOne={get_position_summary(positions['topone'])}")
 
     # --- 決策方向 ---
-    desired = None
-    if config.DEBUG_MODE:
-        if long_signal:
-            desired = 'long'
-        elif short_signal:
-            desired = 'short'
-    else: # Original logic
-        if long_signal and overall_trend != '空頭':
-            desired = 'long'
-        elif short_signal and overall_trend != '多頭':
-            desired = 'short'
+    desired = decide_direction(long_signal, short_signal, overall_trend)
 
     # Determine if any positions are currently open
     bitmart_has_position = positions["bitmart"] is not None
     topone_has_position = positions["topone"] is not None
     any_open_positions = bitmart_has_position or topone_has_position
 
-    # Get current position summaries for comparison
-    bitmart_pos_summary = get_position_summary(positions["bitmart"])
-    topone_pos_summary = get_position_summary(positions["topone"])
-
     # Check if existing positions already form a valid hedge aligned with the desired signal
-    should_skip_closing = False
-    if desired == 'long' and bitmart_pos_summary == '多頭' and topone_pos_summary == '空頭':
-        should_skip_closing = True
-        logger.info("Existing positions already form a desired LONG hedge. Skipping closing.")
-    elif desired == 'short' and bitmart_pos_summary == '空頭' and topone_pos_summary == '多頭':
-        should_skip_closing = True
-        logger.info("Existing positions already form a desired SHORT hedge. Skipping closing.")
+    should_skip_closing = is_desired_hedge(desired, positions)
 
     # If a signal is generated, and there are any open positions, close them all first.
     # This ensures "平倉一起平" (close together) unless already in desired hedged state.
     if desired is not None and any_open_positions and not should_skip_closing:
         logger.info("Signal detected and open positions exist, but not in desired hedged state. Attempting to close all positions first.")
-        if bitmart_has_position:
-            bitmart_client.close_position(symbol)
-            logger.info("Bitmart position closed.")
-        if topone_has_position:
-            topone_client.close_position(symbol)
-            logger.info("TopOne position closed.")
-        time.sleep(5) # Wait for positions to close
-
-        # After closing, re-fetch positions to ensure they are indeed closed
-        positions["bitmart"] = bitmart_client.get_position(symbol)
-        positions["topone"] = topone_client.get_position(symbol)
+        # 用快照中的持倉直接平倉，兩邊同時送出
+        with stage("close"):
+            closed = snapshot.close_all()
+        logger.info(f"Closed positions on: {list(closed)}")
+
+        # 輪詢直到兩邊確認平倉（或逾時），不再固定等待
+        with stage("close_confirm"):
+            snapshot.await_positions({venue: False for venue in closed}, timeout=config.CONFIRM_TIMEOUT_SECONDS)
+        results["close_confirm_ms"] = dict(snapshot.confirm_ms)
+        positions = dict(snapshot.positions)
         bitmart_has_position = positions["bitmart"] is not None
         topone_has_position = positions["topone"] is not None
         any_open_positions = bitmart_has_position or topone_has_position
@@ -214,29 +291,121 @@ def run_voger_strategy(bitmart_client, topone_client, **kwargs):
         bm_tp, bm_sl = prepare_order_params(desired, price, tp_pct, sl_pct)
         tp_tp, tp_sl = bm_sl, bm_tp  # 對沖
 
-        orders = {}
-        bitmart_order_res = bitmart_client.place_order(symbol, desired, margin, leverage, tp_price=bm_tp, sl_price=bm_sl)
-        topone_order_res = topone_client.place_order(symbol, opposite, margin, leverage, tp_price=tp_tp, sl_price=tp_sl)
-
-        if bitmart_order_res and topone_order_res:
-            orders["bitmart_order"] = bitmart_order_res
-            orders["topone_order"] = topone_order_res
-            results.update(orders)
+        # 兩腿同時送出；若只有一邊成功，open_hedge 會平掉存活的那一腿
+        with stage("order"):
+            hedge = open_hedge(bitmart_client, topone_client, symbol, desired, margin, leverage,
+                               bitmart_tp=bm_tp, bitmart_sl=bm_sl, topone_tp=tp_tp, topone_sl=tp_sl)
+        results["leg_latency_ms"] = {k: hedge[k] for k in ("bitmart_ack_ms", "topone_ack_ms", "skew_ms")}
+
+        if hedge["bitmart_order"] and hedge["topone_order"]:
+            # 確認兩邊持倉都已出現，下一回合才不會因持倉尚未可見而重複開倉
+            with stage("open_confirm"):
+                snapshot.await_positions({"bitmart": True, "topone": True}, timeout=config.CONFIRM_TIMEOUT_SECONDS)
+            results["open_confirm_ms"] = dict(snapshot.confirm_ms)
+            results["bitmart_order"] = hedge["bitmart_order"]
+            results["topone_order"] = hedge["topone_order"]
             results["status"] = "completed"
             results["message"] = f"Bitmart開{desired}倉，TopOne開{opposite}倉對沖。"
         else:
             results["status"] = "failed_to_open"
             results["message"] = "未能同時開倉"
-            # If one failed, consider closing the other if it opened
-            if bitmart_order_res and not topone_order_res:
-                logger.warning("Bitmart opened, but TopOne failed. Attempting to close Bitmart position.")
-                bitmart_client.close_position(symbol)
-            elif topone_order_res and not bitmart_order_res:
-                logger.warning("TopOne opened, but Bitmart failed. Attempting to close TopOne position.")
-                topone_client.close_position(symbol)
     else:
         results["status"] = "no_action"
         results["message"] = "已有部位，不重複開倉"
 
 
     return results
+
+# ---------- 非同步策略主流程 ----------
+async def run_voger_strategy_async(bitmart_client, topone_client, **kwargs):
+    """Same decisions as run_voger_strategy, with independent REST calls gathered.
+
+    Expects the awaitable clients from exchanges.async_clients.
+    """
+    symbol = kwargs['symbol']
+    margin, leverage = kwargs['margin'], kwargs['leverage']
+    tp_pct, sl_pct = kwargs['tp_percentage'], kwargs['sl_percentage']
+    lookback_bars, pullback_pct = kwargs.get('lookback_bars', 5), kwargs.get('pullback_pct', 0.01)
+
+    results = {"strategy": "Voger", "status": "pending", "message": ""}
+
+    # --- K線與持倉同時取得，回合延遲取決於最慢的一個請求 ---
+    aggregator = get_bar_aggregator(bitmart_client, symbol, 15, [240])
+    seed_4h = None if aggregator.is_seeded(240) else load_kline_df_async(bitmart_client, symbol, 240, 60, use_cache=False)
+    snapshot, refresh = kwargs.get('account_snapshot'), None
+    if snapshot is None:
+        snapshot = AccountSnapshot(bitmart_client, topone_client, symbol)
+        refresh = snapshot.refresh_positions_async()
+    with stage("kline_fetch"):
+        df_15m, seed_df, _ = await asyncio.gather(
+            load_kline_df_async(bitmart_client, symbol, 15, 200),
+            seed_4h if seed_4h is not None else asyncio.sleep(0),
+            refresh if refresh is not None else asyncio.sleep(0),
+        )
+    df_15m = closed_bars(df_15m, kwargs.get('bar_close_at'))
+    if df_15m is None or df_15m.empty:
+        return {**results, "status": "failed", "message": f"{symbol} 無法取得15分K線"}
+
+    with stage("indicators"):
+        df_15m = signal_generation(df_15m, lookback_bars=lookback_bars, pullback_pct=pullback_pct, debug_mode=config.DEBUG_MODE)
+        latest = df_15m.iloc[-1]
+        long_signal, short_signal = latest['LongSignal'], latest['ShortSignal']
+
+    with stage("trend"):
+        df_4h = aggregate_trend_df(aggregator, df_15m, seed_df)
+        overall_trend = mtf_trend(df_4h) if df_4h is not None and not df_4h.empty else '無資料'
+    logger.info(f"4小時整體趨勢：{overall_trend}")
+
+    if not snapshot.positions_known:
+        # 持倉未知時不能當成無持倉開倉，否則可能重複對沖
+        logger.warning("持倉查詢失敗，本回合略過")
+        return {**results, "status": "skipped", "message": "持倉未知，本回合略過"}
+    positions = dict(snapshot.positions)
+    logger.info(f"持倉狀況: Bitmart={get_position_summary(positions['bitmart'])}, TopOne={get_position_summary(positions['topone'])}")
+
+    desired = decide_direction(long_signal, short_signal, overall_trend)
+    any_open_positions = positions["bitmart"] is not None or positions["topone"] is not None
+
+    if desired is not None and any_open_positions and not is_desired_hedge(desired, positions):
+        logger.info("Signal detected and open positions exist, but not in desired hedged state. Attempting to close all positions first.")
+        with stage("close"):
+            closed = await snapshot.close_all_async()
+        with stage("close_confirm"):
+            await snapshot.await_positions_async({venue: False for venue in closed}, timeout=config.CONFIRM_TIMEOUT_SECONDS)
+        results["close_confirm_ms"] = dict(snapshot.confirm_ms)
+        positions = dict(snapshot.positions)
+        any_open_positions = positions["bitmart"] is not None or positions["topone"] is not None
+        if any_open_positions:
+            logger.warning("Failed to close all positions. Aborting current cycle.")
+            return {**results, "status": "failed_to_close", "message": "未能平倉所有部位"}
+
+    if not desired:
+        msg = "無新訊號" if any_open_positions else "無持倉與新訊號"
+        return {**results, "status": "no_action", "message": msg}
+
+    if any_open_positions:
+        return {**results, "status": "no_action", "message": "已有部位，不重複開倉"}
+
+    opposite = 'short' if desired == 'long' else 'long'
+    price = df_15m['Close'].iloc[-1]
+    bm_tp, bm_sl = prepare_order_params(desired, price, tp_pct, sl_pct)
+    tp_tp, tp_sl = bm_sl, bm_tp  # 對沖
+
+    with stage("order"):
+        hedge = await open_hedge_async(bitmart_client, topone_client, symbol, desired, margin, leverage,
+                                       bitmart_tp=bm_tp, bitmart_sl=bm_sl, topone_tp=tp_tp, topone_sl=tp_sl)
+    results["leg_latency_ms"] = {k: hedge[k] for k in ("bitmart_ack_ms", "topone_ack_ms", "skew_ms")}
+
+    if hedge["bitmart_order"] and hedge["topone_order"]:
+        with stage("open_confirm"):
+            await snapshot.await_positions_async({"bitmart": True, "topone": True}, timeout=config.CONFIRM_TIMEOUT_SECONDS)
+        results["open_confirm_ms"] = dict(snapshot.confirm_ms)
+        results["bitmart_order"] = hedge["bitmart_order"]
+        results["topone_order"] = hedge["topone_order"]
+        results["status"] = "completed"
+        results["message"] = f"Bitmart開{desired}倉，TopOne開{opposite}倉對沖。"
+    else:
+        results["status"] = "failed_to_open"
+        results["message"] = "未能同時開倉"
+
+    return results
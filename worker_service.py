@@ -0,0 +1,59 @@
+import sys
+import json
+import signal
+import logging
+import threading
+import argparse
+
+import config
+from backend_service import create_clients, attach_market_feed, preload_contract_specs
+from engine.strategy_worker import StrategyWorker
+from engine.worker_control import serve_worker, DEFAULT_HOST
+from engine.status_channel import StatusPublisher
+from engine.metrics import MetricsExporter
+
+logger = logging.getLogger("worker_service")
+
+
+def prepare(bitmart_client, topone_client, symbols):
+    attach_market_feed(bitmart_client, topone_client, symbols)
+    preload_contract_specs(symbols)
+
+
+def main(argv=None):
+    """Long-lived strategy host: started once, then driven through the control API.
+
+    Receives the same strategy config JSON backend_service.py takes on argv; an
+    optional config given here is started right away. SIGTERM / Ctrl+C stop
+    after the round in flight.
+    """
+    parser = argparse.ArgumentParser(description="常駐策略服務")
+    parser.add_argument("--host", default=DEFAULT_HOST)
+    parser.add_argument("--port", type=int, default=config.WORKER_CONTROL_PORT)
+    parser.add_argument("strategy_config", nargs="?", help="啟動後立即執行的策略設定 JSON")
+    args = parser.parse_args(argv)
+
+    publisher = StatusPublisher(config.STATUS_CHANNEL_PATH)
+    worker = StrategyWorker(create_clients, prepare=prepare, publisher=publisher)
+    worker.publish()
+    exporter = MetricsExporter(config.METRICS_EXPORT_PATH, config.METRICS_EXPORT_SECONDS).start()
+    server = serve_worker(worker, args.host, args.port)
+    if args.strategy_config:
+        worker.start(json.loads(args.strategy_config))
+
+    shutdown = threading.Event()
+    signal.signal(signal.SIGTERM, lambda *_: shutdown.set())
+    signal.signal(signal.SIGINT, lambda *_: shutdown.set())
+    shutdown.wait()
+
+    logger.info("收到結束信號，等待進行中的回合結束...")
+    worker.stop(wait=True)
+    server.shutdown()
+    exporter.stop()
+    # 服務已結束，避免儀表板讀到最後一筆「執行中」記錄
+    publisher.publish({**worker.status_record(), "state": "offline"})
+    publisher.close()
+
+
+if __name__ == "__main__":
+    sys.exit(main())